@@ -0,0 +1,392 @@
+"""
+CI promotion gate: train a candidate, score a fixed holdout with both the
+candidate and the registered champion, and register + tag the candidate
+only if every gate passes. Runs fully offline against a local MLflow file
+store.
+
+  1. prepare  split the data, cache train/valid DMatrix binaries and the
+              holdout frame under --cache-dir, keyed by a hash of the data,
+              preprocess.py and the split settings (reruns skip this step)
+  2. parallel train the candidate (+ isotonic calibrator on the valid split)
+              while the champion scores the holdout (also cached per version)
+  3. gates    AUC (absolute and vs champion), calibration error (ECE),
+              score-distribution PSI vs champion (or the serving reference)
+              and single-row inference latency p95
+  4. promote  log the run, register the pyfunc model, tag the version with
+              the gate results and move the champion alias to it
+
+    python ci/train_and_promote.py --data src/backend/data/cs-training.csv
+    python ci/train_and_promote.py --data data/scaled --time-budget 600 --report promotion.json
+
+Exit codes: 0 promoted, 1 a gate failed, 2 time budget exceeded.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BACKEND_DIR = os.path.join(REPO_ROOT, "src", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import joblib
+import mlflow
+import mlflow.pyfunc
+import mlflow.xgboost
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from mlflow.exceptions import MlflowException
+from mlflow.tracking import MlflowClient
+from sklearn.metrics import roc_auc_score
+
+from calibration_job import CalibrationStats, build_reference, fit_calibrator
+from data_store import load_table
+from preprocess import preprocess_input
+from serve_pyfunc import CreditRiskPyFunc
+from train_external import DEFAULT_PARAMS, LABEL_COL, parquet_files
+from utils import MODEL_FEATURES, load_training_data
+
+
+MODEL_NAME = "credit_risk_pyfunc"
+CHAMPION_ALIAS = "champion"
+REQUIREMENTS = os.path.join(BACKEND_DIR, "requirements.txt")
+CODE_PATHS = [os.path.join(BACKEND_DIR, f) for f in
+              ("serve_pyfunc.py", "preprocess.py", "utils.py", "data_store.py", "calibration_job.py")]
+
+SPLIT = {"seed": 42, "valid": 0.15, "holdout": 0.15}
+N_BINS = 20
+LATENCY_SAMPLES = 200
+
+GATES = {
+    "min_auc": 0.75,
+    "max_auc_drop": 0.005,  # vs champion on the same holdout
+    "max_ece": 0.02,
+    "max_psi": 0.10,
+    "latency_p95_ms": 25.0,
+}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# -------------------------
+# Metrics
+# -------------------------
+def expected_calibration_error(y, p, n_bins: int = N_BINS) -> float:
+    """Count-weighted |mean predicted - observed rate| over equal-mass bins."""
+    y, p = np.asarray(y, dtype=float), np.asarray(p, dtype=float)
+    order = np.argsort(p, kind="stable")
+    ece = 0.0
+    for idx in np.array_split(order, n_bins):
+        if len(idx):
+            ece += len(idx) * abs(p[idx].mean() - y[idx].mean())
+    return float(ece / len(p))
+
+
+def population_stability_index(expected, actual, n_bins: int = N_BINS, eps: float = 1e-6) -> float:
+    """PSI of `actual` against `expected`, on quantile bins of `expected`."""
+    expected, actual = np.asarray(expected, dtype=float), np.asarray(actual, dtype=float)
+    edges = np.unique(np.quantile(expected, np.linspace(0, 1, n_bins + 1)[1:-1]))
+    e = np.bincount(np.searchsorted(edges, expected, side="right"), minlength=len(edges) + 1) / len(expected)
+    a = np.bincount(np.searchsorted(edges, actual, side="right"), minlength=len(edges) + 1) / len(actual)
+    e, a = np.clip(e, eps, None), np.clip(a, eps, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def single_row_latency(python_model, X_raw: pd.DataFrame, n: int = LATENCY_SAMPLES) -> dict:
+    """Per-request score() latency (preprocess + booster + calibrator), like a /predict_1 call."""
+    rows = X_raw.head(n)
+    python_model.score(rows.iloc[[0]])  # warm-up
+    times = []
+    for i in range(len(rows)):
+        t0 = time.perf_counter()
+        python_model.score(rows.iloc[[i]])
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"p50_ms": float(np.percentile(times, 50)), "p95_ms": float(np.percentile(times, 95))}
+
+
+# -------------------------
+# Step 1: data + cache
+# -------------------------
+def _file_digest(path: str, h) -> None:
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def data_key(data_path: str) -> str:
+    """Cache key: data bytes + preprocessing code + split settings."""
+    h = hashlib.sha256()
+    paths = [data_path] if data_path.endswith(".csv") else parquet_files(data_path)
+    for path in paths:
+        _file_digest(path, h)
+    _file_digest(os.path.join(BACKEND_DIR, "preprocess.py"), h)
+    h.update(json.dumps([MODEL_FEATURES, SPLIT], sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _load_raw(data_path: str) -> pd.DataFrame:
+    columns = MODEL_FEATURES + [LABEL_COL]
+    if data_path.endswith(".csv") or not os.path.isdir(data_path):
+        return load_training_data(data_path, columns=columns)
+    return pd.concat([load_table(p, columns=columns) for p in parquet_files(data_path)], ignore_index=True)
+
+
+def prepare_data(data_path: str, cache_dir: str) -> dict:
+    """Split once per data key; cache DMatrix binaries (train/valid) and the raw holdout."""
+    key = data_key(data_path)
+    root = os.path.join(cache_dir, f"data-{key}")
+    paths = {
+        "key": key,
+        "train": os.path.join(root, "train.buffer"),
+        "valid": os.path.join(root, "valid.buffer"),
+        "holdout": os.path.join(root, "holdout.parquet"),
+    }
+    if all(os.path.exists(p) for k, p in paths.items() if k != "key"):
+        print(f"Using cached data artifacts {root}")
+        return paths
+
+    os.makedirs(root, exist_ok=True)
+    df = _load_raw(data_path)
+    u = np.random.default_rng(SPLIT["seed"]).random(len(df))
+    holdout = u < SPLIT["holdout"]
+    valid = (u >= SPLIT["holdout"]) & (u < SPLIT["holdout"] + SPLIT["valid"])
+    train = ~(holdout | valid)
+
+    for name, mask in (("train", train), ("valid", valid)):
+        part = df[mask]
+        X = preprocess_input(part[MODEL_FEATURES])
+        dmat = xgb.DMatrix(X.to_numpy(dtype=np.float32), label=part[LABEL_COL].to_numpy(),
+                           feature_names=list(X.columns))
+        dmat.save_binary(paths[name] + ".tmp")
+        os.replace(paths[name] + ".tmp", paths[name])
+
+    df[holdout].reset_index(drop=True).to_parquet(paths["holdout"] + ".tmp", index=False)
+    os.replace(paths["holdout"] + ".tmp", paths["holdout"])
+    print(f"Cached data artifacts {root} (train={train.sum()}, valid={valid.sum()}, holdout={holdout.sum()})")
+    return paths
+
+
+# -------------------------
+# Step 2: candidate + champion
+# -------------------------
+class _Deadline(xgb.callback.TrainingCallback):
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.hit = False
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        self.hit = time.monotonic() > self.deadline
+        return self.hit
+
+
+def train_candidate(data: dict, params: dict, num_boost_round: int, deadline: float) -> CreditRiskPyFunc:
+    dtrain = xgb.DMatrix(data["train"])
+    dvalid = xgb.DMatrix(data["valid"])
+    stop = _Deadline(deadline)
+    booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, evals=[(dvalid, "valid")],
+                        early_stopping_rounds=50, callbacks=[stop], verbose_eval=False)
+    if stop.hit:
+        raise BudgetExceeded("time budget exhausted while training the candidate")
+
+    booster = booster[: booster.best_iteration + 1]
+    stats = CalibrationStats()
+    stats.update(booster.predict(dvalid), dvalid.get_label())
+
+    candidate = CreditRiskPyFunc()
+    candidate.booster = booster
+    candidate.calibrator = fit_calibrator(stats, method="isotonic")
+    candidate.calibration_stats = stats
+    return candidate
+
+
+def resolve_champion(client: MlflowClient, name: str, alias: str):
+    try:
+        return client.get_model_version_by_alias(name, alias)
+    except MlflowException:
+        return None
+
+
+def score_champion(champion, data: dict, cache_dir: str) -> pd.DataFrame:
+    """Champion holdout scores, cached per (data key, champion version)."""
+    path = os.path.join(cache_dir, f"data-{data['key']}", f"champion-v{champion.version}-{champion.run_id}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    model = mlflow.pyfunc.load_model(f"models:/{champion.name}/{champion.version}").unwrap_python_model()
+    scores = model.score(pd.read_parquet(data["holdout"], columns=MODEL_FEATURES))
+    scores = scores[["raw_probability", "calibrated_probability"]]
+    scores.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return scores
+
+
+# -------------------------
+# Step 3: gates
+# -------------------------
+def evaluate_gates(y, candidate_scores: pd.DataFrame, champion_scores: pd.DataFrame | None,
+                   reference_scores: np.ndarray | None, latency: dict, gates: dict) -> tuple[dict, dict]:
+    cand_cal = candidate_scores["calibrated_probability"].to_numpy()
+    metrics = {
+        "holdout_auc": roc_auc_score(y, candidate_scores["raw_probability"]),
+        "holdout_ece": expected_calibration_error(y, cand_cal),
+        "latency_p50_ms": latency["p50_ms"],
+        "latency_p95_ms": latency["p95_ms"],
+    }
+    if champion_scores is not None:
+        metrics["champion_auc"] = roc_auc_score(y, champion_scores["raw_probability"])
+        metrics["champion_ece"] = expected_calibration_error(y, champion_scores["calibrated_probability"])
+        metrics["psi"] = population_stability_index(champion_scores["calibrated_probability"], cand_cal)
+    elif reference_scores is not None:
+        metrics["psi"] = population_stability_index(reference_scores, cand_cal)
+
+    results = {
+        "auc": metrics["holdout_auc"] >= gates["min_auc"] and (
+            "champion_auc" not in metrics
+            or metrics["holdout_auc"] >= metrics["champion_auc"] - gates["max_auc_drop"]),
+        "ece": metrics["holdout_ece"] <= gates["max_ece"],
+        "psi": metrics.get("psi", 0.0) <= gates["max_psi"],
+        "latency": metrics["latency_p95_ms"] <= gates["latency_p95_ms"],
+    }
+    return {k: float(v) for k, v in metrics.items()}, results
+
+
+# -------------------------
+# Step 4: log + register
+# -------------------------
+def log_candidate(candidate: CreditRiskPyFunc, params: dict, metrics: dict, gate_results: dict,
+                  data: dict, experiment: str) -> str:
+    mlflow.set_experiment(experiment)
+    with mlflow.start_run() as run, tempfile.TemporaryDirectory() as tmp_dir:
+        mlflow.log_params({**params, "boost_rounds_used": candidate.booster.num_boosted_rounds()})
+        mlflow.log_metrics(metrics)
+        mlflow.set_tags({"data_key": data["key"], **{f"gate.{k}": str(v) for k, v in gate_results.items()}})
+        if not all(gate_results.values()):
+            return run.info.run_id
+
+        calibrator_path = os.path.join(tmp_dir, "calibrator.joblib")
+        joblib.dump(candidate.calibrator, calibrator_path)
+        reference_path = os.path.join(tmp_dir, "train_predictions.parquet")
+        build_reference(candidate.calibration_stats, candidate.calibrator).to_parquet(reference_path, index=False)
+        mlflow.log_artifact(reference_path)
+
+        mlflow.xgboost.log_model(candidate.booster, name="xgb_model", pip_requirements=REQUIREMENTS)
+        mlflow.pyfunc.log_model(
+            name="pyfunc_model",
+            python_model=CreditRiskPyFunc(),
+            artifacts={"xgb_model_uri": f"runs:/{run.info.run_id}/xgb_model", "calibrator_path": calibrator_path},
+            code_paths=CODE_PATHS,
+            pip_requirements=REQUIREMENTS,
+        )
+        return run.info.run_id
+
+
+def promote(client: MlflowClient, run_id: str, name: str, alias: str, metrics: dict, data: dict):
+    version = mlflow.register_model(f"runs:/{run_id}/pyfunc_model", name)
+    for k, v in metrics.items():
+        client.set_model_version_tag(name, version.version, k, f"{v:.6g}")
+    client.set_model_version_tag(name, version.version, "data_key", data["key"])
+    client.set_model_version_tag(name, version.version, "promoted_by", "ci/train_and_promote.py")
+    client.set_registered_model_alias(name, alias, version.version)
+    return version.version
+
+
+def run(args) -> int:
+    t0 = time.monotonic()
+    deadline = t0 + args.time_budget
+    report = {"gates": None, "promoted_version": None}
+
+    def remaining():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise BudgetExceeded("time budget exhausted")
+        return left
+
+    tracking_uri = args.tracking_uri or os.getenv("MLFLOW_TRACKING_URI") or f"file:{os.path.join(REPO_ROOT, 'mlruns')}"
+    os.environ.setdefault("MLFLOW_ALLOW_FILE_STORE", "true")  # newer MLflow refuses file stores without it
+    mlflow.set_tracking_uri(tracking_uri)
+    mlflow.set_registry_uri(tracking_uri)
+    client = MlflowClient()
+
+    params = {**DEFAULT_PARAMS, "nthread": args.nthread}
+    if args.params:
+        with open(args.params) as f:
+            params.update(json.load(f))
+    gates = {**GATES, **{k: v for k, v in vars(args).items() if k in GATES and v is not None}}
+
+    try:
+        data = prepare_data(args.data, args.cache_dir)
+        report["data_key"] = data["key"]
+        remaining()
+
+        champion = resolve_champion(client, args.model_name, args.alias)
+        holdout = pd.read_parquet(data["holdout"])
+        X_hold, y_hold = holdout[MODEL_FEATURES], holdout[LABEL_COL].to_numpy()
+
+        # the champion scores the holdout while the candidate trains (xgboost releases the GIL);
+        # on a timeout the pool is abandoned rather than joined, see __main__
+        pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            champ_future = pool.submit(score_champion, champion, data, args.cache_dir) if champion else None
+            candidate = pool.submit(train_candidate, data, params, args.num_boost_round, deadline).result(remaining())
+            candidate_scores = candidate.score(X_hold)
+            latency = single_row_latency(candidate, X_hold)
+            champion_scores = champ_future.result(remaining()) if champ_future else None
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        reference = None
+        if champion_scores is None and os.path.exists(args.reference):
+            reference = pd.read_parquet(args.reference, columns=["score"])["score"].to_numpy(dtype=float)
+
+        metrics, gate_results = evaluate_gates(y_hold, candidate_scores, champion_scores, reference, latency, gates)
+        report.update(champion=None if champion is None else {"version": champion.version, "run_id": champion.run_id},
+                      metrics=metrics, gates=gate_results, thresholds=gates)
+        remaining()
+
+        run_id = log_candidate(candidate, params, metrics, gate_results, data, args.experiment)
+        report["run_id"] = run_id
+        if all(gate_results.values()):
+            report["promoted_version"] = promote(client, run_id, args.model_name, args.alias, metrics, data)
+        exit_code = 0 if report["promoted_version"] is not None else 1
+
+    except (BudgetExceeded, FutureTimeout) as e:
+        report["error"] = str(e) or "time budget exhausted"
+        exit_code = 2
+
+    report["elapsed_seconds"] = round(time.monotonic() - t0, 2)
+    print(json.dumps(report, indent=2, default=str))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="training CSV/Parquet file or directory of Parquet parts")
+    parser.add_argument("--tracking-uri", help="defaults to $MLFLOW_TRACKING_URI, then a file store at <repo>/mlruns")
+    parser.add_argument("--experiment", default="credit-risk-ci")
+    parser.add_argument("--model-name", default=MODEL_NAME)
+    parser.add_argument("--alias", default=CHAMPION_ALIAS)
+    parser.add_argument("--cache-dir", default=os.path.join(REPO_ROOT, ".ci_cache"))
+    parser.add_argument("--reference", default=os.path.join(BACKEND_DIR, "data", "train_predictions.parquet"),
+                        help="serving percentile reference, used for PSI when there is no champion yet")
+    parser.add_argument("--params", help="JSON file of xgboost params overriding train_external.DEFAULT_PARAMS")
+    parser.add_argument("--num-boost-round", type=int, default=500)
+    parser.add_argument("--nthread", type=int, default=os.cpu_count())
+    parser.add_argument("--time-budget", type=float, default=900.0, help="seconds for the whole pipeline")
+    parser.add_argument("--report", help="also write the JSON report here")
+    for gate, default in GATES.items():
+        parser.add_argument(f"--{gate.replace('_', '-')}", dest=gate, type=float, help=f"gate (default {default})")
+    exit_code = run(parser.parse_args())
+    if exit_code == 2:
+        # out of time: don't let interpreter shutdown join a worker still scoring the champion
+        sys.stdout.flush()
+        os._exit(exit_code)
+    sys.exit(exit_code)
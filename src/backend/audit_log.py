@@ -0,0 +1,403 @@
+"""
+Append-only audit log of scored credit decisions.
+
+Handlers call AuditLog.record(), which coerces the row to the audit schema
+and appends it to a deque (atomic under the GIL, no lock on the request
+path). Rows that cannot be coerced are set aside for the quarantine file
+instead of poisoning a batch. A background thread drains the deque every
+flush_seconds (or as soon as a full batch is waiting) and appends each
+batch to the current journal of its day: an Arrow IPC stream, fsynced per
+flush, hidden from Parquet readers by its leading dot. The journal is
+rotated into one immutable Parquet part once it reaches rotate_bytes or
+rotate_seconds, when the day changes, and on stop:
+
+    <root>/date=2026-10-19/.audit-<pid>-<unix time>-<seq>.arrows     current journal
+    <root>/date=2026-10-19/audit-<pid>-<unix time>-<seq>.parquet     rotated parts
+    <root>/_quarantine/audit-<pid>.jsonl                       rows that failed validation
+
+A failed write puts the batch back at the head of the queue for the next
+flush. Journals left by a process that died are compacted on start.
+read_audit_log() reads parts and live journals back with column projection
+and date pruning.
+"""
+import collections
+import datetime
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils import MODEL_FEATURES
+
+
+AUDIT_MAX_PENDING = 10_000
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 2.0
+AUDIT_ROTATE_BYTES = 64 * 2**20
+AUDIT_ROTATE_SECONDS = 3600.0
+
+JOURNAL_SUFFIX = ".arrows"
+QUARANTINE_DIR = "_quarantine"  # "_" prefix: skipped by the Parquet dataset reader
+
+# fixed schema so every part file (and the dataset as a whole) reads back consistently
+AUDIT_SCHEMA = pa.schema(
+    [("timestamp", pa.timestamp("us", tz="UTC")),
+     ("endpoint", pa.string()),
+     ("customer_id", pa.int64()),
+     ("model_version", pa.string())]
+    + [(f, pa.float64()) for f in MODEL_FEATURES]
+    + [("raw_probability", pa.float64()),
+       ("calibrated_probability", pa.float64()),
+       ("credit_score", pa.float64()),
+       ("apr", pa.float64()),
+       ("recommendation", pa.string())]
+)
+_FLOAT_FIELDS = tuple(MODEL_FEATURES) + ("raw_probability", "calibrated_probability", "credit_score", "apr")
+_STRING_FIELDS = ("endpoint", "model_version", "recommendation")
+
+
+def _as_float(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("expected a number, got a boolean")
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    x = float(value)  # ValueError / TypeError / OverflowError for anything else
+    return None if math.isnan(x) else x
+
+
+def coerce_row(row: dict) -> tuple[dict, dict]:
+    """Row coerced to AUDIT_SCHEMA types, plus {field: error} for values that could not be."""
+    out, errors = dict(row), {}
+    for f in _FLOAT_FIELDS:
+        try:
+            out[f] = _as_float(row.get(f))
+        except (TypeError, ValueError, OverflowError):
+            errors[f] = f"not a number: {row.get(f)!r}"
+    try:
+        cid = row.get("customer_id")
+        out["customer_id"] = None if cid is None else int(cid)
+        if out["customer_id"] is not None and not -2**63 <= out["customer_id"] < 2**63:
+            raise OverflowError
+    except (TypeError, ValueError, OverflowError):
+        errors["customer_id"] = f"not an int64: {row.get('customer_id')!r}"
+    for f in _STRING_FIELDS:
+        if row.get(f) is not None and not isinstance(row.get(f), str):
+            out[f] = str(row[f])
+    return out, errors
+
+
+class AuditLog:
+    def __init__(self, root: str, max_pending: int = AUDIT_MAX_PENDING,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS,
+                 rotate_bytes: int = AUDIT_ROTATE_BYTES, rotate_seconds: float = AUDIT_ROTATE_SECONDS):
+        self.root = root
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self._pending = collections.deque()
+        self._quarantine = collections.deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._journals = {}  # day -> open journal, touched by the writer thread only
+        self._seq = 0
+        self._drop_lock = threading.Lock()  # only taken on the overflow path
+        # everything except "dropped" is updated by the writer thread alone
+        self._metrics = {"dropped": 0, "written": 0, "batches": 0, "failed": 0, "quarantined": 0,
+                         "write_errors": 0, "rotations": 0, "high_watermark": 0, "last_flush_ms": 0.0}
+        os.makedirs(root, exist_ok=True)
+
+    def start(self):
+        if self._thread is None:
+            self._recover_journals()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still pending, rotate the open journals, then stop the writer."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def record(self, endpoint: str, inputs: dict, raw_probability: float, calibrated_probability: float,
+               credit_score: float, apr: float, recommendation: str | None = None,
+               customer_id=None, model_version: str | None = None) -> bool:
+        """Queue one decision. Never blocks; returns False (and counts a drop) when the backlog is full."""
+        depth = len(self._pending)
+        if depth >= self.max_pending:
+            with self._drop_lock:
+                self._metrics["dropped"] += 1
+            return False
+
+        row = {f: inputs.get(f) for f in MODEL_FEATURES}
+        row.update(timestamp=datetime.datetime.now(datetime.timezone.utc), endpoint=endpoint,
+                   customer_id=customer_id, model_version=model_version,
+                   raw_probability=raw_probability, calibrated_probability=calibrated_probability,
+                   credit_score=credit_score, apr=apr, recommendation=recommendation)
+        row, errors = coerce_row(row)
+        if errors:
+            self._quarantine.append((row, errors))
+            self._wake.set()
+            return True
+        self._pending.append(row)
+        if depth + 1 >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def metrics(self) -> dict:
+        out = dict(self._metrics)
+        out["pending"] = len(self._pending)
+        out["enqueued"] = out["written"] + out["failed"] + out["pending"]
+        out["capacity"] = self.max_pending
+        out["utilization"] = round(out["pending"] / self.max_pending, 4)
+        out["open_journals"] = len(self._journals)
+        return out
+
+    # -------------------------
+    # Background writer
+    # -------------------------
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            # backlog peaks right before a flush drains it
+            self._metrics["high_watermark"] = max(self._metrics["high_watermark"], len(self._pending))
+            self._flush_quarantine()
+            while self._pending:
+                if not self._flush_batch():
+                    break  # storage error: the rest was requeued, retry on the next tick
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    break
+            if self._stopping:
+                if self._pending:  # storage is still failing; give up on what is left
+                    self._metrics["failed"] += len(self._pending)
+                    self._pending.clear()
+                self._flush_quarantine()
+                self._rotate_all()
+                return
+            self._rotate_due()
+
+    def _flush_batch(self) -> bool:
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popleft())
+        by_day = collections.defaultdict(list)
+        for row in batch:
+            by_day[row["timestamp"].strftime("%Y-%m-%d")].append(row)
+
+        t0 = time.perf_counter()
+        try:
+            while by_day:
+                day = next(iter(by_day))
+                try:
+                    self._append(day, self._to_table(by_day[day]))
+                except Exception:
+                    if day in self._journals:
+                        self._rotate(day)  # a torn append would hide later batches of this journal
+                    raise
+                rows = by_day.pop(day)
+                self._metrics["written"] += len(rows)
+        except Exception as e:
+            print("Audit log write failed, requeueing batch:", e)
+            self._metrics["write_errors"] += 1
+            self._pending.extendleft(reversed([row for rows in by_day.values() for row in rows]))
+            return False
+        finally:
+            self._metrics["last_flush_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        self._metrics["batches"] += 1
+        return True
+
+    def _to_table(self, rows: list[dict]) -> pa.Table:
+        """Rows as one table; a row Arrow still rejects is quarantined rather than failing the batch."""
+        try:
+            return pa.Table.from_pylist(rows, schema=AUDIT_SCHEMA)
+        except (pa.ArrowException, TypeError, ValueError, OverflowError):
+            good = []
+            for row in rows:
+                try:
+                    pa.Table.from_pylist([row], schema=AUDIT_SCHEMA)
+                    good.append(row)
+                except (pa.ArrowException, TypeError, ValueError, OverflowError) as e:
+                    self._quarantine.append((row, {"row": str(e)}))
+            return pa.Table.from_pylist(good, schema=AUDIT_SCHEMA)
+
+    # -------------------------
+    # Journals and rotation
+    # -------------------------
+    def _append(self, day: str, table: pa.Table):
+        if table.num_rows == 0:
+            return
+        journal = self._journals.get(day)
+        if journal is None:
+            partition = os.path.join(self.root, f"date={day}")
+            os.makedirs(partition, exist_ok=True)
+            opened = time.time()
+            self._seq += 1
+            path = os.path.join(partition, f".audit-{os.getpid()}-{int(opened)}-{self._seq:06d}{JOURNAL_SUFFIX}")
+            sink = open(path, "wb")
+            journal = {"path": path, "sink": sink, "writer": pa.ipc.new_stream(sink, AUDIT_SCHEMA),
+                       "opened": opened}
+            self._journals[day] = journal
+            _fsync_dir(partition)
+        journal["writer"].write_table(table)
+        journal["sink"].flush()
+        os.fsync(journal["sink"].fileno())
+
+    def _rotate_due(self):
+        today = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+        now = time.time()
+        for day, journal in list(self._journals.items()):
+            if (day != today or now - journal["opened"] >= self.rotate_seconds
+                    or journal["sink"].tell() >= self.rotate_bytes):
+                self._rotate(day)
+
+    def _rotate_all(self):
+        for day in list(self._journals):
+            self._rotate(day)
+
+    def _rotate(self, day: str):
+        journal = self._journals.pop(day)
+        try:
+            journal["writer"].close()
+            journal["sink"].close()
+            compact_journal(journal["path"])
+            self._metrics["rotations"] += 1
+        except Exception as e:
+            # the journal stays on disk and is compacted by the next start
+            print("Audit log rotation failed:", e)
+
+    def _recover_journals(self):
+        recover_journals(os.path.join(self.root, "date=*", f".audit-*{JOURNAL_SUFFIX}"), AUDIT_SCHEMA)
+
+    def _flush_quarantine(self):
+        if not self._quarantine:
+            return
+        directory = os.path.join(self.root, QUARANTINE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        items = []
+        while self._quarantine:
+            items.append(self._quarantine.popleft())
+        try:
+            with open(os.path.join(directory, f"audit-{os.getpid()}.jsonl"), "a") as f:
+                for row, errors in items:
+                    f.write(json.dumps({"errors": errors, "row": row}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._metrics["quarantined"] += len(items)
+        except Exception as e:
+            print("Audit quarantine write failed:", e)
+            self._quarantine.extendleft(reversed(items))
+
+
+def _fsync_dir(directory: str):
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_journal(path: str, schema: pa.Schema = AUDIT_SCHEMA) -> pa.Table:
+    """Every complete record batch of a journal; a torn final message (crash mid-write) is skipped."""
+    batches = []
+    with open(path, "rb") as f:
+        try:
+            reader = pa.ipc.open_stream(f)
+            while True:
+                batches.append(reader.read_next_batch())
+        except (StopIteration, pa.ArrowInvalid, OSError):
+            pass
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def compact_journal(path: str, schema: pa.Schema = AUDIT_SCHEMA) -> str | None:
+    """Rewrite a closed journal as one fsynced Parquet part next to it, then delete the journal."""
+    table = read_journal(path, schema)
+    partition = os.path.dirname(path)
+    part_path = None
+    if table.num_rows:
+        name = os.path.basename(path)[1:-len(JOURNAL_SUFFIX)] + ".parquet"
+        part_path = os.path.join(partition, name)
+        tmp_path = os.path.join(partition, "." + name)
+        # write + fsync under a hidden name, then rename and fsync the directory
+        with open(tmp_path, "wb") as f:
+            pq.write_table(table, f, compression="zstd")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, part_path)
+    os.remove(path)
+    _fsync_dir(partition)
+    return part_path
+
+
+def recover_journals(pattern: str, schema: pa.Schema = AUDIT_SCHEMA):
+    """
+    Compact the journals matching `pattern` (hidden ".<name>-<pid>-..." files)
+    that were left by processes that are no longer running.
+    """
+    for path in glob.glob(pattern):
+        pid = int(os.path.basename(path).split("-")[1])
+        if pid != os.getpid() and _pid_alive(pid):
+            continue  # another live worker's current journal
+        try:
+            compact_journal(path, schema)
+        except Exception as e:
+            print("Journal recovery failed:", path, e)
+
+
+def read_audit_log(root: str, columns: list[str] | None = None,
+                   start_date: str | None = None, end_date: str | None = None,
+                   customer_id=None) -> pd.DataFrame:
+    """
+    Read the audit log back (rotated parts plus the current journals),
+    projecting only `columns`. Date bounds (YYYY-MM-DD, inclusive) prune
+    whole partitions; customer_id is pushed down to the Parquet reader.
+    """
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns)
+
+    expr = None
+    if start_date is not None:
+        expr = ds.field("date") >= start_date
+    if end_date is not None:
+        cond = ds.field("date") <= end_date
+        expr = cond if expr is None else expr & cond
+    if customer_id is not None:
+        cond = ds.field("customer_id") == customer_id
+        expr = cond if expr is None else expr & cond
+
+    frames = [ds.dataset(root, format="parquet", partitioning="hive")
+              .to_table(columns=columns, filter=expr).to_pandas()]
+    for path in sorted(glob.glob(os.path.join(root, "date=*", f".audit-*{JOURNAL_SUFFIX}"))):
+        day = os.path.basename(os.path.dirname(path))[len("date="):]
+        table = read_journal(path)
+        table = table.append_column("date", pa.array([day] * table.num_rows, type=pa.string()))
+        frames.append(ds.dataset(table).to_table(columns=columns, filter=expr).to_pandas())
+    return pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True)
@@ -0,0 +1,372 @@
+"""
+Incremental calibration refit and percentile-reference update.
+
+Keeps mergeable sufficient statistics (per-bin counts, positives and
+raw-probability sums over fixed raw-probability bins), folds new labeled
+batches into them, refits the isotonic/Platt calibrator from the bins and
+rebuilds the percentile reference, then publishes both as one versioned
+pair so serving can hot-swap them together.
+
+Layout under --publish-dir (default data/calibration):
+  stats.npz                  sufficient statistics, saved only after a successful publish
+  <version>/calibrator.joblib
+  <version>/reference.parquet
+  current.json               manifest naming the live version (replaced atomically)
+
+    # once: seed the statistics from the full labeled history, scored by the served model
+    python calibration_job.py init data/cs-training.csv --model models:/credit-risk@champion
+    # then per labeled batch (raw_probability + label columns)
+    python calibration_job.py update new_batch.parquet
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.isotonic import IsotonicRegression
+from sklearn.linear_model import LogisticRegression
+
+from utils import MODEL_FEATURES
+
+
+N_BINS = 1000
+N_REFERENCE_QUANTILES = 2001
+
+PUBLISH_DIR = "data/calibration"
+STATS_NAME = "stats.npz"
+MANIFEST_NAME = "current.json"
+CALIBRATOR_NAME = "calibrator.joblib"
+REFERENCE_NAME = "reference.parquet"
+KEEP_VERSIONS = 3      # published pairs kept on disk, including the live one
+INIT_BATCH_ROWS = 100_000
+
+
+class CalibrationStats:
+    """Binned counts of raw probability vs outcome. Two instances merge by addition."""
+
+    def __init__(self, n_bins: int = N_BINS):
+        self.n_bins = n_bins
+        self.count = np.zeros(n_bins)
+        self.positives = np.zeros(n_bins)
+        self.prob_sum = np.zeros(n_bins)
+
+    @property
+    def n(self) -> float:
+        return float(self.count.sum())
+
+    def _bins(self, raw_probs: np.ndarray) -> np.ndarray:
+        return np.clip((raw_probs * self.n_bins).astype(int), 0, self.n_bins - 1)
+
+    def update(self, raw_probs, labels, decay: float = 1.0) -> "CalibrationStats":
+        """
+        Fold a labeled batch in. decay < 1 down-weights history first, so the
+        statistics track a shifting score distribution.
+        """
+        raw_probs = np.asarray(raw_probs, dtype=float).reshape(-1)
+        labels = np.asarray(labels, dtype=float).reshape(-1)
+        if raw_probs.shape != labels.shape:
+            raise ValueError("raw_probs and labels must have the same length")
+
+        if decay != 1.0:
+            self.count *= decay
+            self.positives *= decay
+            self.prob_sum *= decay
+
+        idx = self._bins(raw_probs)
+        self.count += np.bincount(idx, minlength=self.n_bins)
+        self.positives += np.bincount(idx, weights=labels, minlength=self.n_bins)
+        self.prob_sum += np.bincount(idx, weights=raw_probs, minlength=self.n_bins)
+        return self
+
+    def merge(self, other: "CalibrationStats") -> "CalibrationStats":
+        if other.n_bins != self.n_bins:
+            raise ValueError("Cannot merge CalibrationStats with different bin counts")
+        self.count += other.count
+        self.positives += other.positives
+        self.prob_sum += other.prob_sum
+        return self
+
+    def binned(self):
+        """(mean raw probability, observed default rate, weight) for non-empty bins."""
+        mask = self.count > 0
+        w = self.count[mask]
+        return self.prob_sum[mask] / w, self.positives[mask] / w, w
+
+    def save(self, path: str):
+        _atomic_write(path, lambda tmp: np.savez(tmp, count=self.count, positives=self.positives,
+                                                  prob_sum=self.prob_sum), suffix=".npz")
+
+    @classmethod
+    def load(cls, path: str, n_bins: int = N_BINS) -> "CalibrationStats":
+        if not os.path.exists(path):
+            return cls(n_bins)
+        data = np.load(path)
+        stats = cls(len(data["count"]))
+        stats.count, stats.positives, stats.prob_sum = data["count"], data["positives"], data["prob_sum"]
+        return stats
+
+
+class PlattCalibrator:
+    """Sigmoid on the raw log-odds; predict() takes raw probabilities like IsotonicRegression."""
+
+    def __init__(self, a: float, b: float):
+        self.a = a
+        self.b = b
+
+    def predict(self, raw_probs) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(self.a * _logit(raw_probs) + self.b)))
+
+
+def _logit(p, eps: float = 1e-9) -> np.ndarray:
+    p = np.clip(np.asarray(p, dtype=float), eps, 1 - eps)
+    return np.log(p / (1 - p))
+
+
+# -------------------------
+# Refit from sufficient statistics
+# -------------------------
+def fit_calibrator(stats: CalibrationStats, method: str = "isotonic"):
+    x, y, w = stats.binned()
+    if len(x) < 2:
+        raise ValueError("Not enough populated bins to fit a calibrator")
+
+    if method == "isotonic":
+        iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip")
+        return iso.fit(x, y, sample_weight=w)
+
+    if method == "platt":
+        # each bin contributes a weighted positive and a weighted negative row
+        z = _logit(x).reshape(-1, 1)
+        pos = stats.positives[stats.count > 0]
+        lr = LogisticRegression(C=1e6)  # effectively unregularized
+        lr.fit(np.vstack([z, z]), np.r_[np.ones(len(z)), np.zeros(len(z))], sample_weight=np.r_[pos, w - pos])
+        return PlattCalibrator(float(lr.coef_[0, 0]), float(lr.intercept_[0]))
+
+    raise ValueError(f"Unknown calibration method: {method}")
+
+
+def build_reference(stats: CalibrationStats, calibrator, n_quantiles: int = N_REFERENCE_QUANTILES) -> pd.DataFrame:
+    """
+    Percentile reference of calibrated probabilities as a weighted quantile
+    table (same 'score' column serving reads from train_predictions.parquet).
+    """
+    x, _, w = stats.binned()
+    calibrated = np.asarray(calibrator.predict(x), dtype=float)
+    order = np.argsort(calibrated, kind="stable")
+    calibrated, w = calibrated[order], w[order]
+    cdf = (np.cumsum(w) - 0.5 * w) / w.sum()
+    qs = np.linspace(0.0, 1.0, n_quantiles)
+    return pd.DataFrame({"score": np.interp(qs, cdf, calibrated)})
+
+
+# -------------------------
+# Atomic publish
+# -------------------------
+def _atomic_write(path: str, writer, suffix: str = ""):
+    """Write via a temp file in the same directory, then os.replace (atomic on POSIX)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=suffix)
+    os.close(fd)
+    try:
+        writer(tmp)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _file_sha256(path: str, h=None):
+    h = h or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h
+
+
+def _prune_versions(publish_dir: str, live: str, keep: int = KEEP_VERSIONS):
+    versions = [d for d in os.listdir(publish_dir)
+                if d != live and not d.startswith(".") and os.path.isdir(os.path.join(publish_dir, d))]
+    versions.sort(key=lambda d: os.path.getmtime(os.path.join(publish_dir, d)), reverse=True)
+    for d in versions[max(keep - 1, 0):]:
+        shutil.rmtree(os.path.join(publish_dir, d), ignore_errors=True)
+
+
+def publish(calibrator, reference: pd.DataFrame, publish_dir: str, stats: CalibrationStats) -> dict:
+    """
+    Write the calibrator and reference into a new version directory named by
+    their content hash, then switch current.json to it in one os.replace.
+    Readers only ever see a complete pair: the old one or the new one.
+    """
+    os.makedirs(publish_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=publish_dir, prefix=".tmp-")
+    try:
+        joblib.dump(calibrator, os.path.join(staging, CALIBRATOR_NAME))
+        reference.to_parquet(os.path.join(staging, REFERENCE_NAME), index=False)
+        h = _file_sha256(os.path.join(staging, CALIBRATOR_NAME))
+        version = _file_sha256(os.path.join(staging, REFERENCE_NAME), h).hexdigest()[:16]
+        for name in (CALIBRATOR_NAME, REFERENCE_NAME):
+            with open(os.path.join(staging, name), "rb") as f:
+                os.fsync(f.fileno())
+        target = os.path.join(publish_dir, version)
+        if not os.path.exists(target):
+            os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    manifest = {"version": version, "published_at": time.time(), "n_observations": stats.n,
+                "calibrator": f"{version}/{CALIBRATOR_NAME}", "reference": f"{version}/{REFERENCE_NAME}",
+                "calibrator_type": type(calibrator).__name__, "reference_rows": len(reference)}
+
+    def write_manifest(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+
+    _atomic_write(os.path.join(publish_dir, MANIFEST_NAME), write_manifest, suffix=".json")
+    _prune_versions(publish_dir, live=version)
+    return manifest
+
+
+def _refit_and_publish(stats: CalibrationStats, publish_dir: str, stats_path: str, method: str) -> dict:
+    calibrator = fit_calibrator(stats, method=method)
+    reference = build_reference(stats, calibrator)
+    manifest = publish(calibrator, reference, publish_dir, stats)
+    # only after the pair is live, so a failed publish can simply be re-run
+    stats.save(stats_path)
+    return manifest
+
+
+def run_update(batch: pd.DataFrame, publish_dir: str = PUBLISH_DIR, stats_path: str | None = None,
+               probs_col: str = "raw_probability", label_col: str = "SeriousDlqin2yrs",
+               method: str = "isotonic", decay: float = 1.0) -> dict:
+    stats_path = stats_path or os.path.join(publish_dir, STATS_NAME)
+    if not os.path.exists(stats_path):
+        raise FileNotFoundError(f"{stats_path} not found; seed it from the labeled history with `init` first")
+    stats = CalibrationStats.load(stats_path)
+    stats.update(batch[probs_col].to_numpy(), batch[label_col].to_numpy(), decay=decay)
+    return _refit_and_publish(stats, publish_dir, stats_path, method)
+
+
+def iter_labeled_history(path: str, label_col: str = "SeriousDlqin2yrs", batch_rows: int = INIT_BATCH_ROWS):
+    """Yield (MODEL_FEATURES frame, labels) chunks from a CSV, a Parquet file or a directory of parts."""
+    columns = MODEL_FEATURES + [label_col]
+    if path.endswith(".csv"):
+        chunks = pd.read_csv(path, usecols=columns, chunksize=batch_rows)
+    else:
+        import pyarrow.parquet as pq
+        from train_external import parquet_files
+        chunks = (b.to_pandas() for p in parquet_files(path)
+                  for b in pq.ParquetFile(p).iter_batches(batch_size=batch_rows, columns=columns))
+    for df in chunks:
+        df = df[df[label_col].notna()]
+        yield df[MODEL_FEATURES], df[label_col].to_numpy(dtype=float)
+
+
+def run_init(history_path: str, python_model, publish_dir: str = PUBLISH_DIR, stats_path: str | None = None,
+             label_col: str = "SeriousDlqin2yrs", method: str = "isotonic",
+             batch_rows: int = INIT_BATCH_ROWS) -> dict:
+    """
+    Build the statistics once from the full labeled history, using the raw
+    booster probabilities of `python_model` (a CreditRiskPyFunc), and publish
+    the first pair. Replaces any existing statistics.
+    """
+    stats_path = stats_path or os.path.join(publish_dir, STATS_NAME)
+    stats = CalibrationStats()
+    for X_raw, labels in iter_labeled_history(history_path, label_col=label_col, batch_rows=batch_rows):
+        raw = python_model.score(X_raw)["raw_probability"].to_numpy(dtype=float)
+        stats.update(raw, labels)
+    return _refit_and_publish(stats, publish_dir, stats_path, method)
+
+
+# -------------------------
+# Serving-side pickup
+# -------------------------
+class PublishedArtifacts:
+    """
+    Polls the calibration manifest (current.json) and loads the calibrator
+    and reference it names as one pair; a half-loaded pair is never
+    returned. Until a pair has been published, the baseline reference file
+    (already loaded by the caller) is in effect.
+    """
+
+    def __init__(self, manifest_path: str | None, baseline_reference_path: str | None):
+        self.manifest_path = manifest_path
+        self._manifest_mtime = None
+        digest = _file_sha256(baseline_reference_path).hexdigest()[:16] if baseline_reference_path else "none"
+        self._version = f"baseline-{digest}"
+
+    def version(self) -> str:
+        """Content hash of the currently loaded calibrator/reference pair (for cache keys)."""
+        return self._version
+
+    def poll(self):
+        """Return (calibrator, reference DataFrame) when a new pair was published, else (None, None)."""
+        mtime = _mtime(self.manifest_path)
+        if mtime is None or mtime == self._manifest_mtime:
+            return None, None
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["version"] == self._version:
+                self._manifest_mtime = mtime
+                return None, None
+            base = os.path.dirname(os.path.abspath(self.manifest_path))
+            calibrator = joblib.load(os.path.join(base, manifest["calibrator"]))
+            reference = pd.read_parquet(os.path.join(base, manifest["reference"]), columns=["score"])
+        except Exception as e:
+            print("Failed to load published calibration pair:", e)
+            return None, None
+        self._manifest_mtime = mtime
+        self._version = manifest["version"]
+        return calibrator, reference
+
+
+def _mtime(path: str | None):
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    # pickle PlattCalibrator as calibration_job.PlattCalibrator, not __main__.PlattCalibrator
+    from calibration_job import run_init, run_update
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["init", "update"])
+    parser.add_argument("data_path", help="init: labeled history (CSV/Parquet with MODEL_FEATURES + label); "
+                                          "update: Parquet/CSV with raw probabilities and labels")
+    parser.add_argument("--publish-dir", default=PUBLISH_DIR)
+    parser.add_argument("--stats", default=None, help=f"default: <publish-dir>/{STATS_NAME}")
+    parser.add_argument("--model", default=os.getenv("MODEL_URI"), help="init: MLflow pyfunc URI of the served model")
+    parser.add_argument("--probs-col", default="raw_probability")
+    parser.add_argument("--label-col", default="SeriousDlqin2yrs")
+    parser.add_argument("--method", choices=["isotonic", "platt"], default="isotonic")
+    parser.add_argument("--decay", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.action == "init":
+        if not args.model:
+            parser.error("init needs --model (or MODEL_URI)")
+        import mlflow.pyfunc
+        python_model = mlflow.pyfunc.load_model(args.model).unwrap_python_model()
+        print(run_init(args.data_path, python_model, args.publish_dir, args.stats,
+                       label_col=args.label_col, method=args.method))
+    else:
+        if args.data_path.endswith(".csv"):
+            batch = pd.read_csv(args.data_path, usecols=[args.probs_col, args.label_col])
+        else:
+            batch = pd.read_parquet(args.data_path, columns=[args.probs_col, args.label_col])
+        print(run_update(batch, args.publish_dir, args.stats,
+                         probs_col=args.probs_col, label_col=args.label_col,
+                         method=args.method, decay=args.decay))
@@ -0,0 +1,191 @@
+"""
+Columnar data layer: convert raw CSVs once into typed, compressed Parquet
+and load them back with column projection and Identifier filter pushdown.
+
+    python data_store.py convert data/cs-training.csv
+    python data_store.py bench data/cs-training.csv --columns age DebtRatio
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+PARQUET_COMPRESSION = "zstd"
+ROW_GROUP_SIZE = 64_000
+
+# -------------------------
+# Explicit compact schemas
+# -------------------------
+# Counts are small non-negative integers (the 96/98 sentinels fit in int8),
+# stored as nullable Int8/Int16 so a blank cell (e.g. the empty label column
+# of cs-test.csv) reads as <NA> instead of failing; widen_counts turns <NA>
+# into NaN, which keeps XGBoost's missing-value semantics. Continuous
+# values stay float32.
+TRAINING_SCHEMA = {
+    "Unnamed: 0": "int32",
+    "SeriousDlqin2yrs": "Int8",
+    "RevolvingUtilizationOfUnsecuredLines": "float32",
+    "age": "Int16",
+    "NumberOfTime30_59DaysPastDueNotWorse": "Int8",
+    "DebtRatio": "float32",
+    "MonthlyIncome": "float32",
+    "NumberOfOpenCreditLinesAndLoans": "Int8",
+    "NumberOfTimes90DaysLate": "Int8",
+    "NumberRealEstateLoansOrLines": "Int8",
+    "NumberOfTime60_89DaysPastDueNotWorse": "Int8",
+    "NumberOfDependents": "float32",
+}
+
+ENRICHMENT_SCHEMA = {
+    "Unnamed: 0": "int32",
+    "CustomerID": "int32",
+    "NationalID": "int64",
+    "FullName": "string",
+    "DateOfBirth": "string",
+    "Gender": "category",
+    "Employer": "category",
+    "EmploymentType": "category",
+    "TotalInflows": "float32",
+    "TotalOutflows": "float32",
+    "AverageMonthlyInflows": "float32",
+    "AverageMonthlyOutflows": "float32",
+    "NetPosition": "float32",
+    "MonthlySalaryDeducted": "float32",
+    "JudiciaryCaseCount": "int8",
+    "JudiciaryCaseFlag": "bool",
+    "JudiciaryCaseDetails": "string",
+    "TravelBan": "bool",
+    "LegalRestrictions": "category",
+}
+
+
+def parquet_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def convert_csv_to_parquet(csv_path: str, parquet_path: str | None = None,
+                           schema: dict | None = None, sort_by: str | None = None) -> str:
+    """
+    Read a CSV once with explicit dtypes and write it as zstd Parquet.
+    Sorting by the key column keeps row-group min/max statistics tight, so
+    Identifier filters can skip whole row groups.
+    """
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    dtypes = {c: t for c, t in (schema or {}).items() if c in header}
+
+    df = pd.read_csv(csv_path, dtype=dtypes)
+    if sort_by is not None and sort_by in df.columns:
+        df = df.sort_values(sort_by, kind="stable").reset_index(drop=True)
+
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, index=False, compression=PARQUET_COMPRESSION,
+                  row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def ensure_parquet(csv_path: str, schema: dict | None = None, sort_by: str | None = None) -> str:
+    """Return the Parquet twin of csv_path, (re)converting only if missing or older than the CSV."""
+    parquet_path = parquet_path_for(csv_path)
+    if (not os.path.exists(parquet_path)
+            or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path)):
+        convert_csv_to_parquet(csv_path, parquet_path, schema=schema, sort_by=sort_by)
+    return parquet_path
+
+
+def load_table(path: str, columns: list[str] | None = None, ids=None,
+               id_column: str = "Identifier") -> pd.DataFrame:
+    """
+    Load a Parquet table reading only `columns`, and only rows whose
+    id_column is in `ids` (pushed down to the Parquet reader).
+    """
+    filters = None
+    if ids is not None:
+        filters = [(id_column, "in", list(ids))]
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+
+def parquet_columns(path: str) -> list[str]:
+    return pq.ParquetFile(path).schema_arrow.names
+
+
+def widen_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Upcast the compact (nullable) int8/int16 counts to float64 before
+    arithmetic on them: sums of the 96/98 sentinels overflow int8 (98 + 98
+    wraps to -60). <NA> becomes NaN. Returns a copy.
+    """
+    narrow = [c for c in df.columns if df[c].dtype.kind in "iu" and df[c].dtype.itemsize < 8]
+    df = df.copy()
+    if narrow:
+        df[narrow] = df[narrow].astype("float64")
+    return df
+
+
+# -------------------------
+# Benchmark: CSV vs Parquet
+# -------------------------
+def _measure(loader, args, out):
+    import resource  # Unix-only; keep the data layer importable elsewhere
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    df = loader(*args)
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put({
+        "seconds": round(elapsed, 4),
+        "peak_rss_delta_mb": round((peak - rss_before) / 1024, 1),  # ru_maxrss is KiB on Linux
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        "rows": len(df),
+    })
+
+
+def _read_csv(path, columns):
+    return pd.read_csv(path, usecols=columns)
+
+
+def _run_isolated(loader, *args) -> dict:
+    # each load runs in a fresh process so peak RSS is not polluted by the other
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(loader, args, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def benchmark_load(csv_path: str, schema: dict | None = None,
+                   columns: list[str] | None = None) -> pd.DataFrame:
+    """Compare load time and peak memory of the plain CSV path vs typed Parquet."""
+    parquet_path = ensure_parquet(csv_path, schema=schema)
+    rows = {
+        "csv": _run_isolated(_read_csv, csv_path, columns),
+        "parquet": _run_isolated(load_table, parquet_path, columns),
+    }
+    report = pd.DataFrame(rows).T
+    report["file_mb"] = [round(os.path.getsize(p) / 2**20, 2) for p in (csv_path, parquet_path)]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["convert", "bench"])
+    parser.add_argument("csv_path")
+    parser.add_argument("--columns", nargs="*", default=None)
+    parser.add_argument("--enrichment", action="store_true",
+                        help="use the Saudi enrichment schema instead of the training schema")
+    args = parser.parse_args()
+
+    schema = ENRICHMENT_SCHEMA if args.enrichment else TRAINING_SCHEMA
+    sort_by = "CustomerID" if args.enrichment else None
+    if args.action == "convert":
+        print("Wrote", convert_csv_to_parquet(args.csv_path, schema=schema, sort_by=sort_by))
+    else:
+        print(benchmark_load(args.csv_path, schema=schema, columns=args.columns))
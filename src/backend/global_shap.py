@@ -0,0 +1,281 @@
+"""
+Global SHAP job: exact TreeSHAP (XGBoost pred_contribs / pred_interactions)
+over the full reference set, one (file, row group) task per worker in a
+process pool. A worker streams its row group once in --chunk-rows slices
+and returns mergeable partial sums, so every row is decoded exactly once
+and memory is bounded by chunk size x workers. Parallelism comes from the
+row groups (data_store writes 64k-row groups).
+
+Contributions cover every row. Interaction values cost ~(n_features + 1)x
+as much, so they are estimated from a seeded random sample of each chunk
+(--interaction-rows per chunk, 0 for every row).
+
+Outputs (Parquet, in --out-dir, by default a scratch directory under the
+system temp dir; point it at data/ to replace the committed tables):
+  feature_importance.parquet  feature, importance (mean |SHAP|), mean_shap
+  shap_dependence.parquet     per feature and value bin: count, mean value, mean/std SHAP
+  shap_interactions.parquet   feature pairs by mean |SHAP interaction|
+
+    python global_shap.py data/cs-training.parquet --model xgb_model.json --workers 8
+    python global_shap.py data/cs-training.parquet --model runs:/<run-id>/xgb_model --scaling 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from preprocess import preprocess_input
+from utils import MODEL_FEATURES
+
+
+CHUNK_ROWS = 50_000
+N_DEPENDENCE_BINS = 20
+EDGE_SAMPLE_ROWS = 200_000
+INTERACTION_ROWS = 2_000
+READ_BUFFER_BYTES = 1 << 20
+
+_booster = None
+_edges = None
+_interaction_rows = None
+
+
+# -------------------------
+# Worker side
+# -------------------------
+def _init_worker(model_path: str, edges: list[np.ndarray], interaction_rows: int | None):
+    global _booster, _edges, _interaction_rows
+    _booster = xgb.Booster()
+    _booster.load_model(model_path)
+    _booster.set_param({"nthread": 1})  # parallelism comes from the pool
+    _edges = edges
+    _interaction_rows = interaction_rows
+
+
+def _empty_stats(n_features: int, n_bins: int, interactions: bool) -> dict:
+    stats = {
+        "n": 0,
+        "sum_abs": np.zeros(n_features),
+        "sum": np.zeros(n_features),
+        "bin_count": np.zeros((n_features, n_bins)),
+        "bin_value": np.zeros((n_features, n_bins)),
+        "bin_shap": np.zeros((n_features, n_bins)),
+        "bin_shap_sq": np.zeros((n_features, n_bins)),
+    }
+    if interactions:
+        stats["n_interaction"] = 0
+        stats["sum_abs_interaction"] = np.zeros((n_features, n_features))
+    return stats
+
+
+def _accumulate(stats: dict, X: pd.DataFrame, seed: int):
+    dmat = xgb.DMatrix(X.values, feature_names=list(X.columns))
+    contribs = _booster.predict(dmat, pred_contribs=True)[:, :-1].astype(float)
+    values = X.to_numpy(dtype=float)
+    n_bins = stats["bin_count"].shape[1]
+
+    stats["n"] += len(X)
+    stats["sum_abs"] += np.abs(contribs).sum(axis=0)
+    stats["sum"] += contribs.sum(axis=0)
+    for j, edges in enumerate(_edges):
+        col = values[:, j]
+        ok = ~np.isnan(col)
+        b = np.clip(np.searchsorted(edges, col[ok], side="right") - 1, 0, n_bins - 1)
+        stats["bin_count"][j] += np.bincount(b, minlength=n_bins)
+        stats["bin_value"][j] += np.bincount(b, weights=col[ok], minlength=n_bins)
+        stats["bin_shap"][j] += np.bincount(b, weights=contribs[ok, j], minlength=n_bins)
+        stats["bin_shap_sq"][j] += np.bincount(b, weights=contribs[ok, j] ** 2, minlength=n_bins)
+
+    if _interaction_rows is not None:
+        if 0 < _interaction_rows < len(X):
+            rows = np.random.default_rng(seed).choice(len(X), _interaction_rows, replace=False)
+            dmat = xgb.DMatrix(X.values[np.sort(rows)], feature_names=list(X.columns))
+        inter = _booster.predict(dmat, pred_interactions=True)[:, :-1, :-1]
+        stats["n_interaction"] += inter.shape[0]
+        stats["sum_abs_interaction"] += np.abs(inter).sum(axis=0)
+
+
+def _iter_slices(path: str, row_group: int, chunk_rows: int):
+    """(offset, frame) for consecutive chunk_rows slices of one row group, in a single streaming pass."""
+    # buffered column-chunk reads: without them the whole row group's column chunks are read up front
+    parquet = pq.ParquetFile(path, buffer_size=READ_BUFFER_BYTES, pre_buffer=False)
+    offset = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, row_groups=[row_group], columns=MODEL_FEATURES):
+        yield offset, batch.to_pandas()
+        offset += batch.num_rows
+
+
+def _row_group_stats(task) -> dict:
+    path, row_group, chunk_rows = task
+    stats = _empty_stats(len(_edges), len(_edges[0]) - 1, _interaction_rows is not None)
+    for offset, chunk in _iter_slices(path, row_group, chunk_rows):
+        _accumulate(stats, preprocess_input(chunk), seed=row_group * 1_000_003 + offset)
+    return stats
+
+
+def _merge(a: dict, b: dict) -> dict:
+    for key, value in b.items():
+        a[key] = a[key] + value
+    return a
+
+
+# -------------------------
+# Driver side
+# -------------------------
+def dependence_edges(paths: list[str], n_bins: int = N_DEPENDENCE_BINS,
+                     sample_rows: int = EDGE_SAMPLE_ROWS, seed: int = 42) -> tuple[list[str], list[np.ndarray]]:
+    """Quantile bin edges per engineered feature, from a bounded random sample of row groups."""
+    rng = np.random.default_rng(seed)
+    groups = [(p, g) for p in paths for g in range(pq.ParquetFile(p).num_row_groups)]
+    rng.shuffle(groups)
+
+    frames, rows = [], 0
+    for path, g in groups:
+        # only the rows still missing from each group, so memory stays within sample_rows
+        batches = pq.ParquetFile(path).iter_batches(batch_size=sample_rows - rows, row_groups=[g],
+                                                    columns=MODEL_FEATURES)
+        batch = next(batches, None)
+        if batch is not None:
+            frames.append(batch.to_pandas())
+            rows += len(frames[-1])
+        if rows >= sample_rows:
+            break
+    X = preprocess_input(pd.concat(frames, ignore_index=True).head(sample_rows))
+
+    qs = np.linspace(0, 1, n_bins + 1)
+    edges = []
+    for col in X.columns:
+        e = np.nanquantile(X[col].to_numpy(dtype=float), qs)
+        edges.append(np.nan_to_num(e))
+    return list(X.columns), edges
+
+
+def row_group_tasks(paths: list[str], chunk_rows: int = CHUNK_ROWS) -> list[tuple[str, int, int]]:
+    """(path, row group, chunk_rows) per non-empty row group, from the footers only."""
+    tasks = []
+    for path in paths:
+        meta = pq.ParquetFile(path).metadata
+        tasks += [(path, g, chunk_rows) for g in range(meta.num_row_groups) if meta.row_group(g).num_rows]
+    return tasks
+
+
+def compute_global_shap(paths: list[str], model_path: str, workers: int | None = None,
+                        chunk_rows: int = CHUNK_ROWS, n_bins: int = N_DEPENDENCE_BINS,
+                        interaction_rows: int | None = INTERACTION_ROWS) -> dict:
+    """
+    Run the pool over every row group (streamed in chunk_rows slices) and
+    return merged statistics plus the feature order. interaction_rows=None skips interactions, 0
+    computes them for every row.
+    """
+    features, edges = dependence_edges(paths, n_bins=n_bins)
+    tasks = row_group_tasks(paths, chunk_rows)
+
+    total = _empty_stats(len(features), n_bins, interaction_rows is not None)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, edges, interaction_rows)) as pool:
+        for partial in pool.map(_row_group_stats, tasks):
+            total = _merge(total, partial)
+
+    total["features"] = features
+    total["edges"] = edges
+    return total
+
+
+def summarize(stats: dict) -> dict[str, pd.DataFrame]:
+    features, n = stats["features"], stats["n"]
+
+    importance = pd.DataFrame({
+        "feature": features,
+        "importance": stats["sum_abs"] / n,
+        "mean_shap": stats["sum"] / n,
+    }).sort_values("importance", ascending=False).reset_index(drop=True)
+
+    rows = []
+    for j, f in enumerate(features):
+        edges = stats["edges"][j]
+        for b in range(stats["bin_count"].shape[1]):
+            c = stats["bin_count"][j, b]
+            if c == 0:
+                continue
+            mean_shap = stats["bin_shap"][j, b] / c
+            rows.append({
+                "feature": f, "bin": b, "lower": edges[b], "upper": edges[b + 1], "count": int(c),
+                "mean_value": stats["bin_value"][j, b] / c,
+                "mean_shap": mean_shap,
+                "std_shap": float(np.sqrt(max(stats["bin_shap_sq"][j, b] / c - mean_shap ** 2, 0.0))),
+            })
+    dependence = pd.DataFrame(rows)
+
+    out = {"feature_importance": importance, "shap_dependence": dependence}
+    if "sum_abs_interaction" in stats:
+        m = stats["sum_abs_interaction"] / stats["n_interaction"]
+        a, b = np.triu_indices(len(features), k=1)
+        out["shap_interactions"] = pd.DataFrame({
+            "feature_a": np.asarray(features)[a],
+            "feature_b": np.asarray(features)[b],
+            # pred_interactions splits each pair symmetrically across (a, b) and (b, a)
+            "interaction_strength": m[a, b] + m[b, a],
+        }).sort_values("interaction_strength", ascending=False).reset_index(drop=True)
+    return out
+
+
+def write_outputs(tables: dict[str, pd.DataFrame], out_dir: str) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, df in tables.items():
+        path = os.path.join(out_dir, f"{name}.parquet")
+        tmp_path = path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        written.append(path)
+    return written
+
+
+def resolve_model(model: str) -> str:
+    """A booster file path as-is; an MLflow URI is loaded once and saved as JSON for the workers."""
+    if "://" not in model and not model.startswith(("runs:", "models:")):
+        return model
+    import mlflow.xgboost
+    booster = mlflow.xgboost.load_model(model)
+    if hasattr(booster, "get_booster"):
+        booster = booster.get_booster()
+    path = os.path.join(tempfile.mkdtemp(prefix="global-shap-"), "booster.json")
+    booster.save_model(path)
+    return path
+
+
+if __name__ == "__main__":
+    from train_external import parquet_files
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="Parquet file or directory of Parquet parts")
+    parser.add_argument("--model", required=True, help="booster file or MLflow model URI")
+    parser.add_argument("--out-dir", default=os.path.join(tempfile.gettempdir(), "global-shap"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--interaction-rows", type=int, default=INTERACTION_ROWS,
+                        help="rows sampled per chunk for interactions (0 = all rows)")
+    parser.add_argument("--no-interactions", action="store_true")
+    parser.add_argument("--scaling", type=int, nargs="*", help="only time the job for these worker counts")
+    args = parser.parse_args()
+
+    paths = parquet_files(args.data)
+    model_path = resolve_model(args.model)
+    interaction_rows = None if args.no_interactions else args.interaction_rows
+
+    if args.scaling:
+        for w in args.scaling:
+            t0 = time.perf_counter()
+            stats = compute_global_shap(paths, model_path, workers=w, chunk_rows=args.chunk_rows,
+                                        interaction_rows=interaction_rows)
+            print(f"workers={w}: {time.perf_counter() - t0:.2f} s for {stats['n']} rows")
+    else:
+        stats = compute_global_shap(paths, model_path, workers=args.workers, chunk_rows=args.chunk_rows,
+                                    interaction_rows=interaction_rows)
+        for path in write_outputs(summarize(stats), args.out_dir):
+            print("Wrote", path)
@@ -0,0 +1,253 @@
+"""
+Book-level portfolio aggregates for /portfolio.
+
+Every scored customer contributes one additive measure vector (count, sum
+of PD, expected loss, APR, APR-band counts, approvable exposure per tenure)
+to one segment cell keyed by (age band, delinquency history, score band).
+Cells are plain sums, so:
+
+  - a re-scored customer is updated in place: subtract the old vector,
+    add the new one (upsert by key);
+  - a filtered / grouped query only sums the matching cells (a few dozen),
+    independent of how many customers are in the book.
+
+Transient members (ad-hoc /predict_1 applicants) are capped and expire, so
+the cube stays bounded by the book plus max_transient.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import FOIR_CAP, LGD, TENURE_OPTIONS
+
+
+MAX_TRANSIENT = 10_000            # applicants kept in the cube at most
+TRANSIENT_TTL_SECONDS = 24 * 3600
+EAD_TENURE = max(TENURE_OPTIONS)  # exposure at default: approvable amount at the PD horizon (2y)
+
+AGE_BAND_EDGES = [25, 35, 45, 55, 65]
+SCORE_BAND_EDGES = [450, 550, 650, 750]
+APR_BAND_EDGES = [0.15, 0.20, 0.25, 0.30]
+
+DPD_COLUMNS = [
+    "NumberOfTime30_59DaysPastDueNotWorse",
+    "NumberOfTimes90DaysLate",
+    "NumberOfTime60_89DaysPastDueNotWorse",
+]
+
+
+def _band_labels(edges, fmt=str) -> list[str]:
+    labels = [f"<{fmt(edges[0])}"]
+    labels += [f"{fmt(lo)}-{fmt(hi)}" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels.append(f"{fmt(edges[-1])}+")
+    return labels
+
+
+AGE_BANDS = _band_labels(AGE_BAND_EDGES) + ["unknown"]
+SCORE_BANDS = _band_labels(SCORE_BAND_EDGES)
+APR_BANDS = _band_labels(APR_BAND_EDGES, fmt=lambda r: f"{r:.0%}")
+
+DIMENSIONS = {
+    "age_band": AGE_BANDS,
+    "has_delinquency_history": [0, 1],
+    "score_band": SCORE_BANDS,
+}
+
+MEASURES = (["customers", "sum_pd", "expected_loss", "sum_apr"]
+            + [f"apr_band:{b}" for b in APR_BANDS]
+            + [f"exposure:{t}" for t in TENURE_OPTIONS])
+_APR_SLICE = slice(4, 4 + len(APR_BANDS))
+_EXPOSURE_SLICE = slice(4 + len(APR_BANDS), len(MEASURES))
+
+
+def approvable_exposure(monthly_income, debt_ratio, apr) -> np.ndarray:
+    """Vectorized calculate_loan_options: (n, len(TENURE_OPTIONS)) approvable principal."""
+    income = np.nan_to_num(np.asarray(monthly_income, dtype=float))
+    debt_ratio = np.nan_to_num(np.asarray(debt_ratio, dtype=float))
+    max_new_emi = np.where(income > 0, np.maximum(0.0, FOIR_CAP * income - income * debt_ratio), 0.0)
+
+    r = (np.asarray(apr, dtype=float) / 12.0)[:, None]
+    t = np.asarray(TENURE_OPTIONS, dtype=float)[None, :]
+    f = (1 + r) ** t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        principal = np.where(r > 0, max_new_emi[:, None] * (f - 1) / (r * f), max_new_emi[:, None] * t)
+    return principal
+
+
+def segment_measures(age, delinquent, credit_score, calibrated_probability, apr,
+                     monthly_income, debt_ratio) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Segment codes (n, len(DIMENSIONS)) and measure vectors (n, len(MEASURES))
+    for a batch. A missing age goes to the "unknown" age band; a missing PD
+    or APR raises ValueError (it would poison every sum it is added to).
+    """
+    age = np.asarray(age, dtype=float)
+    pd_prob = np.asarray(calibrated_probability, dtype=float)
+    apr = np.asarray(apr, dtype=float)
+    n = len(pd_prob)
+    if np.isnan(pd_prob).any() or np.isnan(apr).any():
+        raise ValueError("calibrated_probability and apr must not be NaN")
+
+    codes = np.column_stack([
+        np.where(np.isnan(age), AGE_BANDS.index("unknown"), np.digitize(np.nan_to_num(age), AGE_BAND_EDGES)),
+        (np.asarray(delinquent, dtype=float) > 0).astype(int),
+        np.digitize(np.asarray(credit_score, dtype=float), SCORE_BAND_EDGES),
+    ])
+
+    exposure = approvable_exposure(monthly_income, debt_ratio, apr)
+    values = np.zeros((n, len(MEASURES)))
+    values[:, 0] = 1.0
+    values[:, 1] = pd_prob
+    values[:, 2] = pd_prob * LGD * exposure[:, TENURE_OPTIONS.index(EAD_TENURE)]
+    values[:, 3] = apr
+    values[np.arange(n), _APR_SLICE.start + np.digitize(apr, APR_BAND_EDGES)] = 1.0
+    values[:, _EXPOSURE_SLICE] = exposure
+    return codes, values
+
+
+def book_frame(customers: pd.DataFrame, scores: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the customer book (Identifier + MODEL_FEATURES) with its scores
+    (Identifier, calibrated_probability, credit_score, apr) into the columns
+    PortfolioCube.upsert_frame expects.
+    """
+    book = customers[["Identifier", "age", "MonthlyIncome", "DebtRatio"]].copy()
+    book["has_delinquency_history"] = customers[DPD_COLUMNS].astype(float).fillna(0).sum(axis=1) > 0
+    return book.merge(scores[["Identifier", "calibrated_probability", "credit_score", "apr"]], on="Identifier")
+
+
+class PortfolioCube:
+    def __init__(self, max_transient: int = MAX_TRANSIENT, transient_ttl: float = TRANSIENT_TTL_SECONDS):
+        self.max_transient = max_transient
+        self.transient_ttl = transient_ttl
+        self._lock = threading.Lock()
+        self._cells = {}    # segment codes -> summed measure vector
+        self._members = {}  # customer key -> (segment codes, measure vector)
+        self._transient = collections.OrderedDict()  # transient key -> last upsert time, oldest first
+
+    def __len__(self):
+        return len(self._members)
+
+    def _subtract(self, key):
+        # caller holds the lock
+        old = self._members.pop(key, None)
+        if old is None:
+            return False
+        self._cells[old[0]] -= old[1]
+        if self._cells[old[0]][0] <= 0:
+            del self._cells[old[0]]
+        return True
+
+    def _apply(self, keys, codes: np.ndarray, values: np.ndarray, transient: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            for key, code, value in zip(keys, map(tuple, codes.tolist()), values):
+                self._subtract(key)
+                cell = self._cells.get(code)
+                self._cells[code] = value.copy() if cell is None else cell + value
+                self._members[key] = (code, value)
+                if transient:
+                    self._transient[key] = now
+                    self._transient.move_to_end(key)
+                else:
+                    self._transient.pop(key, None)
+            self._expire(now)
+
+    def _expire(self, now: float):
+        # caller holds the lock; oldest first, so stop at the first entry that may stay
+        while self._transient:
+            key, seen = next(iter(self._transient.items()))
+            if len(self._transient) <= self.max_transient and now - seen < self.transient_ttl:
+                break
+            del self._transient[key]
+            self._subtract(key)
+
+    def upsert(self, key, age, has_delinquency_history, credit_score, calibrated_probability, apr,
+               monthly_income, debt_ratio, transient: bool = False):
+        """
+        Add one scored customer, replacing their previous contribution if
+        already present. Transient members are dropped after transient_ttl or
+        once more than max_transient are held. Raises ValueError on a NaN PD.
+        """
+        codes, values = segment_measures([age], [has_delinquency_history], [credit_score],
+                                         [calibrated_probability], [apr], [monthly_income], [debt_ratio])
+        self._apply([key], codes, values, transient=transient)
+
+    def upsert_frame(self, df: pd.DataFrame, key_column: str = "Identifier") -> int:
+        """Batch upsert from book_frame() output; rows without a PD or APR are skipped. Returns rows upserted."""
+        df = df[df["calibrated_probability"].notna() & df["apr"].notna()]
+        codes, values = segment_measures(df["age"], df["has_delinquency_history"], df["credit_score"],
+                                         df["calibrated_probability"], df["apr"],
+                                         df["MonthlyIncome"], df["DebtRatio"])
+        self._apply(df[key_column].tolist(), codes, values)
+        return len(df)
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            self._transient.pop(key, None)
+            return self._subtract(key)
+
+    def expire(self) -> int:
+        """Drop expired transient members now (upserts also do this). Returns how many are left."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._transient)
+
+    def query(self, filters: dict | None = None, group_by: list[str] | None = None) -> dict:
+        """
+        Sum the cells matching `filters` ({dimension: value or [values]}),
+        optionally split by `group_by` dimensions. Raises ValueError on
+        unknown dimensions or values.
+        """
+        names = list(DIMENSIONS)
+        allowed = {}
+        for dim, wanted in (filters or {}).items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"unknown dimension {dim!r}; expected one of {names}")
+            wanted = wanted if isinstance(wanted, list) else [wanted]
+            bad = [w for w in wanted if w not in DIMENSIONS[dim]]
+            if bad:
+                raise ValueError(f"unknown {dim} value(s) {bad}; expected one of {DIMENSIONS[dim]}")
+            allowed[names.index(dim)] = {DIMENSIONS[dim].index(w) for w in wanted}
+
+        group_by = list(group_by or [])
+        for dim in group_by:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"unknown dimension {dim!r}; expected one of {names}")
+        group_idx = [names.index(d) for d in group_by]
+
+        total = np.zeros(len(MEASURES))
+        groups = {}
+        with self._lock:
+            for code, value in self._cells.items():
+                if any(code[i] not in ok for i, ok in allowed.items()):
+                    continue
+                total += value
+                if group_idx:
+                    g = tuple(code[i] for i in group_idx)
+                    groups[g] = groups[g] + value if g in groups else value.copy()
+
+        out = {"total": _summarize(total)}
+        if group_idx:
+            out["groups"] = [
+                {**{d: DIMENSIONS[d][c] for d, c in zip(group_by, g)}, **_summarize(groups[g])}
+                for g in sorted(groups)
+            ]
+        return out
+
+
+def _summarize(v: np.ndarray) -> dict:
+    n = v[0]
+    if n <= 0:
+        return {"customers": 0}
+    return {
+        "customers": int(round(n)),
+        "avg_pd": round(v[1] / n, 6),
+        "expected_loss": round(v[2], 2),
+        "avg_apr": round(v[3] / n, 6),
+        "apr_mix": {b: round(c / n, 4) for b, c in zip(APR_BANDS, v[_APR_SLICE])},
+        "approvable_exposure": {str(t): round(e, 2) for t, e in zip(TENURE_OPTIONS, v[_EXPOSURE_SLICE])},
+    }
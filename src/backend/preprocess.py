@@ -1,7 +1,12 @@
 import pandas as pd
 import numpy as np
+
+from data_store import widen_counts
+
 def preprocess_input(data: pd.DataFrame):
-    data = data.copy()
+    # compact int8/int16 counts (Parquet data layer) would overflow in the sums below; returns a copy
+    data = widen_counts(data)
+
     # 1. Credit Utilization per Open Credit Line
     data['CreditUtilizationPerLine'] = data['RevolvingUtilizationOfUnsecuredLines'] / (data['NumberOfOpenCreditLinesAndLoans'] + 1)
 
@@ -0,0 +1,156 @@
+"""
+Response serialization for the scoring endpoints: direct orjson encoding
+of NumPy values, ?fields= selection, negotiated br/gzip compression and
+per-endpoint byte/time counters.
+"""
+import gzip
+import json
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # plain json fallback for local dev without orjson
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _finite(obj):
+    # what orjson does natively: NaN/inf -> null, at any depth
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(obj.tolist())
+    return obj
+
+
+def dumps(obj) -> bytes:
+    """JSON bytes; NumPy scalars/arrays are serialized natively, NaN/inf become null."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY, default=_json_default)
+    return json.dumps(_finite(obj), default=_json_default, allow_nan=False).encode("utf-8")
+
+
+def loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def round_features(row: pd.Series, drop=("Unnamed: 0", "Identifier"), digits: int = 2) -> dict:
+    """
+    Customer features for the response in one vectorized pass: numeric values
+    rounded to `digits`, missing values as None, anything else as str.
+    """
+    row = row.drop(labels=[c for c in drop if c in row.index])
+    numeric = pd.to_numeric(row, errors="coerce").to_numpy(dtype=float)
+    missing = pd.isna(row).to_numpy()
+    rounded = np.round(numeric, digits).astype(object)
+    rounded[missing] = None
+    is_text = np.isnan(numeric) & ~missing
+    if is_text.any():
+        rounded[is_text] = row[is_text].astype(str).to_numpy()
+    return dict(zip(row.index, rounded.tolist()))
+
+
+def requested(fields: str | None, *keys) -> bool:
+    """Whether a ?fields= selection (empty = everything) includes any of `keys`; lets callers skip unrequested work."""
+    return not fields or any(f.strip() in keys for f in fields.split(","))
+
+
+def select_fields(result: dict, fields: str | None) -> dict:
+    """Keep only the comma-separated top-level keys in `fields` (all keys if empty)."""
+    if not fields:
+        return result
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    return {k: result[k] for k in wanted if k in result}
+
+
+def _negotiate(accept_encoding: str) -> str | None:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class SerializationStats:
+    """Per-endpoint counters: calls, raw/sent bytes and time spent encoding."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint: str, raw_bytes: int, sent_bytes: int, seconds: float):
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {"calls": 0, "raw_bytes": 0, "sent_bytes": 0, "seconds": 0.0})
+            s["calls"] += 1
+            s["raw_bytes"] += raw_bytes
+            s["sent_bytes"] += sent_bytes
+            s["seconds"] += seconds
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    "calls": s["calls"],
+                    "avg_raw_bytes": round(s["raw_bytes"] / s["calls"], 1),
+                    "avg_sent_bytes": round(s["sent_bytes"] / s["calls"], 1),
+                    "avg_serialize_ms": round(s["seconds"] / s["calls"] * 1000, 3),
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+
+serialization_stats = SerializationStats()
+
+
+def encode_response(request: Request, result, endpoint: str, fields: str | None = None) -> Response:
+    """
+    Serialize `result` (a dict, or already-encoded JSON bytes such as a
+    score-table payload), apply field selection and compress if the client
+    accepts it and the body is large enough to be worth it.
+    """
+    t0 = time.perf_counter()
+    if isinstance(result, (bytes, bytearray)):
+        body = bytes(result) if not fields else dumps(select_fields(loads(result), fields))
+    else:
+        body = dumps(select_fields(result, fields))
+    raw_bytes = len(body)
+
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = _negotiate(request.headers.get("accept-encoding", "")) if raw_bytes >= MIN_COMPRESS_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+        headers["Content-Encoding"] = "br"
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    serialization_stats.record(endpoint, raw_bytes, len(body), time.perf_counter() - t0)
+    return Response(content=body, media_type="application/json", headers=headers)
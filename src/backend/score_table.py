@@ -0,0 +1,219 @@
+"""
+Precomputed score table for the known-customer book.
+
+The whole book is scored offline in vectorized batches and written as an
+Arrow IPC file keyed by Identifier. Serving memory-maps it and answers
+/predict for a known customer with a dict lookup, falling back to live
+scoring when the model version or the customer's row fingerprint differs.
+
+The stored payload is the complete /predict response, including the force
+plot and the analyst verdict, so a hit costs a lookup and no per-request
+rendering or LLM call. Both are tied to the model version and row
+fingerprint like everything else in the table: re-materialize to refresh.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import xgboost as xgb
+
+from preprocess import preprocess_input
+from request_schema import FEATURE_SCHEMA
+from response_codec import dumps
+from utils import (MODEL_FEATURES, calculate_loan_options, compute_risk_based_rate,
+                   percentile_of_scores)
+
+
+SCORE_TABLE_PATH = "data/score_table.arrow"
+BATCH_SIZE = 4096
+TOP_K = 2
+DISPLAY_DIGITS = 2
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Stable 64-bit hash per row; any change to a customer's source row changes it."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def display_round(values) -> np.ndarray:
+    """
+    SHAP and feature values as shown in responses and force plots: float64
+    rounded to DISPLAY_DIGITS. XGBoost returns float32 contributions; the
+    live and cached paths both round through here so they agree exactly.
+    """
+    return np.round(np.asarray(values, dtype=float), DISPLAY_DIGITS)
+
+
+def shap_contributions(booster, X: pd.DataFrame, keep_bias: bool = False) -> np.ndarray:
+    """Exact TreeSHAP contributions (margin space) for a whole batch; the bias column is dropped unless keep_bias."""
+    if hasattr(booster, "get_booster"):
+        booster = booster.get_booster()
+    dmat = xgb.DMatrix(X.values, feature_names=list(X.columns))
+    contribs = booster.predict(dmat, pred_contribs=True)
+    return contribs if keep_bias else contribs[:, :-1]
+
+
+def top_contributors(contribs: np.ndarray, columns, k: int = TOP_K):
+    """
+    Per row: the k largest positive (raise PD) and k most negative (lower PD)
+    contributions as [[feature, value], ...], rounded like the live response.
+    """
+    rounded = display_round(contribs)
+    # stable sorts both ways, so ties keep column order exactly like the live path
+    desc = np.argsort(-rounded, axis=1, kind="stable")
+    asc = np.argsort(rounded, axis=1, kind="stable")
+    columns = np.asarray(columns)
+    pos, neg = [], []
+    for row, hi, lo in zip(rounded, desc, asc):
+        pos.append([[columns[j], float(row[j])] for j in hi[:k] if row[j] > 0])
+        neg.append([[columns[j], float(row[j])] for j in lo[:k] if row[j] < 0])
+    return pos, neg
+
+
+def materialize_score_table(python_model, book: pd.DataFrame, row_hashes: np.ndarray,
+                            sorted_reference: np.ndarray, model_version: str,
+                            path: str = SCORE_TABLE_PATH, payload_fn=None,
+                            batch_size: int = BATCH_SIZE) -> int:
+    """
+    Score every customer in `book` (Identifier + MODEL_FEATURES + display
+    columns) and write the table. payload_fn(row_full, record), if given,
+    turns one book row and its batch-computed record (score, probabilities,
+    percentile, APR, top contributors, loan options, display-rounded SHAP
+    row) into the /predict response; it is stored pre-serialized, with its
+    Final_Recommendation in the recommendation column.
+    """
+    batches, shap_features, base_value = [], [], 0.0
+    for start in range(0, len(book), batch_size):
+        chunk = book.iloc[start:start + batch_size].reset_index(drop=True)
+        X_raw = FEATURE_SCHEMA.parse_frame(chunk)  # exactly what live /predict scores
+        X = preprocess_input(X_raw)
+        pred = python_model.score(X_raw)
+        shap_features = list(X.columns)
+
+        pd_probs = pred["calibrated_probability"].to_numpy(dtype=float)
+        percentiles = np.round(percentile_of_scores(sorted_reference, pd_probs), 2)
+        aprs = np.array([compute_risk_based_rate(p) for p in pd_probs])
+        contribs = shap_contributions(python_model.booster, X, keep_bias=True)
+        base_value, contribs = float(contribs[0, -1]), contribs[:, :-1]  # the bias is the same for every row
+        pos, neg = top_contributors(contribs, X.columns)
+        incomes = np.nan_to_num(chunk["MonthlyIncome"].to_numpy(dtype=float))
+        debt_ratios = np.nan_to_num(chunk["DebtRatio"].to_numpy(dtype=float))
+        loan_options = [calculate_loan_options(float(m), float(d), float(a))
+                        for m, d, a in zip(incomes, debt_ratios, aprs)]
+
+        shap_rows = display_round(contribs)
+        feature_rows = display_round(X.to_numpy(dtype=float))
+        payloads, recommendations = [None] * len(chunk), [None] * len(chunk)
+        if payload_fn is not None:
+            scores = pred["credit_score"].to_numpy(dtype=float)
+            raw_probs = pred["raw_probability"].to_numpy(dtype=float)
+            for i, (_, row_full) in enumerate(chunk.iterrows()):
+                payload = payload_fn(row_full, {
+                    "credit_score": float(scores[i]), "raw_probability": float(raw_probs[i]),
+                    "calibrated_probability": float(pd_probs[i]), "percentile": float(percentiles[i]),
+                    "apr": float(aprs[i]), "top_positive": pos[i], "top_negative": neg[i],
+                    "loan_options": loan_options[i], "shap_values": shap_rows[i],
+                    "feature_values": feature_rows[i], "shap_base_value": float(display_round(base_value)),
+                    "shap_features": shap_features,
+                })
+                payloads[i] = dumps(payload)
+                recommendations[i] = payload.get("Final_Recommendation")
+
+        batches.append(pa.RecordBatch.from_pydict({
+            "Identifier": chunk["Identifier"].to_numpy(dtype=np.int64),
+            "row_hash": row_hashes[start:start + len(chunk)],
+            "raw_probability": pred["raw_probability"].to_numpy(dtype=float),
+            "calibrated_probability": pd_probs,
+            "credit_score": pred["credit_score"].to_numpy(dtype=float),
+            "percentile": percentiles,
+            "apr": aprs,
+            "top_positive": [json.dumps(p) for p in pos],
+            "top_negative": [json.dumps(n) for n in neg],
+            "loan_options": [json.dumps(o) for o in loan_options],
+            # rounded like the live force plot; float64 so as_py() returns the same values
+            "shap_values": pa.array(list(shap_rows), type=pa.list_(pa.float64())),
+            "feature_values": pa.array(list(feature_rows), type=pa.list_(pa.float64())),
+            "recommendation": pa.array(recommendations, type=pa.string()),
+            "payload": pa.array(payloads, type=pa.binary()),
+        }))
+
+    metadata = {"model_version": model_version, "shap_features": json.dumps(shap_features),
+                "shap_base_value": repr(float(display_round(base_value)))}
+    table = pa.Table.from_batches(batches).replace_schema_metadata(metadata)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+
+class ScoreTable:
+    """Memory-mapped, read-only view of a materialized score table."""
+
+    def __init__(self, path: str = SCORE_TABLE_PATH):
+        self.path = path
+        self.table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        meta = self.table.schema.metadata or {}
+        self.model_version = meta.get(b"model_version", b"").decode("utf-8")
+        self._row_hash = self.table.column("row_hash").to_numpy()
+        self._payload = self.table.column("payload")
+        self._recommendation = self.table.column("recommendation")
+        self._decision = {c: self.table.column(c).to_numpy()
+                          for c in ("raw_probability", "calibrated_probability", "credit_score", "apr")}
+        self.shap_features = json.loads(meta.get(b"shap_features", b"[]"))
+        self.shap_base_value = float(meta.get(b"shap_base_value", b"0"))
+        ids = self.table.column("Identifier").to_numpy()
+        self._index = dict(zip(ids.tolist(), range(len(ids))))
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def lookup(self, identifier, model_version: str, row_hash=None):
+        """Row position for a fresh entry, or None if missing/stale."""
+        if model_version != self.model_version:
+            return None
+        i = self._index.get(identifier)
+        if i is None or (row_hash is not None and int(self._row_hash[i]) != int(row_hash)):
+            return None
+        return i
+
+    def payload(self, i: int) -> bytes | None:
+        """Pre-serialized /predict response for row i (None if materialized without payloads)."""
+        return self._payload[i].as_py()
+
+    def recommendation(self, i: int) -> str | None:
+        """The stored analyst Final_Recommendation for row i, as audited."""
+        return self._recommendation[i].as_py()
+
+    def decision(self, i: int) -> dict:
+        """The audited outcome for row i (probabilities, score, APR)."""
+        return {c: float(v[i]) for c, v in self._decision.items()}
+
+    def shap_row(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        """(SHAP values, engineered feature values) for row i, in shap_features order."""
+        return (np.asarray(self.table.column("shap_values")[i].as_py()),
+                np.asarray(self.table.column("feature_values")[i].as_py()))
+
+    def record(self, i: int) -> dict:
+        rec = {name: self.table.column(name)[i].as_py() for name in self.table.column_names
+               if name not in ("payload", "shap_values", "feature_values")}
+        for key in ("top_positive", "top_negative", "loan_options"):
+            rec[key] = json.loads(rec[key])
+        return rec
+
+    def to_pandas(self, columns: list[str] | None = None) -> pd.DataFrame:
+        if columns:
+            return self.table.select(columns).to_pandas()
+        return self.table.drop(["payload", "shap_values", "feature_values"]).to_pandas()
+
+
+def load_score_table(path: str = SCORE_TABLE_PATH) -> ScoreTable | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        return ScoreTable(path)
+    except Exception as e:
+        print("Failed to load score table:", e)
+        return None
@@ -1,11 +1,11 @@
 from fastapi import FastAPI, Body
-import pandas as pd
 import nest_asyncio
 import uvicorn
 import os
 import mlflow
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from request_schema import FEATURE_SCHEMA, FeatureParseError
 
 # Load environment variables from .env file (only needed for local/dev)
 load_dotenv()
@@ -36,39 +36,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def to_float(val):
-    try:
-        return float(val) if val is not None else None
-    except ValueError:
-        return None
-    
-def to_int(val):
-    try:
-        return int(val) if val is not None else None
-    except ValueError:
-        return None
-
 @app.post("/predict")
 def predict(data: dict = Body(...)):
-    row = {
-        'RevolvingUtilizationOfUnsecuredLines': to_float(data.get('RevolvingUtilizationOfUnsecuredLines')),
-        'age': to_int(data.get('age')),
-        'NumberOfTime30_59DaysPastDueNotWorse': to_int(data.get('NumberOfTime30_59DaysPastDueNotWorse')),
-        'DebtRatio': to_float(data.get('DebtRatio')),
-        'MonthlyIncome': to_float(data.get('MonthlyIncome')),
-        'NumberOfOpenCreditLinesAndLoans': to_int(data.get('NumberOfOpenCreditLinesAndLoans')),
-        'NumberOfTimes90DaysLate': to_int(data.get('NumberOfTimes90DaysLate')),
-        'NumberRealEstateLoansOrLines': to_int(data.get('NumberRealEstateLoansOrLines')),
-        'NumberOfTime60_89DaysPastDueNotWorse': to_int(data.get('NumberOfTime60_89DaysPastDueNotWorse')),
-        'NumberOfDependents': to_float(data.get('NumberOfDependents'))
-        # 'CreditUtilizationPerLine': to_float(data.get('CreditUtilizationPerLine')),
-        # 'DebtBurdenPerDependent': to_float(data.get('DebtBurdenPerDependent')),
-        # 'SeriousDelinqRate': to_float(data.get('SeriousDelinqRate')),
-        # 'RealEstateLoanShare': to_float(data.get('RealEstateLoanShare')),
-        # 'AgePerCreditLine': to_float(data.get('AgePerCreditLine')),
-    }
-
-    X = pd.DataFrame([row])
+    try:
+        X = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(data))
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
     print(X)
     X, explainer, pred = model.predict(X)
 
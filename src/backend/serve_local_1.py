@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import scipy.stats as stats
+from request_schema import FEATURE_SCHEMA, FeatureParseError
 
 # Load env
 load_dotenv()
@@ -200,7 +201,10 @@ def predict(payload: dict = Body(...)):
 
 @app.post("/predict_1")
 def predict_1(payload: dict = Body(...)):
-    row = pd.DataFrame([payload]).astype(schema, errors="ignore")
+    try:
+        row = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(payload))
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
 
     # synthesize missing features
     row_full = synthesize_bureau_fields(row)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Request
 import pandas as pd
 import numpy as np
 import nest_asyncio
@@ -12,16 +12,35 @@ import matplotlib.pyplot as plt
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import scipy.stats as stats
+from request_schema import FEATURE_SCHEMA, FeatureParseError
 from openai import OpenAI
+import copy
 import json
+import logging
 import re
-from utils import compute_risk_based_rate, calculate_loan_options
+import threading
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+from utils import MODEL_FEATURES, compute_risk_based_rate, calculate_loan_options
+from data_store import ENRICHMENT_SCHEMA, ensure_parquet, load_table, parquet_columns
+from calibration_job import MANIFEST_NAME, PUBLISH_DIR, PublishedArtifacts
+from score_table import (SCORE_TABLE_PATH, ScoreTable, display_round, load_score_table,
+                         materialize_score_table, row_fingerprints)
+from response_codec import encode_response, requested, round_features, serialization_stats
+from audit_log import AuditLog
+from what_if import build_scenario_grid, score_scenarios
+from shadow import ShadowScorer
+from portfolio import DPD_COLUMNS, PortfolioCube, book_frame
+from offer_engine import offer_record, optimize_offers
+
+logger = logging.getLogger(__name__)
 
 # Load env
 load_dotenv()
 DATABRICKS_HOST = os.getenv("DATABRICKS_HOST")
 DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
 MODEL_URI = os.getenv("MODEL_URI")
+CHALLENGER_MODEL_URI = os.getenv("CHALLENGER_MODEL_URI")  # optional: shadow-score a challenger
 
 # init client
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -34,21 +53,189 @@ mlflow.set_registry_uri("databricks-uc")
 # Data: customers + reference + external (Saudi) enrichment
 # -------------------------
 # customers_df previously came from CSV; replaced with parquet per user's note
-customers_df = pd.read_parquet("data/train_predictions_1.parquet")  # expects an 'Identifier' column
-# reference_scores unchanged
-reference_scores = pd.read_parquet("data/train_predictions.parquet")  # column: credit_score or score
-# additional enrichment dataframe from Saudi dataset
+# only the columns the service uses: the stored training-time scores are left on disk
+BUREAU_FIELDS = ["TotalObligation", "TotalUnsecuredLoans", "TotalSecuredLoans", "CreditCards", "PersonalLoans",
+                 "BNPLLoans", "OtherUnsecured", "RealEstateLoans", "GoldLoans", "VehicleLoans", "OtherSecured",
+                 "HasDelinquencyHistory", "DependentsFlag", "TotalLoanUtilization", "BureauVintage",
+                 "NumberOfEnquiriesInLast6Months"]
+customers_df = load_table("data/train_predictions_1.parquet",
+                          columns=["Identifier", *MODEL_FEATURES, *BUREAU_FIELDS])
+customer_inputs = customers_df.set_index("Identifier")[MODEL_FEATURES].to_dict("index")
+# baseline percentile reference; requests read the current one from `serving` (hot-swapped below)
+reference_scores = load_table("data/train_predictions.parquet", columns=["score"])  # column: credit_score or score
+# additional enrichment from the Saudi dataset, read per customer with CustomerID pushdown
 try:
-    saudi_df = pd.read_csv("data/saudi_lean_customers_enriched.csv")
-    print(saudi_df.columns)
+    enrichment_path = ensure_parquet("data/saudi_lean_customers_enriched.csv",
+                                     schema=ENRICHMENT_SCHEMA, sort_by="CustomerID")
+    enrichment_columns = [c for c in parquet_columns(enrichment_path) if c != "Unnamed: 0"]
 except FileNotFoundError:
-    # fallback to empty frame if not present during local dev/testing
-    saudi_df = pd.DataFrame()
+    # no enrichment during local dev/testing
+    enrichment_path, enrichment_columns = None, []
+
+def enrichment_rows(customer_ids) -> pd.DataFrame:
+    """Enrichment rows for `customer_ids` only (empty frame if there is no enrichment data)."""
+    if enrichment_path is None:
+        return pd.DataFrame(columns=enrichment_columns)
+    return load_table(enrichment_path, columns=enrichment_columns, ids=customer_ids, id_column="CustomerID")
+
+def enriched_rows(customer_ids=None) -> pd.DataFrame:
+    """Customer rows (all if customer_ids is None) with their enrichment left-merged in."""
+    rows = customers_df if customer_ids is None else customers_df[customers_df["Identifier"].isin(customer_ids)]
+    extra = enrichment_rows(rows["Identifier"].tolist())
+    if rows.empty or extra.empty:
+        return rows
+    # left-merge with suffixes to avoid collisions
+    return rows.merge(extra, left_on="Identifier", right_on="CustomerID", how="left", suffixes=("", "_saudi"))
+
+# fingerprint of everything a cached response depends on: the book row and its enrichment
+customer_hashes = dict(zip(customers_df["Identifier"].tolist(), row_fingerprints(enriched_rows()).tolist()))
 
 # Load model
 model = mlflow.pyfunc.load_model(MODEL_URI)
 
-app = FastAPI(title="Credit Risk Model (local)")
+# Calibrator / percentile reference pairs published by calibration_job.py are hot-swapped together
+published_artifacts = PublishedArtifacts(os.getenv("CALIBRATION_MANIFEST", os.path.join(PUBLISH_DIR, MANIFEST_NAME)),
+                                         "data/train_predictions.parquet")
+
+# Precomputed responses for the known-customer book (python serve_local_2.py materialize)
+score_table_path = os.getenv("SCORE_TABLE_PATH", SCORE_TABLE_PATH)
+ARTIFACT_POLL_SECONDS = float(os.getenv("ARTIFACT_POLL_SECONDS", "5"))
+
+def current_model_version() -> str:
+    return f"{MODEL_URI}|{model.metadata.run_id}|{published_artifacts.version()}"
+
+class Serving(NamedTuple):
+    """
+    Everything a request reads that can be hot-swapped. Never mutated: the
+    poller builds a new one and replaces the module-level `serving`
+    reference in one assignment, so handlers read it once, without a lock,
+    and always see a calibrator with its own reference and version.
+    """
+    scorer: object  # CreditRiskPyFunc carrying the current calibrator
+    reference_scores: pd.DataFrame
+    reference_sorted: np.ndarray
+    score_table: ScoreTable | None
+    score_table_mtime: float | None
+    model_version: str
+
+serving = Serving(
+    scorer=model.unwrap_python_model(),
+    reference_scores=reference_scores,
+    reference_sorted=np.sort(reference_scores["score"].to_numpy(dtype=float)),
+    score_table=load_score_table(score_table_path),
+    score_table_mtime=os.path.getmtime(score_table_path) if os.path.exists(score_table_path) else None,
+    model_version=current_model_version(),
+)
+
+def refresh_published_artifacts() -> bool:
+    """
+    Poll for a new calibrator/reference pair and score table; if either
+    changed, publish a new Serving snapshot and re-score the portfolio book.
+    Runs on the poller thread (and once at startup), never per request.
+    """
+    global serving
+    current = serving
+    changes = {}
+    calibrator, reference = published_artifacts.poll()
+    if calibrator is not None:
+        scorer = copy.copy(current.scorer)  # in-flight requests keep the old calibrator
+        scorer.calibrator = calibrator
+        changes.update(scorer=scorer, reference_scores=reference,
+                       reference_sorted=np.sort(reference["score"].to_numpy(dtype=float)))
+        logger.info("Reloaded calibrator and reference scores %s", published_artifacts.version())
+
+    mtime = os.path.getmtime(score_table_path) if os.path.exists(score_table_path) else None
+    if mtime is not None and mtime != current.score_table_mtime:
+        changes.update(score_table=load_score_table(score_table_path), score_table_mtime=mtime)
+        logger.info("Reloaded score table %s", score_table_path)
+
+    if not changes:
+        return False
+    serving = current._replace(model_version=current_model_version(), **changes)
+    rebuild_book_portfolio(serving)
+    return True
+
+artifacts_stop = threading.Event()
+
+def poll_published_artifacts():
+    while not artifacts_stop.wait(ARTIFACT_POLL_SECONDS):
+        try:
+            refresh_published_artifacts()
+        except Exception:
+            logger.exception("Artifact refresh failed")
+
+# Book-level aggregates behind /portfolio, kept current as customers are scored
+# (/predict_1 applicants are transient: capped and expired so the cube stays bounded)
+portfolio = PortfolioCube(
+    max_transient=int(os.getenv("PORTFOLIO_MAX_APPLICANTS", "10000")),
+    transient_ttl=float(os.getenv("PORTFOLIO_APPLICANT_TTL_SECONDS", str(24 * 3600))),
+)
+
+def rebuild_book_portfolio(st: Serving):
+    """(Re)load the known-customer book into the portfolio cube from the score table, or score it in one batch."""
+    if st.score_table is not None and st.score_table.model_version == st.model_version:
+        scores = st.score_table.to_pandas(["Identifier", "calibrated_probability", "credit_score", "apr"])
+    else:
+        pred = st.scorer.score(FEATURE_SCHEMA.parse_frame(customers_df))
+        scores = pd.DataFrame({
+            "Identifier": customers_df["Identifier"].to_numpy(),
+            "calibrated_probability": pred["calibrated_probability"].to_numpy(dtype=float),
+            "credit_score": pred["credit_score"].to_numpy(dtype=float),
+        })
+        scores["apr"] = [compute_risk_based_rate(p) for p in scores["calibrated_probability"]]
+    portfolio.upsert_frame(book_frame(customers_df, scores))
+
+def track_in_portfolio(key, inputs: dict, calibrated_probability: float, credit_score: float, apr: float,
+                       transient: bool = False, **_):
+    age = inputs.get("age")
+    try:
+        portfolio.upsert(key, np.nan if age is None else age, sum(inputs.get(c) or 0 for c in DPD_COLUMNS),
+                         credit_score, calibrated_probability, apr,
+                         inputs.get("MonthlyIncome"), inputs.get("DebtRatio"),
+                         transient=transient)
+    except ValueError as e:
+        logger.warning("Portfolio: skipped %s: %s", key, e)
+
+if not refresh_published_artifacts():
+    rebuild_book_portfolio(serving)
+
+# Optional challenger, scored in the background on the same traffic
+shadow_scorer = None
+if CHALLENGER_MODEL_URI:
+    challenger_model = mlflow.pyfunc.load_model(CHALLENGER_MODEL_URI)
+    shadow_scorer = ShadowScorer(
+        challenger_model,
+        log_dir=os.getenv("SHADOW_LOG_DIR", "data/shadow_log"),
+        queue_size=int(os.getenv("SHADOW_QUEUE_SIZE", "1024")),
+        batch_size=int(os.getenv("SHADOW_BATCH_SIZE", "64")),
+    )
+
+# Append-only audit trail of every scored decision (written off the request path)
+audit_log = AuditLog(
+    os.getenv("AUDIT_LOG_DIR", "data/audit_log"),
+    max_pending=int(os.getenv("AUDIT_MAX_PENDING", "10000")),
+    flush_seconds=float(os.getenv("AUDIT_FLUSH_SECONDS", "2")),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Background workers run for the lifetime of the server; queued work is flushed on shutdown."""
+    artifacts_stop.clear()
+    artifacts_poller = threading.Thread(target=poll_published_artifacts, name="artifact-poller", daemon=True)
+    artifacts_poller.start()
+    if shadow_scorer is not None:
+        shadow_scorer.start()
+    audit_log.start()
+    try:
+        yield
+    finally:
+        artifacts_stop.set()
+        if shadow_scorer is not None:
+            shadow_scorer.stop()
+        audit_log.stop()
+        artifacts_poller.join(timeout=5)
+
+app = FastAPI(title="Credit Risk Model (local)", lifespan=lifespan)
 
 # Allow frontend
 app.add_middleware(
@@ -62,24 +249,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# -------------------------
-# Model input schema
-# -------------------------
-MODEL_FEATURES = [
-    'RevolvingUtilizationOfUnsecuredLines',
-    'age',
-    'NumberOfTime30_59DaysPastDueNotWorse',
-    'DebtRatio',
-    'MonthlyIncome',
-    'NumberOfOpenCreditLinesAndLoans',
-    'NumberOfTimes90DaysLate',
-    'NumberRealEstateLoansOrLines',
-    'NumberOfTime60_89DaysPastDueNotWorse',
-    'NumberOfDependents'
-]
-
-schema = {f: 'float' for f in MODEL_FEATURES}
-
 # -------------------------
 # Utility: synthesis function
 # -------------------------
@@ -126,100 +295,102 @@ def synthesize_bureau_fields(df: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
 # -------------------------
 # Shared response builder
 # -------------------------
-def build_response(X: pd.DataFrame, pred: pd.DataFrame, explainer, row_full: pd.Series):
-    score = float(pred.loc[0, "calibrated_probability"])
-    percentile = stats.percentileofscore(reference_scores["score"], score, kind="rank")
-
-    feature_abbrev = {
-        "RevolvingUtilizationOfUnsecuredLines": "UnsecUtil",
-        "age": "Age",
-        "NumberOfTime30_59DaysPastDueNotWorse": "30-59DPD",
-        "DebtRatio": "DebtRatio",
-        "MonthlyIncome": "Income",
-        "NumberOfOpenCreditLinesAndLoans": "NumLoans",
-        "NumberOfTimes90DaysLate": "90DPD",
-        "NumberRealEstateLoansOrLines": "RealEstateLoans",
-        "NumberOfTime60_89DaysPastDueNotWorse": "60-89DPD",
-        "NumberOfDependents": "Dependents", 'CreditUtilizationPerLine':"UtilPerLine",
-       'DebtBurdenPerDependent':"", 'SeriousDelinqRate':"SeriousDelinq", 'RealEstateLoanShare':"RealEstateShare",
-       'AgePerCreditLine':"AgePerLine"
-    }
-
-    shap_values = explainer(X)
-    # Round the feature values for display
-    rounded_data = np.round(shap_values.data, 2)
-
-    # Optionally round the SHAP values too
-    rounded_values = np.round(shap_values.values, 2)
-    rounded_base_values = np.round(shap_values.base_values, 2)
-
-    # Create a new Explanation object with rounded feature values and SHAP values
-    shap_values_rounded = shap.Explanation(
-        values=rounded_values,
-        base_values=rounded_base_values,
-        data=rounded_data,
-        feature_names=shap_values.feature_names
-    )
-
-    # Plot
+FEATURE_ABBREV = {
+    "RevolvingUtilizationOfUnsecuredLines": "UnsecUtil",
+    "age": "Age",
+    "NumberOfTime30_59DaysPastDueNotWorse": "30-59DPD",
+    "DebtRatio": "DebtRatio",
+    "MonthlyIncome": "Income",
+    "NumberOfOpenCreditLinesAndLoans": "NumLoans",
+    "NumberOfTimes90DaysLate": "90DPD",
+    "NumberRealEstateLoansOrLines": "RealEstateLoans",
+    "NumberOfTime60_89DaysPastDueNotWorse": "60-89DPD",
+    "NumberOfDependents": "Dependents", 'CreditUtilizationPerLine':"UtilPerLine",
+   'DebtBurdenPerDependent':"", 'SeriousDelinqRate':"SeriousDelinq", 'RealEstateLoanShare':"RealEstateShare",
+   'AgePerCreditLine':"AgePerLine"
+}
+
+FIELD_LABELS = {
+    "RevolvingUtilizationOfUnsecuredLines": "Revolving Utilization",
+    "age": "Age",
+    "DebtRatio": "Debt Ratio",
+    "MonthlyIncome": "Monthly Income",
+    "NumberOfOpenCreditLinesAndLoans": "Open Credit Lines",
+    "NumberOfDependents": "Number of Dependents",
+    "NumberOfTime30_59DaysPastDueNotWorse": "30-59 Days Past Due",
+    "NumberOfTimes90DaysLate": "Number of times 90 Days Late",
+    "NumberRealEstateLoansOrLines": "Number of Real Estate Loans",
+    "NumberOfTime60_89DaysPastDueNotWorse": "Number of times 60-89 Days Past Due",
+}
+
+def force_plot_png(values, base_value: float, data, feature_names) -> str:
+    """Base64 PNG force plot for one row of (already rounded) SHAP values."""
     shap.plots.force(
-        shap_values_rounded[0], 
-        matplotlib=True, 
+        shap.Explanation(values=np.asarray(values), base_values=base_value, data=np.asarray(data),
+                         feature_names=list(feature_names)),
+        matplotlib=True,
         show=False,
-        feature_names=[feature_abbrev.get(c, c) for c in X.columns]
+        feature_names=[FEATURE_ABBREV.get(c, c) for c in feature_names]
     )
 
     buf = BytesIO()
     plt.savefig(buf, format="png", bbox_inches="tight")
     plt.close()
-    force_plot_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-    feature_contribs = dict(zip(X.columns, rounded_values[0]))
-    # Flip logic: pos = most positive, neg = most negative
-    pos = sorted([(k, v) for k, v in feature_contribs.items() if v > 0],
-                 key=lambda x: -x[1])[:2]
-    neg = sorted([(k, v) for k, v in feature_contribs.items() if v < 0],
-                 key=lambda x: x[1])[:2]
-
-    fieldLabels = {
-        "RevolvingUtilizationOfUnsecuredLines": "Revolving Utilization",
-        "age": "Age",
-        "DebtRatio": "Debt Ratio",
-        "MonthlyIncome": "Monthly Income",
-        "NumberOfOpenCreditLinesAndLoans": "Open Credit Lines",
-        "NumberOfDependents": "Number of Dependents",
-        "NumberOfTime30_59DaysPastDueNotWorse": "30-59 Days Past Due",
-        "NumberOfTimes90DaysLate": "Number of times 90 Days Late",
-        "NumberRealEstateLoansOrLines": "Number of Real Estate Loans",
-        "NumberOfTime60_89DaysPastDueNotWorse": "Number of times 60-89 Days Past Due",
-    }
-
-    pos_features = ", ".join([fieldLabels.get(p[0], p[0]) for p in pos]) if pos else "none"
-    neg_features = ", ".join([fieldLabels.get(n[0], n[0]) for n in neg]) if neg else "none"
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
 
-    explanations = [
+def impact_explanations(pos, neg) -> list[str]:
+    """Customer-facing lines from the top (feature, contribution) pairs; pos raise PD, neg lower it."""
+    pos_features = ", ".join([FIELD_LABELS.get(p[0], p[0]) for p in pos]) if pos else "none"
+    neg_features = ", ".join([FIELD_LABELS.get(n[0], n[0]) for n in neg]) if neg else "none"
+    return [
         f"Your credit score is positively impacted by {neg_features}.",
         f"Your credit score is negatively impacted by {pos_features}."
     ]
 
-    features_out = {}
-    for k, v in row_full.items():
-        if k in ["Unnamed: 0", "Identifier"]:
-            continue
-        try:
-            features_out[k] = round(float(v), 2)
-        except Exception:
-            features_out[k] = str(v)
+def build_response(X: pd.DataFrame, pred: pd.DataFrame, explainer, row_full: pd.Series,
+                   reference_scores: pd.DataFrame, fields: str | None = None):
+    """
+    The scored response; SHAP, the force plot and the analyst LLM call are
+    skipped when ?fields= does not ask for anything that needs them.
+    """
+    score = float(pred.loc[0, "calibrated_probability"])
+    percentile = stats.percentileofscore(reference_scores["score"], score, kind="rank")
 
     result_dict = {
         "score": float(pred.loc[0, "credit_score"]),
         "raw_prob":float(pred.loc[0, "raw_probability"]),
         "percentile": round(percentile, 2),
-        "explanations": explanations,
-        "features": features_out,
-        "force_plot": force_plot_b64
     }
+    want_plot = requested(fields, "force_plot")
+    want_verdict = requested(fields, "Final_Recommendation", "analyst_summary")
+
+    if want_plot or want_verdict or requested(fields, "explanations"):
+        shap_values = explainer(X)
+        # Round the feature values for display
+        rounded_data = display_round(shap_values.data)
+
+        # Optionally round the SHAP values too (float64, exactly as stored in the score table)
+        rounded_values = display_round(shap_values.values)
+        rounded_base_values = display_round(shap_values.base_values)
+
+        feature_contribs = dict(zip(X.columns, rounded_values[0]))
+        # Flip logic: pos = most positive, neg = most negative
+        pos = sorted([(k, v) for k, v in feature_contribs.items() if v > 0],
+                     key=lambda x: -x[1])[:2]
+        neg = sorted([(k, v) for k, v in feature_contribs.items() if v < 0],
+                     key=lambda x: x[1])[:2]
+        result_dict["explanations"] = impact_explanations(pos, neg)
 
+    result_dict["features"] = round_features(row_full)
+
+    if want_plot:
+        result_dict["force_plot"] = force_plot_png(rounded_values[0], rounded_base_values[0], rounded_data[0],
+                                                   X.columns)
+
+    return add_analyst_verdict(result_dict) if want_verdict else result_dict
+
+def add_analyst_verdict(result_dict: dict) -> dict:
+    """Ask the LLM analyst for Final_Recommendation / analyst_summary on a scored response."""
     # ---------------------------
     # Call OpenAI for Analyst Summary
     # ---------------------------
@@ -271,7 +442,7 @@ def build_response(X: pd.DataFrame, pred: pd.DataFrame, explainer, row_full: pd.
         #         "Final_Recommendation": "Unavailable",
         #         "AI_Summary": f"(AI summary unavailable: invalid format)"
         #     }
-        print(analyst_output)
+        logger.debug("Analyst output: %s", analyst_output)
         result_json = json.loads(analyst_output)
 
     except Exception as e:
@@ -287,106 +458,291 @@ def build_response(X: pd.DataFrame, pred: pd.DataFrame, explainer, row_full: pd.
 
     return result_dict
 
-# -------------------------
-# Endpoints
-# -------------------------
-
-@app.post("/predict")
-def predict(payload: dict = Body(...)):
-    customer_id = payload.get("customer_id")
-    if customer_id is None:
-        return {"error": "customer_id is required"}
+def customer_row(customer_id):
+    """Known customer's row with Saudi enrichment merged in, or None if unknown."""
+    row_full = enriched_rows([customer_id])
+    return None if row_full.empty else row_full
 
-    # locate customer in the new customers dataframe
-    row_full = customers_df[customers_df["Identifier"] == customer_id]
-    if row_full.empty:
-        return {"error": f"Customer {customer_id} not found"}
+def pricing_block(pd_prob: float, apr: float) -> dict:
+    return {
+    "pd": round(pd_prob, 6),
+    "apr_decimal": round(apr, 6),
+    "apr_percent": round(apr * 100, 3)}
 
-    # try to attach enrichment from saudi_lean_customers.csv if available
-    if not saudi_df.empty:
-        # attempt to detect identifier column in saudi_df
-        if "Identifier" in saudi_df.columns:
-            key_col = "Identifier"
-        elif "CustomerID" in saudi_df.columns:
-            key_col = "CustomerID"
-        else:
-            key_col = None
-
-        if key_col is not None:
-            extra = saudi_df[saudi_df[key_col] == customer_id]
-            print(extra.columns)
-            if not extra.empty:
-                # ensure we don't accidentally duplicate the index; do a left-merge
-                # use suffixes to avoid collisions
-                row_full = row_full.merge(extra, left_on="Identifier", right_on=key_col, how="left", suffixes=("", "_saudi"))
-                print(row_full.columns)
-
-    # only pass model features to model
-    print("done till here")
-    X = row_full[MODEL_FEATURES].astype(schema, errors="ignore")
-    X, explainer, pred = model.predict(X)
-    print("model pred done")
-
-    # --- New: Risk-based pricing and FOIR-based loan amounts ---
+def respond_with_pricing(X: pd.DataFrame, pred: pd.DataFrame, explainer, row_full: pd.DataFrame,
+                         st: Serving, fields: str | None = None):
+    """build_response plus risk-based pricing and FOIR-based loan amounts."""
     pd_prob = float(pred.loc[0, "calibrated_probability"])
     apr = compute_risk_based_rate(pd_prob)
-    print("calibration done")
 
     monthly_income = float(row_full["MonthlyIncome"].iloc[0]) if "MonthlyIncome" in row_full else 0.0
     debt_ratio = float(row_full["DebtRatio"].iloc[0]) if "DebtRatio" in row_full else 0.0
     loan_options = calculate_loan_options(monthly_income, debt_ratio, apr)
-    print("calibration done 1")
 
-    result = build_response(X, pred, explainer, row_full.iloc[0])
-    print("calibration done 2")
-    result["pricing"] = {
-    "pd": round(pd_prob, 6),
-    "apr_decimal": round(apr, 6),
-    "apr_percent": round(apr * 100, 3)}
+    result = build_response(X, pred, explainer, row_full.iloc[0], st.reference_scores, fields)
+    result["pricing"] = pricing_block(pd_prob, apr)
 
     result["loan_options"] = loan_options
 
     return result
 
+def cached_payload(row_full: pd.Series, record: dict) -> dict:
+    """
+    The full /predict response from materialize_score_table's batch columns,
+    force plot and analyst verdict included, so a cache hit needs neither.
+    """
+    result = {
+        "score": record["credit_score"],
+        "raw_prob": record["raw_probability"],
+        "percentile": record["percentile"],
+        "explanations": impact_explanations(record["top_positive"], record["top_negative"]),
+        "features": round_features(row_full),
+        "force_plot": force_plot_png(record["shap_values"], record["shap_base_value"],
+                                     record["feature_values"], record["shap_features"]),
+    }
+    result = add_analyst_verdict(result)
+    result["pricing"] = pricing_block(record["calibrated_probability"], record["apr"])
+    result["loan_options"] = record["loan_options"]
+    return result
+
+# -------------------------
+# Endpoints
+# -------------------------
+
+def audit_decision(endpoint: str, X_raw: pd.DataFrame, pred: pd.DataFrame, result: dict, model_version: str,
+                   customer_id=None):
+    inputs = X_raw.iloc[0].to_dict()
+    decision = {
+        "raw_probability": float(pred.loc[0, "raw_probability"]),
+        "calibrated_probability": float(pred.loc[0, "calibrated_probability"]),
+        "credit_score": float(pred.loc[0, "credit_score"]),
+        "apr": result["pricing"]["apr_decimal"],
+    }
+    audit_log.record(endpoint, inputs, **decision, recommendation=result.get("Final_Recommendation"),
+                     customer_id=customer_id, model_version=model_version)
+
+    # known customers replace their book entry; new applicants are keyed by their inputs
+    key = customer_id if customer_id is not None else f"applicant:{int(row_fingerprints(X_raw)[0])}"
+    track_in_portfolio(key, inputs, transient=customer_id is None, **decision)
+
+@app.post("/predict")
+def predict(request: Request, payload: dict = Body(...), fields: str | None = None):
+    st = serving
+    customer_id = payload.get("customer_id")
+    if customer_id is None:
+        return {"error": "customer_id is required"}
+
+    # known customer with a fresh precomputed entry: the stored response as-is
+    if st.score_table is not None:
+        i = st.score_table.lookup(customer_id, st.model_version, customer_hashes.get(customer_id))
+        if i is not None:
+            cached = st.score_table.payload(i)
+            if cached is not None:
+                inputs = customer_inputs.get(customer_id, {})
+                decision = st.score_table.decision(i)
+                if shadow_scorer is not None:
+                    shadow_scorer.submit(FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(inputs)),
+                                         pd.DataFrame([decision]), endpoint="/predict", customer_id=customer_id)
+                audit_log.record("/predict", inputs, **decision, recommendation=st.score_table.recommendation(i),
+                                 customer_id=customer_id, model_version=st.model_version)
+                track_in_portfolio(customer_id, inputs, **decision)
+                return encode_response(request, cached, "/predict", fields)
+
+    row_full = customer_row(customer_id)
+    if row_full is None:
+        return {"error": f"Customer {customer_id} not found"}
+
+    # only pass model features to model, parsed under the same rules as a /predict_1 request
+    try:
+        X_raw = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(row_full.iloc[0].to_dict()))
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
+    X, explainer, pred = st.scorer.predict(None, X_raw)
+
+    if shadow_scorer is not None:
+        shadow_scorer.submit(X_raw, pred, endpoint="/predict", customer_id=customer_id)
+
+    result = respond_with_pricing(X, pred, explainer, row_full, st, fields)
+    audit_decision("/predict", X_raw, pred, result, st.model_version, customer_id=customer_id)
+    return encode_response(request, result, "/predict", fields)
+
 @app.post("/predict_1")
-def predict_1(payload: dict = Body(...)):
-    row = pd.DataFrame([payload]).astype(schema, errors="ignore")
+def predict_1(request: Request, payload: dict = Body(...), fields: str | None = None):
+    st = serving
+    try:
+        row = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(payload))
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
 
     # synthesize missing features
     row_full = synthesize_bureau_fields(row)
 
-    print("done till here")
+    # only pass model features to model (already parsed to float32 by FEATURE_SCHEMA)
+    X_raw = row_full[MODEL_FEATURES]
+    X, explainer, pred = st.scorer.predict(None, X_raw)
 
-    # only pass model features to model
-    X = row_full[MODEL_FEATURES].astype(schema, errors="ignore")
-    X, explainer, pred = model.predict(X)
-    print("model pred done")
-    
-    # --- New: Risk-based pricing and FOIR-based loan amounts ---
-    pd_prob = float(pred.loc[0, "calibrated_probability"])
-    apr = compute_risk_based_rate(pd_prob)
-    print("calibration done")
+    if shadow_scorer is not None:
+        shadow_scorer.submit(X_raw, pred, endpoint="/predict_1")
 
-    monthly_income = float(row_full["MonthlyIncome"].iloc[0]) if "MonthlyIncome" in row_full else 0.0
-    debt_ratio = float(row_full["DebtRatio"].iloc[0]) if "DebtRatio" in row_full else 0.0
-    loan_options = calculate_loan_options(monthly_income, debt_ratio, apr)
-    print("calibration done 1")
+    result = respond_with_pricing(X, pred, explainer, row_full, st, fields)
+    audit_decision("/predict_1", X_raw, pred, result, st.model_version)
+    return encode_response(request, result, "/predict_1", fields)
 
-    result = build_response(X, pred, explainer, row_full.iloc[0])
-    print("calibration done 2")
-    result["pricing"] = {
-    "pd": round(pd_prob, 6),
-    "apr_decimal": round(apr, 6),
-    "apr_percent": round(apr * 100, 3)}
-    
-    result["loan_options"] = loan_options
+@app.post("/what_if")
+def what_if(request: Request, payload: dict = Body(...), fields: str | None = None):
+    """
+    Score a grid of candidate changes for one customer, e.g.
+    {"customer_id": 1001101,
+     "changes": {"RevolvingUtilizationOfUnsecuredLines": [0.1, 0.3],
+                 "DebtRatio": [0.2, 0.35], "MonthlyIncome": [9000, 12000]}}
+    A raw "customer" dict of MODEL_FEATURES can be sent instead of customer_id.
+    """
+    st = serving
+    changes = payload.get("changes") or {}
+
+    if payload.get("customer_id") is not None:
+        customer_id = payload["customer_id"]
+        row_full = customers_df[customers_df["Identifier"] == customer_id]
+        if row_full.empty:
+            return {"error": f"Customer {customer_id} not found"}
+        base_row = row_full.iloc[0]
+    elif isinstance(payload.get("customer"), dict):
+        try:
+            base_row = dict(zip(MODEL_FEATURES, FEATURE_SCHEMA.parse(payload["customer"]).tolist()))
+        except FeatureParseError as e:
+            return {"error": "invalid input", "fields": e.errors}
+    else:
+        return {"error": "customer_id or customer is required"}
+    if not isinstance(changes, dict):
+        return {"error": "changes must be an object of {feature: [values]}"}
 
-    return result
+    try:
+        grid = build_scenario_grid(base_row, changes)
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
+    except (ValueError, TypeError, KeyError) as e:
+        return {"error": str(e)}
+
+    return encode_response(request, score_scenarios(st.scorer, grid, st.reference_sorted, list(changes)), "/what_if", fields)
+
+@app.post("/portfolio")
+def portfolio_view(request: Request, payload: dict = Body(default={}), fields: str | None = None):
+    """
+    Book-level aggregates over every scored customer, e.g.
+    {"group_by": ["score_band"],
+     "filters": {"age_band": ["25-35", "35-45"], "has_delinquency_history": 0}}
+    Dimensions: age_band, has_delinquency_history, score_band.
+    """
+    try:
+        result = portfolio.query(payload.get("filters"), payload.get("group_by"))
+    except ValueError as e:
+        return {"error": str(e)}
+    return encode_response(request, result, "/portfolio", fields)
+
+def offer_constraints(payload: dict) -> dict:
+    """Optional optimizer targets from the request body (min_annual_return, max_loss_rate)."""
+    out = {}
+    for key in ("min_annual_return", "max_loss_rate"):
+        if payload.get(key) is not None:
+            out[key] = float(payload[key])
+    return out
+
+@app.post("/offer")
+def offer(request: Request, payload: dict = Body(...), fields: str | None = None):
+    """
+    Best loan offer (tenure, amount, APR) for one applicant by expected
+    risk-adjusted profit, e.g. {"customer_id": 1001101, "max_loss_rate": 0.02}
+    or the raw MODEL_FEATURES as in /predict_1.
+    """
+    st = serving
+    try:
+        constraints = offer_constraints(payload)
+    except (TypeError, ValueError):
+        return {"error": "min_annual_return and max_loss_rate must be numbers"}
+
+    customer_id = payload.get("customer_id")
+    if customer_id is not None:
+        if customer_id not in customer_inputs:
+            return {"error": f"Customer {customer_id} not found"}
+        inputs = customer_inputs[customer_id]
+        i = st.score_table.lookup(customer_id, st.model_version, customer_hashes.get(customer_id)) \
+            if st.score_table is not None else None
+        if i is not None:
+            pd_prob = st.score_table.decision(i)["calibrated_probability"]
+        else:
+            try:
+                vector = FEATURE_SCHEMA.parse(inputs)
+            except FeatureParseError as e:
+                return {"error": "invalid input", "fields": e.errors}
+            pd_prob = float(st.scorer.score(FEATURE_SCHEMA.to_frame(vector))["calibrated_probability"].iloc[0])
+    else:
+        try:
+            vector = FEATURE_SCHEMA.parse(payload)
+        except FeatureParseError as e:
+            return {"error": "invalid input", "fields": e.errors}
+        inputs = dict(zip(MODEL_FEATURES, vector.tolist()))
+        pd_prob = float(st.scorer.score(FEATURE_SCHEMA.to_frame(vector))["calibrated_probability"].iloc[0])
+
+    row = optimize_offers([inputs["MonthlyIncome"]], [inputs["DebtRatio"]], [pd_prob], **constraints).iloc[0]
+    result = {"customer_id": customer_id, "pd": round(pd_prob, 6), **offer_record(row)}
+    return encode_response(request, result, "/offer", fields)
+
+@app.post("/offers")
+def offers(request: Request, payload: dict = Body(...), fields: str | None = None):
+    """Batch variant of /offer: {"applicants": [{...MODEL_FEATURES...}, ...]} scored and optimized in one pass."""
+    st = serving
+    applicants = payload.get("applicants")
+    if not isinstance(applicants, list) or not applicants:
+        return {"error": "applicants must be a non-empty list"}
+    try:
+        constraints = offer_constraints(payload)
+        block = FEATURE_SCHEMA.parse_batch(applicants)
+    except FeatureParseError as e:
+        return {"error": "invalid input", "fields": e.errors}
+    except (TypeError, ValueError):
+        return {"error": "min_annual_return and max_loss_rate must be numbers"}
+
+    X_raw = FEATURE_SCHEMA.to_frame(block)
+    pd_probs = st.scorer.score(X_raw)["calibrated_probability"].to_numpy(dtype=float)
+    best = optimize_offers(X_raw["MonthlyIncome"], X_raw["DebtRatio"], pd_probs, **constraints)
+    result = {"offers": [{"pd": round(float(p), 6), **offer_record(row)}
+                         for p, (_, row) in zip(pd_probs, best.iterrows())]}
+    return encode_response(request, result, "/offers", fields)
+
+@app.get("/metrics/serialization")
+def serialization_metrics():
+    return serialization_stats.report()
+
+@app.get("/metrics/audit")
+def audit_metrics():
+    return audit_log.metrics()
+
+@app.get("/shadow/stats")
+def shadow_stats():
+    if shadow_scorer is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow_scorer.stats()}
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+def materialize_known_customers(path: str = score_table_path) -> int:
+    """Score the whole customer book offline and write the score table /predict serves from."""
+    refresh_published_artifacts()
+    st = serving
+    book = enriched_rows()
+    return materialize_score_table(st.scorer, book, row_fingerprints(book), st.reference_sorted,
+                                   st.model_version, path=path, payload_fn=cached_payload)
+
 def run():
     nest_asyncio.apply()
     uvicorn.run(app, host="0.0.0.0", port=8000)
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if sys.argv[1:2] == ["materialize"]:
+        print(f"Materialized {materialize_known_customers()} customers into {score_table_path}")
+    else:
+        run()
@@ -58,8 +58,8 @@ class CreditRiskPyFunc(mlflow.pyfunc.PythonModel):
 
             # If has predict
             if hasattr(self.calibrator, "predict"):
-                # Some calibrators (IsotonicRegression) expect 1D input
-                cal_probs = self.calibrator.predict(X)
+                # Some calibrators (IsotonicRegression, calibration_job.PlattCalibrator) expect 1D raw probs
+                cal_probs = self.calibrator.predict(np.asarray(raw_probs, dtype=float).reshape(-1))
                 return np.asarray(cal_probs, dtype=float)
 
             # If it's callable
@@ -74,27 +74,17 @@ class CreditRiskPyFunc(mlflow.pyfunc.PythonModel):
         # fallback
         return raw_probs
 
-    def predict(self, context, model_input):
-        # normalize input to 2D DataFrame
-        df_in = to_2d_frame(model_input)
-        X = preprocess_input(df_in)
-
-        # Get explanatory object and raw probabilities
+    def _raw_probability(self, X: pd.DataFrame) -> np.ndarray:
+        """Booster probabilities for an already-preprocessed frame (one batched call)."""
         if hasattr(self.booster, "predict_proba"):
             # scikit-learn wrapper (XGBClassifier)
-            raw_prob = self.booster.predict_proba(X)[:, 1]
-            try:
-                explainer = shap.TreeExplainer(self.booster)
-            except Exception:
-                explainer = None
-        else:
-            # native xgboost Booster
-            dmat = xgb.DMatrix(X.values, feature_names=list(X.columns))
-            raw_prob = self.booster.predict(dmat)
-            try:
-                explainer = shap.TreeExplainer(self.booster)
-            except Exception:
-                explainer = None
+            return self.booster.predict_proba(X)[:, 1]
+        # native xgboost Booster
+        dmat = xgb.DMatrix(X.values, feature_names=list(X.columns))
+        return self.booster.predict(dmat)
+
+    def _score_frame(self, X: pd.DataFrame) -> pd.DataFrame:
+        raw_prob = self._raw_probability(X)
 
         # Apply calibrator if present
         calibrated_prob = self._apply_calibrator(X, raw_prob)
@@ -107,13 +97,34 @@ class CreditRiskPyFunc(mlflow.pyfunc.PythonModel):
             factor=float(os.getenv("SCORE_FACTOR", "50"))
         )
 
-        # return X (features after preprocess), explainer, results DataFrame
-        import pandas as pd
-        results = pd.DataFrame({
+        return pd.DataFrame({
             "raw_probability": np.asarray(raw_prob).reshape(-1,),
             "calibrated_probability": np.asarray(calibrated_prob).reshape(-1,),
             "log_odds": np.asarray(log_odds).reshape(-1,),
             "credit_score": np.asarray(score).reshape(-1,)
         })
 
+    def score(self, model_input) -> pd.DataFrame:
+        """
+        Same results frame as predict(), without building a SHAP explainer.
+        Use for batched scoring (what-if grids, bulk jobs) where only the
+        probabilities/score are needed.
+        """
+        X = preprocess_input(to_2d_frame(model_input))
+        return self._score_frame(X)
+
+    def predict(self, context, model_input):
+        # normalize input to 2D DataFrame
+        df_in = to_2d_frame(model_input)
+        X = preprocess_input(df_in)
+
+        # Get explanatory object
+        try:
+            explainer = shap.TreeExplainer(self.booster)
+        except Exception:
+            explainer = None
+
+        results = self._score_frame(X)
+
+        # return X (features after preprocess), explainer, results DataFrame
         return X, explainer, results
@@ -0,0 +1,210 @@
+import glob
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from audit_log import JOURNAL_SUFFIX, compact_journal, read_journal, recover_journals
+from utils import MODEL_FEATURES
+
+
+SHADOW_QUEUE_SIZE = 1024
+SHADOW_BATCH_SIZE = 64
+SHADOW_FLUSH_SECONDS = 1.0
+SHADOW_ROTATE_BYTES = 64 * 2**20
+SHADOW_ROTATE_SECONDS = 3600.0
+
+_SCORE_COLUMNS = ["raw_probability", "calibrated_probability", "credit_score"]
+SHADOW_SCHEMA = pa.schema(
+    [("timestamp", pa.timestamp("us", tz="UTC")),
+     ("endpoint", pa.string()),
+     ("customer_id", pa.int64())]
+    + [(f, pa.float64()) for f in MODEL_FEATURES]
+    + [(f"{side}_{col}", pa.float64())
+       for col in _SCORE_COLUMNS for side in ["champion", "challenger", "delta"]]
+)
+
+_STOP = object()
+
+
+class ShadowScorer:
+    """
+    Scores live requests with a challenger CreditRiskPyFunc off the response path.
+
+    - submit() is non-blocking: requests go onto a bounded queue and are
+      dropped (and counted) when the queue is full, so the champion's
+      latency does not depend on the challenger.
+    - a background thread drains the queue in batches, scores each batch
+      with one challenger.score call (probabilities only, no SHAP
+      explainer) and appends the champion/challenger probabilities and
+      deltas to an Arrow IPC journal, rotated into one Parquet part once
+      it reaches rotate_bytes or rotate_seconds and on stop (the same
+      journal/compaction scheme as audit_log.AuditLog):
+
+          <log_dir>/.shadow-<pid>-<unix time>-<seq>.arrows     current journal
+          <log_dir>/shadow-<pid>-<unix time>-<seq>.parquet     rotated parts
+    """
+
+    def __init__(self, challenger, log_dir: str,
+                 queue_size: int = SHADOW_QUEUE_SIZE,
+                 batch_size: int = SHADOW_BATCH_SIZE,
+                 flush_seconds: float = SHADOW_FLUSH_SECONDS,
+                 rotate_bytes: int = SHADOW_ROTATE_BYTES,
+                 rotate_seconds: float = SHADOW_ROTATE_SECONDS):
+        self.challenger = challenger
+        # score() on the unwrapped CreditRiskPyFunc skips predict()'s per-call TreeExplainer
+        self._scorer = challenger.unwrap_python_model() if hasattr(challenger, "unwrap_python_model") else challenger
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "dropped": 0, "scored": 0, "failed": 0, "batches": 0,
+                          "rotations": 0}
+        self._thread = None
+        self._journal = None  # touched by the worker thread only
+        self._seq = 0
+        os.makedirs(log_dir, exist_ok=True)
+
+    def start(self):
+        if self._thread is None:
+            recover_journals(os.path.join(self.log_dir, f".shadow-*{JOURNAL_SUFFIX}"), SHADOW_SCHEMA)
+            self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Score what is already queued, rotate the open journal, then stop the worker."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _incr(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def submit(self, X_raw: pd.DataFrame, champion_pred: pd.DataFrame, endpoint: str, customer_id=None) -> bool:
+        """Queue one scored request for shadow scoring. Never blocks; returns False if dropped."""
+        item = (time.time(), endpoint, customer_id, X_raw, champion_pred)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._incr("dropped")
+            return False
+        self._incr("submitted")
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+        out["queue_depth"] = self._queue.qsize()
+        out["queue_capacity"] = self._queue.maxsize
+        return out
+
+    # -------------------------
+    # Background worker
+    # -------------------------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if batch:
+                try:
+                    self._score_batch(batch)
+                    self._incr("scored", len(batch))
+                    self._incr("batches")
+                except Exception as e:
+                    print("Shadow scoring failed:", e)
+                    self._incr("failed", len(batch))
+            self._rotate_due()
+        if self._journal is not None:
+            self._rotate()
+
+    def _score_batch(self, batch):
+        ts, endpoints, customer_ids, frames, champion = zip(*batch)
+        X_raw = pd.concat(frames, ignore_index=True)
+        champ = pd.concat(champion, ignore_index=True)
+
+        chall = self._scorer.score(X_raw).reset_index(drop=True)
+
+        log = X_raw.reindex(columns=MODEL_FEATURES).astype(float)
+        log.insert(0, "timestamp", pd.to_datetime((np.asarray(ts) * 1e6).astype("int64"), unit="us", utc=True))
+        log.insert(1, "endpoint", list(endpoints))
+        log.insert(2, "customer_id", pd.array(customer_ids, dtype="Int64"))
+        for col in _SCORE_COLUMNS:
+            log[f"champion_{col}"] = champ[col].to_numpy(dtype=float)
+            log[f"challenger_{col}"] = chall[col].to_numpy(dtype=float)
+            log[f"delta_{col}"] = log[f"challenger_{col}"] - log[f"champion_{col}"]
+
+        self._append(pa.Table.from_pandas(log, schema=SHADOW_SCHEMA, preserve_index=False))
+
+    # -------------------------
+    # Journal and rotation
+    # -------------------------
+    def _append(self, table: pa.Table):
+        if self._journal is None:
+            opened = time.time()
+            self._seq += 1
+            path = os.path.join(self.log_dir, f".shadow-{os.getpid()}-{int(opened)}-{self._seq:06d}{JOURNAL_SUFFIX}")
+            sink = open(path, "wb")
+            self._journal = {"path": path, "sink": sink, "writer": pa.ipc.new_stream(sink, SHADOW_SCHEMA),
+                             "opened": opened}
+        try:
+            self._journal["writer"].write_table(table)
+            self._journal["sink"].flush()
+        except Exception:
+            self._rotate()  # a torn append would hide later batches of this journal
+            raise
+
+    def _rotate_due(self):
+        journal = self._journal
+        if journal is not None and (time.time() - journal["opened"] >= self.rotate_seconds
+                                    or journal["sink"].tell() >= self.rotate_bytes):
+            self._rotate()
+
+    def _rotate(self):
+        journal, self._journal = self._journal, None
+        try:
+            journal["writer"].close()
+            journal["sink"].close()
+            compact_journal(journal["path"], SHADOW_SCHEMA)
+            self._incr("rotations")
+        except Exception as e:
+            # the journal stays on disk and is compacted by the next start
+            print("Shadow log rotation failed:", e)
+
+
+def read_shadow_log(log_dir: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read the shadow log back (rotated parts plus any live journals) into a single DataFrame."""
+    if not os.path.isdir(log_dir):
+        return pd.DataFrame(columns=columns)
+    tables = [ds.dataset(log_dir, format="parquet", schema=SHADOW_SCHEMA).to_table(columns=columns)]
+    for path in sorted(glob.glob(os.path.join(log_dir, f".shadow-*{JOURNAL_SUFFIX}"))):
+        tables.append(read_journal(path, SHADOW_SCHEMA).select(columns or SHADOW_SCHEMA.names))
+    return pa.concat_tables(tables).to_pandas()
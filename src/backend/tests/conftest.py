@@ -0,0 +1,97 @@
+"""
+Shared fixtures: a small synthetic applicant book and an XGBoost-backed
+CreditRiskPyFunc trained on it, so tests run without MLflow or the real data.
+`serve` imports serve_local_2 against that booster saved as a local MLflow
+pyfunc model, with every artifact directory in a scratch location; it is
+skipped when the serving-only dependencies are not installed.
+
+    python -m pytest src/backend/tests
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+import xgboost as xgb  # noqa: E402
+
+from preprocess import preprocess_input  # noqa: E402
+from utils import MODEL_FEATURES  # noqa: E402
+
+
+def synth_applicants(n: int, seed: int = 0) -> pd.DataFrame:
+    """MODEL_FEATURES plus a SeriousDlqin2yrs label that depends on utilization, lates and age."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "RevolvingUtilizationOfUnsecuredLines": rng.random(n),
+        "age": rng.integers(21, 90, n),
+        "NumberOfTime30_59DaysPastDueNotWorse": rng.poisson(0.3, n),
+        "DebtRatio": rng.random(n),
+        "MonthlyIncome": rng.normal(6000, 2000, n).clip(0),
+        "NumberOfOpenCreditLinesAndLoans": rng.integers(0, 20, n),
+        "NumberOfTimes90DaysLate": rng.poisson(0.2, n),
+        "NumberRealEstateLoansOrLines": rng.integers(0, 4, n),
+        "NumberOfTime60_89DaysPastDueNotWorse": rng.poisson(0.1, n),
+        "NumberOfDependents": rng.integers(0, 5, n).astype(float),
+    })
+    logit = -3 + 2 * df.RevolvingUtilizationOfUnsecuredLines + df.NumberOfTimes90DaysLate - df.age / 60
+    df["SeriousDlqin2yrs"] = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int)
+    return df
+
+
+@pytest.fixture(scope="session")
+def applicants() -> pd.DataFrame:
+    return synth_applicants(3000)
+
+
+@pytest.fixture(scope="session")
+def booster(applicants) -> xgb.Booster:
+    X = preprocess_input(applicants[MODEL_FEATURES])
+    dtrain = xgb.DMatrix(X.values, label=applicants["SeriousDlqin2yrs"], feature_names=list(X.columns))
+    return xgb.train({"objective": "binary:logistic", "tree_method": "hist", "max_depth": 4}, dtrain, 30)
+
+
+@pytest.fixture
+def credit_model(booster):
+    """Uncalibrated CreditRiskPyFunc around the session booster (a fresh instance per test)."""
+    from serve_pyfunc import CreditRiskPyFunc
+
+    model = CreditRiskPyFunc()
+    model.booster = booster
+    model.calibrator = None
+    return model
+
+
+@pytest.fixture(scope="session")
+def serve(booster, tmp_path_factory):
+    for name in ("openai", "matplotlib", "nest_asyncio"):
+        pytest.importorskip(name)
+    import mlflow.pyfunc
+    import mlflow.xgboost
+    from serve_pyfunc import CreditRiskPyFunc
+
+    root = tmp_path_factory.mktemp("serve")
+    mlflow.xgboost.save_model(booster, str(root / "xgb_model"))
+    mlflow.pyfunc.save_model(str(root / "pyfunc_model"), python_model=CreditRiskPyFunc(),
+                             artifacts={"xgb_model_uri": str(root / "xgb_model")})
+    env = {
+        "MODEL_URI": str(root / "pyfunc_model"),
+        "DATABRICKS_HOST": "unused",
+        "DATABRICKS_TOKEN": "unused",
+        "OPENAI_API_KEY": "unused",
+        "CALIBRATION_MANIFEST": str(root / "calibration" / "current.json"),
+        "SCORE_TABLE_PATH": str(root / "score_table.arrow"),
+        "AUDIT_LOG_DIR": str(root / "audit_log"),
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(BACKEND_DIR)  # the service reads data/ relative to the backend folder
+        for key, value in env.items():
+            mp.setenv(key, value)
+        mp.delenv("CHALLENGER_MODEL_URI", raising=False)
+        import serve_local_2
+
+        yield serve_local_2
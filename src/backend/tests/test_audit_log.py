@@ -0,0 +1,154 @@
+import datetime
+import glob
+import json
+import os
+import time
+
+import pyarrow as pa
+import pytest
+
+from audit_log import (AUDIT_SCHEMA, JOURNAL_SUFFIX, QUARANTINE_DIR, AuditLog, coerce_row, compact_journal,
+                       read_audit_log, read_journal)
+from utils import MODEL_FEATURES
+
+
+@pytest.fixture
+def inputs(applicants):
+    return {f: float(v) for f, v in applicants.iloc[0][MODEL_FEATURES].items()}
+
+
+def _record(log, inputs, n, start=0, **kwargs):
+    for i in range(start, start + n):
+        assert log.record("/predict", inputs, 0.1, 0.12, 650.0, 0.23, recommendation="Approve",
+                          customer_id=i, model_version="v1", **kwargs)
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out waiting for the audit writer")
+        time.sleep(0.01)
+
+
+def _today():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def test_coerce_row():
+    row, errors = coerce_row({"age": "41", "DebtRatio": float("nan"), "MonthlyIncome": " ",
+                              "customer_id": "12", "endpoint": 5})
+    assert (row["age"], row["DebtRatio"], row["MonthlyIncome"], row["customer_id"], row["endpoint"]) == \
+        (41.0, None, None, 12, "5")
+    assert errors == {}
+
+    _, errors = coerce_row({"age": True, "DebtRatio": "high", "customer_id": 2**64})
+    assert set(errors) == {"age", "DebtRatio", "customer_id"}
+
+
+def test_rows_are_journaled_then_rotated_on_stop(inputs, tmp_path):
+    log = AuditLog(str(tmp_path), flush_seconds=0.05).start()
+    _record(log, inputs, 25)
+    _wait_for(lambda: log.metrics()["written"] == 25)
+
+    partition = tmp_path / f"date={_today()}"
+    assert [f for f in os.listdir(partition) if f.endswith(".parquet")] == []
+    assert len(read_audit_log(str(tmp_path))) == 25  # the live journal is readable
+
+    log.stop()
+    parts = [f for f in os.listdir(partition)]
+    assert len(parts) == 1 and parts[0].endswith(".parquet")
+    rows = read_audit_log(str(tmp_path))
+    assert sorted(rows["customer_id"]) == list(range(25))
+    assert set(rows["recommendation"]) == {"Approve"} and set(rows["model_version"]) == {"v1"}
+    assert rows.loc[0, "age"] == inputs["age"]
+    metrics = log.metrics()
+    assert (metrics["rotations"], metrics["pending"], metrics["open_journals"]) == (1, 0, 0)
+
+
+def test_read_projects_and_filters(inputs, tmp_path):
+    log = AuditLog(str(tmp_path), flush_seconds=0.05).start()
+    _record(log, inputs, 10)
+    log.stop()
+    out = read_audit_log(str(tmp_path), columns=["customer_id", "credit_score"], customer_id=3)
+    assert out.to_dict("records") == [{"customer_id": 3, "credit_score": 650.0}]
+    assert read_audit_log(str(tmp_path), start_date="2999-01-01").empty
+    assert len(read_audit_log(str(tmp_path), start_date=_today(), end_date=_today())) == 10
+
+
+def test_journal_rotates_by_size(inputs, tmp_path):
+    log = AuditLog(str(tmp_path), batch_size=5, flush_seconds=0.05, rotate_bytes=1).start()
+    for start in range(0, 20, 5):
+        _record(log, inputs, 5, start=start)
+        _wait_for(lambda: log.metrics()["written"] == start + 5)
+    log.stop()
+    assert log.metrics()["rotations"] >= 2
+    assert len(read_audit_log(str(tmp_path))) == 20
+
+
+def test_backlog_is_bounded(inputs, tmp_path):
+    log = AuditLog(str(tmp_path), max_pending=3)  # not started: nothing drains
+    accepted = [log.record("/predict", inputs, 0.1, 0.1, 600.0, 0.2) for _ in range(5)]
+    assert accepted == [True, True, True, False, False]
+    metrics = log.metrics()
+    assert (metrics["pending"], metrics["dropped"], metrics["utilization"]) == (3, 2, 1.0)
+
+
+def test_invalid_rows_are_quarantined(inputs, tmp_path):
+    log = AuditLog(str(tmp_path), flush_seconds=0.05).start()
+    _record(log, inputs, 2)
+    log.record("/predict", {**inputs, "DebtRatio": "high"}, 0.1, 0.1, 600.0, 0.2, customer_id=99)
+    log.stop()
+    assert sorted(read_audit_log(str(tmp_path))["customer_id"]) == [0, 1]
+    (quarantine,) = glob.glob(str(tmp_path / QUARANTINE_DIR / "*.jsonl"))
+    entry = json.loads(open(quarantine).read())
+    assert entry["errors"] == {"DebtRatio": "not a number: 'high'"} and entry["row"]["customer_id"] == 99
+    assert log.metrics()["quarantined"] == 1
+
+
+def test_failed_write_is_requeued(inputs, tmp_path, monkeypatch):
+    log = AuditLog(str(tmp_path), flush_seconds=0.05)
+    append = log._append
+    failures = []
+
+    def flaky_append(day, table):
+        if not failures:
+            failures.append(day)
+            raise OSError("disk full")
+        append(day, table)
+
+    monkeypatch.setattr(log, "_append", flaky_append)
+    _record(log, inputs, 5)
+    log.start()
+    _wait_for(lambda: log.metrics()["written"] == 5)
+    log.stop()
+    assert failures and log.metrics()["write_errors"] == 1
+    assert sorted(read_audit_log(str(tmp_path))["customer_id"]) == list(range(5))
+
+
+def test_orphaned_journal_is_recovered_on_start(inputs, tmp_path):
+    partition = tmp_path / "date=2026-01-02"
+    partition.mkdir()
+    journal = partition / f".audit-999999999-1-000001{JOURNAL_SUFFIX}"
+    row, _ = coerce_row({**inputs, "timestamp": datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc),
+                         "endpoint": "/predict", "customer_id": 5, "credit_score": 610.0})
+    with open(journal, "wb") as sink:
+        with pa.ipc.new_stream(sink, AUDIT_SCHEMA) as writer:
+            writer.write_table(pa.Table.from_pylist([row], schema=AUDIT_SCHEMA))
+            writer.write_table(pa.Table.from_pylist([{**row, "customer_id": 6}], schema=AUDIT_SCHEMA))
+    # crash mid-append: the last message is torn
+    with open(journal, "r+b") as f:
+        f.truncate(os.path.getsize(journal) - 20)
+    assert read_journal(str(journal)).num_rows == 1
+
+    AuditLog(str(tmp_path)).start().stop()
+    assert not journal.exists()
+    out = read_audit_log(str(tmp_path), start_date="2026-01-02", end_date="2026-01-02")
+    assert out["customer_id"].tolist() == [5] and out["credit_score"].tolist() == [610.0]
+
+
+def test_empty_journal_compacts_to_nothing(tmp_path):
+    journal = tmp_path / f".audit-1-1-000001{JOURNAL_SUFFIX}"
+    with open(journal, "wb") as sink:
+        pa.ipc.new_stream(sink, AUDIT_SCHEMA).close()
+    assert compact_journal(str(journal)) is None and not journal.exists()
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import calibration_job
+from calibration_job import (KEEP_VERSIONS, MANIFEST_NAME, STATS_NAME, CalibrationStats, PlattCalibrator,
+                             PublishedArtifacts, build_reference, fit_calibrator, run_init, run_update)
+from utils import MODEL_FEATURES
+
+
+def _labeled(n, seed):
+    rng = np.random.default_rng(seed)
+    raw = rng.random(n)
+    return raw, (rng.random(n) < raw ** 2).astype(float)  # raw probabilities overstate risk
+
+
+@pytest.fixture
+def history(applicants, tmp_path):
+    path = tmp_path / "history.parquet"
+    applicants.to_parquet(path, index=False)
+    return str(path)
+
+
+def test_stats_merge_equals_one_pass():
+    raw_a, y_a = _labeled(500, 1)
+    raw_b, y_b = _labeled(700, 2)
+    merged = CalibrationStats().update(raw_a, y_a).merge(CalibrationStats().update(raw_b, y_b))
+    whole = CalibrationStats().update(np.r_[raw_a, raw_b], np.r_[y_a, y_b])
+    for attr in ("count", "positives", "prob_sum"):
+        np.testing.assert_allclose(getattr(merged, attr), getattr(whole, attr))
+    assert merged.n == 1200
+
+
+def test_decay_down_weights_history():
+    raw, y = _labeled(100, 3)
+    stats = CalibrationStats().update(raw, y).update(raw, y, decay=0.5)
+    assert stats.n == pytest.approx(150)
+
+
+def test_stats_reject_mismatched_lengths():
+    with pytest.raises(ValueError):
+        CalibrationStats().update([0.1, 0.2], [1.0])
+
+
+@pytest.mark.parametrize("method", ["isotonic", "platt"])
+def test_calibrator_fits_observed_default_rate(method):
+    raw, y = _labeled(20_000, 4)
+    calibrator = fit_calibrator(CalibrationStats().update(raw, y), method=method)
+    calibrated = np.asarray(calibrator.predict(np.array([0.1, 0.5, 0.9])))
+    assert np.all(np.diff(calibrated) > 0)
+    assert calibrated[1] == pytest.approx(0.25, abs=0.1)
+
+
+def test_calibrator_needs_populated_bins():
+    with pytest.raises(ValueError, match="populated bins"):
+        fit_calibrator(CalibrationStats().update([0.5], [1.0]))
+
+
+def test_reference_is_sorted_weighted_quantiles():
+    raw, y = _labeled(5000, 5)
+    stats = CalibrationStats().update(raw, y)
+    reference = build_reference(stats, PlattCalibrator(1.0, 0.0), n_quantiles=101)
+    scores = reference["score"].to_numpy()
+    assert len(scores) == 101 and np.all(np.diff(scores) >= 0)
+    assert scores[50] == pytest.approx(0.5, abs=0.02)  # identity calibrator over uniform raw probabilities
+
+
+def test_init_then_update_publishes_versioned_pairs(credit_model, history, tmp_path):
+    publish_dir = tmp_path / "calibration"
+    first = run_init(history, credit_model, publish_dir=str(publish_dir))
+    manifest = json.loads((publish_dir / MANIFEST_NAME).read_text())
+    assert manifest == first and (publish_dir / STATS_NAME).exists()
+    assert manifest["n_observations"] == 3000
+    assert (publish_dir / manifest["calibrator"]).exists() and (publish_dir / manifest["reference"]).exists()
+
+    versions = [first["version"]]
+    for seed in range(KEEP_VERSIONS + 1):
+        raw, y = _labeled(2000, 10 + seed)
+        versions.append(run_update(pd.DataFrame({"raw_probability": raw, "SeriousDlqin2yrs": y}),
+                                   publish_dir=str(publish_dir))["version"])
+    assert len(set(versions)) == len(versions)
+    on_disk = {d for d in os.listdir(publish_dir) if os.path.isdir(publish_dir / d)}
+    assert on_disk == set(versions[-KEEP_VERSIONS:])
+
+
+def test_update_requires_seeded_stats(tmp_path):
+    with pytest.raises(FileNotFoundError, match="init"):
+        run_update(pd.DataFrame({"raw_probability": [0.1], "SeriousDlqin2yrs": [0]}), publish_dir=str(tmp_path))
+
+
+def test_stats_are_saved_only_after_a_successful_publish(credit_model, history, tmp_path, monkeypatch):
+    publish_dir = tmp_path / "calibration"
+    run_init(history, credit_model, publish_dir=str(publish_dir))
+    before = CalibrationStats.load(str(publish_dir / STATS_NAME)).n
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(calibration_job, "publish", fail)
+    raw, y = _labeled(500, 6)
+    with pytest.raises(OSError):
+        run_update(pd.DataFrame({"raw_probability": raw, "SeriousDlqin2yrs": y}), publish_dir=str(publish_dir))
+    assert CalibrationStats.load(str(publish_dir / STATS_NAME)).n == before
+
+
+def test_published_pair_is_picked_up_once(credit_model, history, tmp_path):
+    publish_dir = tmp_path / "calibration"
+    artifacts = PublishedArtifacts(str(publish_dir / MANIFEST_NAME), history)
+    assert artifacts.version().startswith("baseline-")
+    assert artifacts.poll() == (None, None)  # nothing published yet
+
+    manifest = run_init(history, credit_model, publish_dir=str(publish_dir))
+    calibrator, reference = artifacts.poll()
+    assert calibrator is not None and list(reference.columns) == ["score"]
+    assert artifacts.version() == manifest["version"]
+    assert artifacts.poll() == (None, None)
+
+    credit_model.calibrator = calibrator
+    scored = credit_model.score(pd.read_parquet(history)[MODEL_FEATURES])
+    assert not np.allclose(scored["calibrated_probability"], scored["raw_probability"])
+
+
+def test_broken_manifest_keeps_the_current_pair(credit_model, history, tmp_path):
+    publish_dir = tmp_path / "calibration"
+    manifest = run_init(history, credit_model, publish_dir=str(publish_dir))
+    artifacts = PublishedArtifacts(str(publish_dir / MANIFEST_NAME), None)
+    artifacts.poll()
+
+    time.sleep(0.01)
+    (publish_dir / MANIFEST_NAME).write_text(json.dumps({**manifest, "version": "x", "calibrator": "missing"}))
+    assert artifacts.poll() == (None, None)
+    assert artifacts.version() == manifest["version"]
+
+
+# -------------------------
+# Serving-side hot swap (serve_local_2)
+# -------------------------
+def test_poller_swaps_the_serving_snapshot(serve, credit_model, history, monkeypatch):
+    from fastapi.testclient import TestClient
+    from portfolio import PortfolioCube
+
+    manifest_path = serve.published_artifacts.manifest_path
+    monkeypatch.setattr(serve, "published_artifacts", PublishedArtifacts(manifest_path, history))
+    monkeypatch.setattr(serve, "serving", serve.serving)
+    monkeypatch.setattr(serve, "portfolio", PortfolioCube())
+    monkeypatch.setattr(serve, "ARTIFACT_POLL_SECONDS", 0.05)
+    before = serve.serving
+
+    with TestClient(serve.app):
+        manifest = run_init(history, credit_model, publish_dir=os.path.dirname(manifest_path))
+        deadline = time.monotonic() + 10
+        while serve.serving is before and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    after = serve.serving
+    assert after is not before and after.model_version.endswith(manifest["version"])
+    assert after.scorer.calibrator is not None and before.scorer.calibrator is None  # old snapshot untouched
+    assert len(after.reference_sorted) == manifest["reference_rows"]
+    assert len(serve.portfolio) == len(serve.customers_df)  # book re-scored with the new calibrator
+    assert not serve.refresh_published_artifacts()
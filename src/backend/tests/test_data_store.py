@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from data_store import (ENRICHMENT_SCHEMA, ROW_GROUP_SIZE, TRAINING_SCHEMA, convert_csv_to_parquet,
+                        ensure_parquet, load_table, parquet_path_for, widen_counts)
+from preprocess import preprocess_input
+from utils import MODEL_FEATURES, load_training_data
+
+
+@pytest.fixture
+def training_csv(applicants, tmp_path):
+    df = applicants.copy()
+    df.insert(0, "Unnamed: 0", np.arange(1, len(df) + 1))
+    path = tmp_path / "cs-training.csv"
+    df.to_csv(path, index=False)
+    return str(path), df
+
+
+def test_training_csv_round_trips_with_compact_dtypes(training_csv):
+    csv_path, df = training_csv
+    parquet_path = convert_csv_to_parquet(csv_path, schema=TRAINING_SCHEMA)
+    assert parquet_path == parquet_path_for(csv_path)
+
+    loaded = pd.read_parquet(parquet_path)
+    assert {c: str(t) for c, t in loaded.dtypes.items()} == TRAINING_SCHEMA
+    # counts are exact; continuous values within float32 precision
+    for col in df.columns:
+        np.testing.assert_allclose(loaded[col].astype(float), df[col].astype(float), rtol=1e-6)
+    assert pq.ParquetFile(parquet_path).metadata.row_group(0).num_rows == min(len(df), ROW_GROUP_SIZE)
+
+
+def test_blank_cells_read_as_missing(training_csv, tmp_path):
+    _, df = training_csv
+    df = df.astype(object)
+    df["SeriousDlqin2yrs"] = None  # unlabelled split (cs-test.csv)
+    df.loc[0, "age"] = None
+    df.loc[1, "NumberOfTimes90DaysLate"] = None
+    csv_path = tmp_path / "cs-test.csv"
+    df.to_csv(csv_path, index=False)
+
+    loaded = load_training_data(str(csv_path))
+    assert str(loaded["SeriousDlqin2yrs"].dtype) == "Int8" and loaded["SeriousDlqin2yrs"].isna().all()
+    assert pd.isna(loaded.loc[0, "age"]) and pd.isna(loaded.loc[1, "NumberOfTimes90DaysLate"])
+
+    X = preprocess_input(loaded[MODEL_FEATURES])
+    assert np.isnan(X.loc[0, "AgePerCreditLine"]) and np.isnan(X.loc[1, "SeriousDelinqRate"])
+    assert np.isfinite(X.loc[2:, "AgePerCreditLine"]).all()
+
+
+def test_ensure_parquet_reconverts_only_when_stale(training_csv):
+    csv_path, _ = training_csv
+    parquet_path = ensure_parquet(csv_path, schema=TRAINING_SCHEMA)
+    first = os.path.getmtime(parquet_path)
+    assert ensure_parquet(csv_path, schema=TRAINING_SCHEMA) == parquet_path
+    assert os.path.getmtime(parquet_path) == first
+
+    os.utime(csv_path, (first + 10, first + 10))
+    ensure_parquet(csv_path, schema=TRAINING_SCHEMA)
+    assert os.path.getmtime(parquet_path) > first
+
+
+def test_load_table_projects_and_pushes_down_ids(tmp_path):
+    book = pd.DataFrame({"Identifier": np.arange(1000, dtype="int32"),
+                         "MonthlyIncome": np.linspace(1000, 9000, 1000, dtype="float32"),
+                         "DebtRatio": np.linspace(0, 1, 1000, dtype="float32")})
+    path = tmp_path / "book.parquet"
+    book.to_parquet(path, index=False, row_group_size=100)
+
+    out = load_table(str(path), columns=["Identifier", "MonthlyIncome"], ids=[5, 999, 5000])
+    assert list(out.columns) == ["Identifier", "MonthlyIncome"]
+    assert out["Identifier"].tolist() == [5, 999]
+    assert out["MonthlyIncome"].tolist() == book.loc[[5, 999], "MonthlyIncome"].tolist()
+
+
+def test_enrichment_schema_columns_convert(tmp_path):
+    enriched = pd.DataFrame({"CustomerID": [1, 2], "Gender": ["F", "M"], "JudiciaryCaseCount": [0, 2],
+                             "JudiciaryCaseFlag": [False, True], "TotalInflows": [1.5, 2.5]})
+    csv_path = tmp_path / "enriched.csv"
+    enriched.to_csv(csv_path, index=False)
+    loaded = pd.read_parquet(convert_csv_to_parquet(str(csv_path), schema=ENRICHMENT_SCHEMA))
+    assert {c: str(t) for c, t in loaded.dtypes.items()} == {c: ENRICHMENT_SCHEMA[c] for c in enriched.columns}
+
+
+def test_widen_counts_copies_and_avoids_int8_overflow():
+    df = pd.DataFrame({"NumberOfTimes90DaysLate": pd.array([98, None], dtype="Int8"),
+                       "NumberOfTime60_89DaysPastDueNotWorse": np.array([98, 1], dtype="int8"),
+                       "DebtRatio": np.array([0.5, 0.1], dtype="float32")})
+    wide = widen_counts(df)
+    assert wide is not df and str(df["NumberOfTimes90DaysLate"].dtype) == "Int8"
+    assert wide.dtypes.tolist() == [np.float64, np.float64, np.float32]
+    total = wide["NumberOfTimes90DaysLate"] + wide["NumberOfTime60_89DaysPastDueNotWorse"]
+    assert total[0] == 196 and np.isnan(total[1])
+
+
+def test_preprocess_leaves_its_input_untouched(applicants):
+    raw = applicants[MODEL_FEATURES].copy()
+    X = preprocess_input(raw)
+    assert list(raw.columns) == MODEL_FEATURES
+    assert len(X.columns) == len(MODEL_FEATURES) + 5
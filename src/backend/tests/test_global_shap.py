@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import xgboost as xgb
+
+from global_shap import _iter_slices, compute_global_shap, row_group_tasks, summarize, write_outputs
+from preprocess import preprocess_input
+from utils import MODEL_FEATURES
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def reference_parquet(applicants, tmp_path):
+    path = tmp_path / "reference.parquet"
+    table = pa.Table.from_pandas(applicants[MODEL_FEATURES], preserve_index=False)
+    pq.write_table(table, path, row_group_size=700)  # 5 row groups, the last one partial
+    return str(path)
+
+
+@pytest.fixture
+def model_path(booster, tmp_path):
+    path = str(tmp_path / "booster.json")
+    booster.save_model(path)
+    return path
+
+
+def test_tasks_are_one_per_row_group(reference_parquet, tmp_path):
+    empty = tmp_path / "empty.parquet"
+    pq.write_table(pa.Table.from_pandas(pq.read_table(reference_parquet).to_pandas().head(0)), empty)
+    tasks = row_group_tasks([reference_parquet, str(empty)], chunk_rows=300)
+    assert tasks == [(reference_parquet, g, 300) for g in range(5)]
+
+
+def test_slices_cover_a_row_group_once(reference_parquet, applicants):
+    slices = list(_iter_slices(reference_parquet, 1, 300))
+    assert [(offset, len(frame)) for offset, frame in slices] == [(0, 300), (300, 300), (600, 100)]
+    rows = np.vstack([frame.to_numpy() for _, frame in slices])
+    np.testing.assert_array_equal(rows, applicants[MODEL_FEATURES].iloc[700:1400].to_numpy())
+
+
+def test_merged_statistics_do_not_depend_on_chunking(reference_parquet, model_path, booster, applicants):
+    runs = [compute_global_shap([reference_parquet], model_path, workers=workers, chunk_rows=chunk_rows,
+                                n_bins=8, interaction_rows=0)
+            for workers, chunk_rows in [(1, 10_000), (2, 250), (3, 64)]]
+    for other in runs[1:]:
+        for key in ("n", "n_interaction"):
+            assert other[key] == runs[0][key] == len(applicants)
+        for key in ("sum_abs", "sum", "bin_count", "bin_value", "bin_shap", "bin_shap_sq", "sum_abs_interaction"):
+            # float32 contributions summed in a different order
+            np.testing.assert_allclose(other[key], runs[0][key], rtol=1e-5, atol=1e-6)
+
+    # and equal the exact contributions over the whole set
+    X = preprocess_input(applicants[MODEL_FEATURES])
+    contribs = booster.predict(xgb.DMatrix(X.values, feature_names=list(X.columns)), pred_contribs=True)[:, :-1]
+    np.testing.assert_allclose(runs[0]["sum_abs"], np.abs(contribs.astype(float)).sum(axis=0), rtol=1e-6)
+
+
+def test_summary_tables(reference_parquet, model_path, applicants, tmp_path):
+    stats = compute_global_shap([reference_parquet], model_path, workers=2, chunk_rows=700, n_bins=8,
+                                interaction_rows=50)
+    tables = summarize(stats)
+    importance = tables["feature_importance"]
+    assert set(importance["feature"]) == set(stats["features"])
+    assert importance["importance"].is_monotonic_decreasing
+
+    dependence = tables["shap_dependence"]
+    per_feature = dependence.groupby("feature")["count"].sum()
+    assert (per_feature == len(applicants)).all()  # no missing values in the synthetic book
+    assert (dependence["std_shap"] >= 0).all()
+
+    n = len(stats["features"])
+    assert stats["n_interaction"] == 5 * 50  # sampled per slice: one slice per row group here
+    assert len(tables["shap_interactions"]) == n * (n - 1) // 2
+
+    written = write_outputs(tables, str(tmp_path / "out"))
+    assert sorted(os.path.basename(p) for p in written) == ["feature_importance.parquet",
+                                                            "shap_dependence.parquet", "shap_interactions.parquet"]
+
+
+def test_cli_writes_to_a_scratch_directory_by_default(reference_parquet, model_path, tmp_path):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    subprocess.run([sys.executable, "global_shap.py", reference_parquet, "--model", model_path,
+                    "--workers", "1", "--no-interactions"],
+                   cwd=BACKEND_DIR, env={**os.environ, "TMPDIR": str(scratch)}, check=True, capture_output=True)
+    assert sorted(os.listdir(scratch / "global-shap")) == ["feature_importance.parquet", "shap_dependence.parquet"]
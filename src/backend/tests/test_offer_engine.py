@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from offer_engine import (OFFER_COLUMNS, OFFER_TENURES, PD_HORIZON_MONTHS, best_offer, offer_record,
+                          optimize_offers, risk_based_rates)
+from utils import APR_CAP, FOIR_CAP, LGD, ROA, compute_risk_based_rate
+
+
+@pytest.fixture(scope="module")
+def book():
+    rng = np.random.default_rng(0)
+    n = 600
+    return {"monthly_income": rng.normal(6000, 2500, n).clip(0),
+            "debt_ratio": rng.uniform(0, 0.8, n),
+            "pd_prob": rng.beta(1, 8, n)}
+
+
+def test_risk_based_rates_match_the_scalar_rule():
+    pd_prob = np.array([0.0, 0.01, 0.05, 0.2, 0.6, 1.0])
+    np.testing.assert_allclose(risk_based_rates(pd_prob), [compute_risk_based_rate(p) for p in pd_prob])
+    assert risk_based_rates(pd_prob).max() <= APR_CAP
+
+
+def test_offers_are_priced_at_or_above_the_risk_based_rate(book):
+    offers = optimize_offers(**book)
+    assert offers["offer_found"].mean() > 0.5
+    found = offers[offers["offer_found"]]
+    assert (found["apr"] >= found["risk_based_apr"] - 1e-12).all()
+    assert (found["apr"] <= APR_CAP + 1e-12).all()
+    np.testing.assert_allclose(offers["risk_based_apr"], risk_based_rates(book["pd_prob"]))
+
+
+def test_offers_are_affordable(book):
+    offers = optimize_offers(**book)
+    found = offers["offer_found"].to_numpy()
+    income, debt_ratio = book["monthly_income"][found], book["debt_ratio"][found]
+    assert (offers.loc[found, "emi"] <= (FOIR_CAP - debt_ratio) * income + 1e-6).all()
+    assert (offers.loc[found, "foir_after"] <= FOIR_CAP + 1e-9).all()
+    assert set(offers.loc[found, "tenure_months"]) <= set(OFFER_TENURES)
+
+    # no income or already over the FOIR cap: nothing to offer
+    assert optimize_offers([0.0, 5000.0], [0.2, FOIR_CAP + 0.1], [0.05, 0.05])["offer_found"].tolist() == [False, False]
+
+
+def test_offer_economics(book):
+    found = optimize_offers(**book).query("offer_found")
+    pd_prob = book["pd_prob"][found.index]
+    np.testing.assert_allclose(found["pd_term"], 1 - (1 - pd_prob) ** (found["tenure_months"] / PD_HORIZON_MONTHS))
+    np.testing.assert_allclose(found["expected_loss"], found["pd_term"] * LGD * found["amount"])
+    np.testing.assert_allclose(found["expected_profit"], found["acceptance_probability"] * found["profit"])
+    assert (found["annual_return"] >= ROA - 1e-12).all()
+
+
+def test_constraints_are_respected_or_no_offer(book):
+    base = optimize_offers(**book)
+    strict = optimize_offers(**book, min_annual_return=0.08, max_loss_rate=0.02)
+    found = strict["offer_found"]
+    assert found.sum() < base["offer_found"].sum()
+    assert (strict.loc[found, "annual_return"] >= 0.08 - 1e-12).all()
+    assert (strict.loc[found, "pd_term"] * LGD <= 0.02 + 1e-12).all()
+    assert strict.loc[~found, OFFER_COLUMNS].isna().all().all()
+
+    impossible = optimize_offers(**book, min_annual_return=10.0)
+    assert not impossible["offer_found"].any()
+
+
+def test_batch_matches_single_requests(book):
+    batch = optimize_offers(**book, chunk_size=64)
+    for i in range(0, len(batch), 37):
+        single = best_offer(book["monthly_income"][i], book["debt_ratio"][i], book["pd_prob"][i])
+        assert offer_record(batch.iloc[i]) == single
+
+
+def test_offer_record():
+    assert best_offer(0.0, 0.2, 0.05) == {"risk_based_apr": round(compute_risk_based_rate(0.05), 6), "offer": None}
+    offer = best_offer(8000.0, 0.3, 0.04)["offer"]
+    assert list(offer) == OFFER_COLUMNS and isinstance(offer["tenure_months"], int)
+    assert offer["amount"] == round(offer["amount"], 2) and offer["apr"] == round(offer["apr"], 6)
+
+
+def test_empty_batch():
+    offers = optimize_offers([], [], [])
+    assert offers.empty and {"offer_found", "risk_based_apr", *OFFER_COLUMNS} <= set(offers.columns)
+
+
+# -------------------------
+# /offer and /offers (serve_local_2)
+# -------------------------
+def test_offer_endpoints(serve, applicants):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(serve.app)
+    payloads = [{f: float(v) for f, v in row.items()} for row in
+                applicants.drop(columns="SeriousDlqin2yrs").head(20).to_dict("records")]
+
+    batch = client.post("/offers", json={"applicants": payloads, "max_loss_rate": 0.05}).json()["offers"]
+    assert len(batch) == len(payloads)
+    for payload, result in zip(payloads, batch):
+        single = client.post("/offer", json={**payload, "max_loss_rate": 0.05}).json()
+        assert {k: single[k] for k in ("pd", "risk_based_apr", "offer")} == result
+        if result["offer"] is not None:
+            assert result["risk_based_apr"] <= result["offer"]["apr"] <= APR_CAP
+            assert result["offer"]["pd_term"] * LGD <= 0.05 + 1e-6
+
+    customer_id = int(serve.customers_df["Identifier"].iloc[0])
+    assert client.post("/offer", json={"customer_id": customer_id}).json()["customer_id"] == customer_id
+    assert "not found" in client.post("/offer", json={"customer_id": -1}).json()["error"]
+    assert "must be numbers" in client.post("/offer", json={**payloads[0], "max_loss_rate": "low"}).json()["error"]
+    assert client.post("/offers", json={"applicants": []}).json() == {"error": "applicants must be a non-empty list"}
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio import (DIMENSIONS, PortfolioCube, approvable_exposure, book_frame, segment_measures)
+from utils import LGD, MODEL_FEATURES, TENURE_OPTIONS, calculate_loan_options, compute_risk_based_rate
+
+
+@pytest.fixture
+def book(applicants, credit_model):
+    customers = applicants.head(400).copy()
+    customers.insert(0, "Identifier", np.arange(len(customers)))
+    pred = credit_model.score(customers[MODEL_FEATURES])
+    scores = pd.DataFrame({"Identifier": customers["Identifier"],
+                           "calibrated_probability": pred["calibrated_probability"].to_numpy(),
+                           "credit_score": pred["credit_score"].to_numpy()})
+    scores["apr"] = [compute_risk_based_rate(p) for p in scores["calibrated_probability"]]
+    return book_frame(customers, scores)
+
+
+def _cube(book):
+    cube = PortfolioCube()
+    cube.upsert_frame(book)
+    return cube
+
+
+def test_exposure_matches_loan_options():
+    income, debt_ratio, apr = [5000.0, 0.0, 8000.0], [0.2, 0.5, 0.7], [0.18, 0.2, 0.36]
+    exposure = approvable_exposure(income, debt_ratio, apr)
+    for i in range(3):
+        expected = [o["approved_loan_amount"] for o in calculate_loan_options(income[i], debt_ratio[i], apr[i])]
+        assert exposure[i].round(2).tolist() == (expected or [0.0] * len(TENURE_OPTIONS))
+
+
+def test_totals_equal_a_direct_aggregation(book):
+    total = _cube(book).query()["total"]
+    assert total["customers"] == len(book)
+    assert total["avg_pd"] == pytest.approx(book["calibrated_probability"].mean(), abs=1e-6)
+    assert total["avg_apr"] == pytest.approx(book["apr"].mean(), abs=1e-6)
+    exposure = approvable_exposure(book["MonthlyIncome"], book["DebtRatio"], book["apr"])
+    expected_loss = (book["calibrated_probability"] * LGD * exposure[:, TENURE_OPTIONS.index(24)]).sum()
+    assert total["expected_loss"] == pytest.approx(expected_loss, abs=0.01)
+    assert sum(total["apr_mix"].values()) == pytest.approx(1.0, abs=1e-3)
+
+
+def test_filters_and_groups_partition_the_total(book):
+    cube = _cube(book)
+    out = cube.query(filters={"has_delinquency_history": 1}, group_by=["age_band", "score_band"])
+    assert out["total"]["customers"] == int(book["has_delinquency_history"].sum())
+    assert sum(g["customers"] for g in out["groups"]) == out["total"]["customers"]
+    assert all(g["age_band"] in DIMENSIONS["age_band"] for g in out["groups"])
+
+    young = cube.query(filters={"age_band": ["<25", "25-35"]})["total"]["customers"]
+    assert young == int((book["age"] < 35).sum())
+
+
+def test_upsert_replaces_a_customers_contribution(book):
+    cube = _cube(book)
+    before = cube.query()["total"]
+    row = book.iloc[0]
+    cube.upsert(row["Identifier"], row["age"], row["has_delinquency_history"], row["credit_score"],
+                0.9, compute_risk_based_rate(0.9), row["MonthlyIncome"], row["DebtRatio"])
+    after = cube.query()["total"]
+    assert after["customers"] == before["customers"] == len(cube)
+    expected = (book["calibrated_probability"].sum() - row["calibrated_probability"] + 0.9) / len(book)
+    assert after["avg_pd"] == pytest.approx(expected, abs=1e-6)
+
+    # incremental updates leave the cube exactly where a rebuild would
+    rebuilt_book = book.copy()
+    rebuilt_book.loc[0, ["calibrated_probability", "apr"]] = [0.9, compute_risk_based_rate(0.9)]
+    assert _cube(rebuilt_book).query(group_by=["score_band"]) == cube.query(group_by=["score_band"])
+
+
+def test_remove(book):
+    cube = _cube(book)
+    assert cube.remove(0) and not cube.remove(0)
+    assert cube.query()["total"]["customers"] == len(book) - 1
+
+
+def test_transient_applicants_are_capped(book):
+    cube = PortfolioCube(max_transient=3)
+    cube.upsert_frame(book.head(10))
+    for key in range(5):
+        cube.upsert(f"applicant-{key}", 40, 0, 650, 0.1, 0.2, 5000, 0.3, transient=True)
+    assert len(cube) == 10 + 3
+    assert cube.query()["total"]["customers"] == 13
+
+
+def test_transient_applicants_expire(book, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("portfolio.time.monotonic", lambda: clock[0])
+    cube = PortfolioCube(transient_ttl=60)
+    cube.upsert_frame(book.head(10))
+    cube.upsert("applicant", 40, 0, 650, 0.1, 0.2, 5000, 0.3, transient=True)
+    clock[0] += 30
+    assert cube.expire() == 1
+    clock[0] += 31
+    assert cube.expire() == 0 and len(cube) == 10
+
+    # re-scoring a book customer as transient and back makes it permanent again
+    cube.upsert(0, 40, 0, 650, 0.1, 0.2, 5000, 0.3, transient=True)
+    cube.upsert(0, 40, 0, 650, 0.1, 0.2, 5000, 0.3)
+    clock[0] += 120
+    assert cube.expire() == 0 and len(cube) == 10
+
+
+def test_missing_age_and_nan_pd():
+    codes, _ = segment_measures([np.nan, 30], [0, 1], [600, 700], [0.1, 0.2], [0.2, 0.3], [5000, 5000], [0.3, 0.3])
+    assert DIMENSIONS["age_band"][codes[0, 0]] == "unknown" and DIMENSIONS["age_band"][codes[1, 0]] == "25-35"
+
+    cube = PortfolioCube()
+    with pytest.raises(ValueError, match="NaN"):
+        cube.upsert(1, 40, 0, 650, np.nan, 0.2, 5000, 0.3)
+    assert len(cube) == 0
+
+
+def test_upsert_frame_skips_unscored_rows(book):
+    book = book.head(5).copy()
+    book.loc[2, "calibrated_probability"] = np.nan
+    assert PortfolioCube().upsert_frame(book) == 4
+
+
+@pytest.mark.parametrize("filters, group_by, message", [
+    ({"region": "x"}, None, "unknown dimension"),
+    ({"age_band": "20-30"}, None, "unknown age_band"),
+    (None, ["score"], "unknown dimension"),
+])
+def test_query_validation(filters, group_by, message):
+    with pytest.raises(ValueError, match=message):
+        PortfolioCube().query(filters, group_by)
+
+
+# -------------------------
+# /portfolio (serve_local_2)
+# -------------------------
+def test_portfolio_endpoint_tracks_scored_customers(serve, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(serve, "portfolio", PortfolioCube())
+    serve.rebuild_book_portfolio(serve.serving)
+    client = TestClient(serve.app)
+    book_size = len(serve.customers_df)
+
+    r = client.post("/portfolio?fields=total", json={"group_by": ["score_band"]})
+    assert r.json() == {"total": serve.portfolio.query()["total"]} and r.json()["total"]["customers"] == book_size
+    assert client.post("/portfolio", json={"filters": {"x": 1}}).json()["error"].startswith("unknown dimension")
+
+    payload = serve.customer_inputs[int(serve.customers_df["Identifier"].iloc[0])]
+    payload = {k: (None if pd.isna(v) else float(v)) for k, v in payload.items()}
+    monkeypatch.setattr(serve, "force_plot_png", lambda *a: "")
+    client.post("/predict_1?fields=score", json=payload)
+    client.post("/predict_1?fields=score", json=payload)  # same applicant: upserted, not double counted
+    assert client.post("/portfolio", json={}).json()["total"]["customers"] == book_size + 1
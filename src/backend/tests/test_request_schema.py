@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+import pytest
+
+from request_schema import FEATURE_SCHEMA, FLOAT32_MAX, FeatureParseError
+from utils import MODEL_FEATURES
+
+
+@pytest.fixture
+def payload(applicants):
+    return {f: float(v) for f, v in applicants.iloc[0][MODEL_FEATURES].items()}
+
+
+def test_parse_returns_float32_vector_in_feature_order(payload):
+    vec = FEATURE_SCHEMA.parse(payload)
+    assert vec.dtype == np.float32 and vec.tolist() == pytest.approx([payload[f] for f in MODEL_FEATURES])
+    assert list(FEATURE_SCHEMA.to_frame(vec).columns) == MODEL_FEATURES
+
+
+@pytest.mark.parametrize("missing", [None, "", "  "])
+def test_missing_values_become_nan(payload, missing):
+    payload["MonthlyIncome"] = missing
+    del payload["NumberOfDependents"]
+    vec = FEATURE_SCHEMA.parse(payload)
+    assert math.isnan(vec[MODEL_FEATURES.index("MonthlyIncome")])
+    assert math.isnan(vec[MODEL_FEATURES.index("NumberOfDependents")])
+
+
+def test_numeric_strings_are_accepted(payload):
+    payload.update(age="42", DebtRatio=" 0.35 ")
+    vec = FEATURE_SCHEMA.parse(payload)
+    assert vec[MODEL_FEATURES.index("age")] == 42
+    assert vec[MODEL_FEATURES.index("DebtRatio")] == np.float32(0.35)
+
+
+@pytest.mark.parametrize("feature, value, message", [
+    ("age", True, "boolean"),
+    ("age", "forty", "expected a number"),
+    ("age", [40], "expected a number"),
+    ("age", 40.5, "whole number"),
+    ("age", 121, "at most 120"),
+    ("NumberOfTimes90DaysLate", -1, "whole number"),
+    ("DebtRatio", -0.1, "non-negative"),
+    ("DebtRatio", float("inf"), "finite"),
+    ("RevolvingUtilizationOfUnsecuredLines", FLOAT32_MAX * 2, "out of range"),
+    ("MonthlyIncome", 2e9, "at most 1e+09"),
+])
+def test_invalid_values_are_rejected_per_field(payload, feature, value, message):
+    payload[feature] = value
+    with pytest.raises(FeatureParseError) as exc:
+        FEATURE_SCHEMA.parse(payload)
+    assert list(exc.value.errors) == [feature] and message in exc.value.errors[feature]
+
+
+def test_all_field_errors_are_reported_together(payload):
+    payload.update(age=-3, DebtRatio="x")
+    with pytest.raises(FeatureParseError) as exc:
+        FEATURE_SCHEMA.parse(payload)
+    assert set(exc.value.errors) == {"age", "DebtRatio"}
+    assert isinstance(exc.value, ValueError)
+
+
+def test_coerce_unknown_feature():
+    with pytest.raises(ValueError, match="unknown feature"):
+        FEATURE_SCHEMA.coerce("CreditCards", 1)
+
+
+def test_batch_matches_row_by_row_parsing(applicants):
+    payloads = applicants[MODEL_FEATURES].head(200).to_dict("records")
+    payloads[3]["MonthlyIncome"] = None
+    block = FEATURE_SCHEMA.parse_batch(payloads)
+    assert block.dtype == np.float32 and block.shape == (200, len(MODEL_FEATURES))
+    np.testing.assert_array_equal(block, np.vstack([FEATURE_SCHEMA.parse(p) for p in payloads]))
+
+
+def test_batch_errors_name_the_row(applicants):
+    payloads = applicants[MODEL_FEATURES].head(5).to_dict("records")
+    payloads[1]["age"] = 30.5
+    payloads[4]["DebtRatio"] = False
+    payloads.append("not an object")
+    with pytest.raises(FeatureParseError) as exc:
+        FEATURE_SCHEMA.parse_batch(payloads)
+    assert exc.value.errors == {"[1].age": "expected a non-negative whole number",
+                                "[4].DebtRatio": "expected a number, got a boolean",
+                                "[5]": "expected an object of feature values"}
+
+
+def test_empty_batch():
+    assert FEATURE_SCHEMA.parse_batch([]).shape == (0, len(MODEL_FEATURES))
+
+
+def test_parse_frame_uses_request_rules(applicants):
+    book = applicants.head(10).copy()
+    book.loc[2, "MonthlyIncome"] = np.nan
+    frame = FEATURE_SCHEMA.parse_frame(book)
+    assert list(frame.columns) == MODEL_FEATURES and (frame.dtypes == np.float32).all()
+    assert np.isnan(frame.loc[2, "MonthlyIncome"])
+
+    book.loc[5, "NumberOfDependents"] = 1.5
+    with pytest.raises(FeatureParseError, match=r"\[5\]\.NumberOfDependents"):
+        FEATURE_SCHEMA.parse_frame(book)
+
+
+# -------------------------
+# Endpoint rejections (serve_local_2)
+# -------------------------
+def test_endpoints_return_field_errors(serve, payload):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(serve.app)
+    r = client.post("/predict_1", json={**payload, "age": "x", "DebtRatio": -1})
+    assert r.status_code == 200
+    assert r.json() == {"error": "invalid input",
+                        "fields": {"age": "expected a number, got 'x'", "DebtRatio": "must be non-negative"}}
+
+    r = client.post("/offers", json={"applicants": [payload, {**payload, "age": 200}]})
+    assert r.json() == {"error": "invalid input", "fields": {"[1].age": "must be at most 120"}}
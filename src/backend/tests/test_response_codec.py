@@ -0,0 +1,131 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from starlette.requests import Request
+
+import response_codec
+from response_codec import (MIN_COMPRESS_BYTES, SerializationStats, _negotiate, dumps, encode_response, loads,
+                            requested, round_features, select_fields)
+
+RESULT = {
+    "score": np.float32(701.25),
+    "percentile": np.float64(42.5),
+    "count": np.int64(3),
+    "shap": np.array([0.25, -0.5]),
+    "missing": float("nan"),
+    "nested": {"values": [np.float64("inf"), 1.0], "pair": (np.nan, 2)},
+}
+DECODED = {"score": 701.25, "percentile": 42.5, "count": 3, "shap": [0.25, -0.5], "missing": None,
+           "nested": {"values": [None, 1.0], "pair": [None, 2]}}
+
+
+def _request(accept_encoding: str = "") -> Request:
+    return Request({"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+
+@pytest.fixture(params=["orjson", "json"])
+def codec(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(response_codec, "orjson", None)
+    return request.param
+
+
+def test_dumps_numpy_and_non_finite_values(codec):
+    body = dumps(RESULT)
+    assert json.loads(body) == DECODED  # strict JSON: no bare NaN/Infinity
+    assert loads(body) == DECODED
+
+
+def test_dumps_rejects_unknown_types(codec):
+    with pytest.raises(TypeError):
+        dumps({"x": object()})
+
+
+def test_round_features():
+    row = pd.Series({"Identifier": 7, "Unnamed: 0": 1, "DebtRatio": 0.12345, "MonthlyIncome": np.nan,
+                     "Gender": "F", "age": np.int16(40)})
+    assert round_features(row) == {"DebtRatio": 0.12, "MonthlyIncome": None, "Gender": "F", "age": 40.0}
+
+
+def test_field_selection():
+    result = {"score": 1, "percentile": 2, "force_plot": "..."}
+    assert select_fields(result, None) is result
+    assert select_fields(result, "score, percentile,unknown") == {"score": 1, "percentile": 2}
+    assert requested(None, "force_plot") and requested("", "force_plot")
+    assert requested("score,force_plot", "force_plot", "explanations")
+    assert not requested("score,percentile", "force_plot", "explanations")
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, identity", "gzip"),
+    ("BR", "br"),
+    ("deflate", None),
+    ("", None),
+])
+def test_negotiate(header, expected):
+    pytest.importorskip("brotli")
+    assert _negotiate(header) == expected
+
+
+def test_negotiate_without_brotli(monkeypatch):
+    monkeypatch.setattr(response_codec, "brotli", None)
+    assert _negotiate("br, gzip") == "gzip"
+    assert _negotiate("br") is None
+
+
+def test_small_bodies_are_sent_uncompressed():
+    response = encode_response(_request("gzip"), {"score": 700}, "/test")
+    assert "content-encoding" not in response.headers and response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(response.body) == {"score": 700}
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_large_bodies_are_compressed(encoding):
+    big = {"force_plot": "x" * (MIN_COMPRESS_BYTES * 4), "score": 700}
+    response = encode_response(_request(encoding), big, "/test")
+    assert response.headers["content-encoding"] == encoding
+    if encoding == "br":
+        brotli = pytest.importorskip("brotli")
+        body = brotli.decompress(response.body)
+    else:
+        body = gzip.decompress(response.body)
+    assert json.loads(body) == big and len(response.body) < len(body)
+
+
+def test_pre_serialized_payloads_pass_through():
+    payload = dumps({"score": 700, "force_plot": "png"})
+    assert encode_response(_request(), payload, "/test").body == payload
+    assert json.loads(encode_response(_request(), payload, "/test", fields="score").body) == {"score": 700}
+
+
+def test_serialization_stats():
+    stats = SerializationStats()
+    stats.record("/predict", 2000, 500, 0.001)
+    stats.record("/predict", 1000, 1000, 0.003)
+    assert stats.report() == {"/predict": {"calls": 2, "avg_raw_bytes": 1500.0, "avg_sent_bytes": 750.0,
+                                           "avg_serialize_ms": 2.0}}
+
+
+# -------------------------
+# Live scoring with ?fields= (serve_local_2)
+# -------------------------
+def test_unrequested_plot_and_verdict_are_skipped(serve, applicants, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    def not_expected(*args, **kwargs):
+        raise AssertionError("should not be called for this field selection")
+
+    monkeypatch.setattr(serve, "force_plot_png", not_expected)
+    monkeypatch.setattr(serve, "add_analyst_verdict", not_expected)
+    payload = {f: float(v) for f, v in applicants.iloc[0].drop("SeriousDlqin2yrs").items()}
+
+    r = TestClient(serve.app).post("/predict_1?fields=score,percentile,pricing", json=payload,
+                                   headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200 and set(r.json()) == {"score", "percentile", "pricing"}
+    assert "content-encoding" not in r.headers  # below MIN_COMPRESS_BYTES
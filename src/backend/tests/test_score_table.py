@@ -0,0 +1,139 @@
+import json
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import preprocess_input
+from score_table import (ScoreTable, display_round, load_score_table, materialize_score_table, row_fingerprints,
+                         shap_contributions, top_contributors)
+from utils import MODEL_FEATURES
+
+
+@pytest.fixture
+def book(applicants):
+    book = applicants[MODEL_FEATURES].head(500).copy()
+    book.insert(0, "Identifier", np.arange(1000, 1000 + len(book)))
+    return book
+
+
+@pytest.fixture
+def table_path(credit_model, book, tmp_path):
+    reference = np.sort(credit_model.score(book[MODEL_FEATURES])["calibrated_probability"].to_numpy())
+    path = str(tmp_path / "score_table.arrow")
+    materialize_score_table(credit_model, book, row_fingerprints(book), reference, "v1", path=path,
+                            batch_size=128)
+    return path
+
+
+def test_lookup_hits_only_fresh_rows(table_path, book):
+    table = ScoreTable(table_path)
+    hashes = row_fingerprints(book)
+    assert len(table) == len(book) and table.model_version == "v1"
+    assert table.lookup(1003, "v1", hashes[3]) == 3
+    assert table.lookup(1003, "v2", hashes[3]) is None  # model or calibration changed
+    assert table.lookup(1003, "v1", hashes[4]) is None  # customer's row changed
+    assert table.lookup(99, "v1") is None
+
+
+def test_row_fingerprint_tracks_every_column(book):
+    changed = book.copy()
+    changed.loc[7, "DebtRatio"] += 0.01
+    before, after = row_fingerprints(book), row_fingerprints(changed)
+    assert (before != after).tolist() == [i == 7 for i in range(len(book))]
+
+
+def test_stored_decision_matches_live_scoring(credit_model, table_path, book):
+    table = ScoreTable(table_path)
+    live = credit_model.score(book[MODEL_FEATURES].astype("float32"))
+    for i in (0, 127, 128, 499):  # both sides of a batch boundary
+        decision = table.decision(i)
+        for col in ("raw_probability", "calibrated_probability", "credit_score"):
+            assert decision[col] == live.loc[i, col]
+
+
+def test_stored_shap_rows_are_display_rounded(credit_model, table_path, book):
+    table = ScoreTable(table_path)
+    X = preprocess_input(book[MODEL_FEATURES].astype("float32"))
+    contribs = shap_contributions(credit_model.booster, X, keep_bias=True)
+    assert table.shap_features == list(X.columns)
+    assert table.shap_base_value == display_round(contribs[0, -1])
+
+    shap_row, feature_row = table.shap_row(200)
+    assert shap_row.tolist() == display_round(contribs[200, :-1]).tolist()
+    assert feature_row.tolist() == display_round(X.iloc[200].to_numpy(dtype=float)).tolist()
+
+    pos, neg = top_contributors(contribs[200:201, :-1], X.columns)
+    record = table.record(200)
+    assert record["top_positive"] == pos[0] and record["top_negative"] == neg[0]
+    assert all(v > 0 for _, v in record["top_positive"]) and all(v < 0 for _, v in record["top_negative"])
+
+
+def test_top_contributors_keep_column_order_on_ties():
+    pos, neg = top_contributors(np.array([[0.5, 0.501, -0.2, -0.2, 0.0]]), list("abcde"))
+    assert pos == [[["a", 0.5], ["b", 0.5]]]
+    assert neg == [[["c", -0.2], ["d", -0.2]]]
+
+
+def test_payload_fn_output_is_stored_serialized(credit_model, book, tmp_path):
+    path = str(tmp_path / "with_payload.arrow")
+
+    def payload_fn(row_full, record):
+        return {"id": int(row_full["Identifier"]), "score": record["credit_score"],
+                "Final_Recommendation": "Approve" if record["calibrated_probability"] < 0.2 else "Review"}
+
+    materialize_score_table(credit_model, book.head(10), row_fingerprints(book.head(10)), np.array([0.5]), "v1",
+                            path=path, payload_fn=payload_fn)
+    table = ScoreTable(path)
+    payload = json.loads(table.payload(4))
+    assert payload["id"] == 1004 and payload["score"] == table.decision(4)["credit_score"]
+    assert table.recommendation(4) == payload["Final_Recommendation"]
+
+
+def test_missing_or_corrupt_table_is_ignored(tmp_path):
+    assert load_score_table(str(tmp_path / "absent.arrow")) is None
+    (tmp_path / "corrupt.arrow").write_bytes(b"not arrow")
+    assert load_score_table(str(tmp_path / "corrupt.arrow")) is None
+
+
+# -------------------------
+# Cached vs live /predict (serve_local_2)
+# -------------------------
+def test_cached_predict_matches_live_without_rendering(serve, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from portfolio import PortfolioCube
+
+    calls = {"plot": 0, "llm": 0}
+
+    def force_plot_png(values, base_value, data, feature_names):
+        # the plot's exact inputs stand in for the image
+        calls["plot"] += 1
+        return json.dumps([list(map(float, values)), float(base_value), list(map(float, data)), list(feature_names)])
+
+    def create(**kwargs):
+        calls["llm"] += 1
+        content = json.dumps({"Final_Recommendation": "Approve", "AI_Summary": "Low risk."})
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(serve, "force_plot_png", force_plot_png)
+    monkeypatch.setattr(serve, "openai_client",
+                        types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))))
+    monkeypatch.setattr(serve, "serving", serve.serving)
+    monkeypatch.setattr(serve, "portfolio", PortfolioCube())
+
+    path = str(tmp_path / "score_table.arrow")
+    customers = serve.customers_df["Identifier"].tolist()
+    assert serve.materialize_known_customers(path) == len(customers)
+    cached_st = serve.serving._replace(score_table=ScoreTable(path))
+    live_st = serve.serving._replace(score_table=None)
+    client = TestClient(serve.app)
+
+    serve.serving = cached_st
+    rendered = dict(calls)
+    cached = {cid: client.post("/predict", json={"customer_id": cid}).json() for cid in customers}
+    assert calls == rendered  # hits neither render the plot nor call the LLM
+
+    serve.serving = live_st
+    for cid in customers:
+        assert client.post("/predict", json={"customer_id": cid}).json() == cached[cid]
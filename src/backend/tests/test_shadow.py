@@ -0,0 +1,100 @@
+import os
+import time
+
+import pyarrow as pa
+import pytest
+
+from audit_log import JOURNAL_SUFFIX
+from request_schema import FEATURE_SCHEMA
+from shadow import SHADOW_SCHEMA, ShadowScorer, read_shadow_log
+
+
+def _requests(model, applicants, n):
+    for i in range(n):
+        X_raw = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.parse(applicants.iloc[i].to_dict()))
+        yield i, X_raw, model.score(X_raw)
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out waiting for the shadow worker")
+        time.sleep(0.01)
+
+
+def test_submit_drops_when_queue_is_full(credit_model, applicants, tmp_path):
+    scorer = ShadowScorer(credit_model, str(tmp_path), queue_size=2)  # not started: nothing drains
+    accepted = [scorer.submit(X, pred, "/predict", customer_id=i)
+                for i, X, pred in _requests(credit_model, applicants, 5)]
+    assert accepted == [True, True, False, False, False]
+    stats = scorer.stats()
+    assert (stats["submitted"], stats["dropped"], stats["queue_depth"]) == (2, 3, 2)
+
+
+def test_scores_are_journaled_then_compacted_on_stop(credit_model, applicants, tmp_path):
+    scorer = ShadowScorer(credit_model, str(tmp_path), batch_size=8, flush_seconds=0.05).start()
+    for i, X, pred in _requests(credit_model, applicants, 20):
+        scorer.submit(X, pred, "/predict", customer_id=i)
+    _wait_for(lambda: scorer.stats()["scored"] == 20)
+
+    # readable while the journal is still open, and no part file per batch
+    assert [f for f in os.listdir(tmp_path) if f.endswith(".parquet")] == []
+    assert sorted(read_shadow_log(str(tmp_path))["customer_id"]) == list(range(20))
+
+    scorer.stop()
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].endswith(".parquet")
+    log = read_shadow_log(str(tmp_path))
+    assert list(log.columns) == SHADOW_SCHEMA.names
+    assert sorted(log["customer_id"]) == list(range(20))
+    # same model on both sides
+    assert log["delta_credit_score"].abs().max() == 0.0
+    assert scorer.stats()["rotations"] == 1
+
+
+def test_journal_rotates_by_size(credit_model, applicants, tmp_path):
+    scorer = ShadowScorer(credit_model, str(tmp_path), batch_size=4, flush_seconds=0.05,
+                          rotate_bytes=1).start()
+    for i, X, pred in _requests(credit_model, applicants, 12):
+        scorer.submit(X, pred, "/predict_1")
+    _wait_for(lambda: scorer.stats()["scored"] == 12)
+    scorer.stop()
+    assert scorer.stats()["rotations"] >= 2
+    assert len(read_shadow_log(str(tmp_path), columns=["endpoint"])) == 12
+
+
+def test_orphaned_journal_is_compacted_on_start(credit_model, applicants, tmp_path):
+    scorer = ShadowScorer(credit_model, str(tmp_path), flush_seconds=0.05).start()
+    for i, X, pred in _requests(credit_model, applicants, 3):
+        scorer.submit(X, pred, "/predict", customer_id=i)
+    _wait_for(lambda: scorer.stats()["scored"] == 3)
+    scorer.stop()
+    rows = read_shadow_log(str(tmp_path))
+
+    # a journal left behind by a process that no longer exists
+    orphan = tmp_path / f".shadow-999999999-1-000001{JOURNAL_SUFFIX}"
+    with open(orphan, "wb") as sink:
+        with pa.ipc.new_stream(sink, SHADOW_SCHEMA) as writer:
+            writer.write_table(pa.Table.from_pandas(rows, schema=SHADOW_SCHEMA, preserve_index=False))
+
+    ShadowScorer(credit_model, str(tmp_path)).start().stop()
+    assert not orphan.exists()
+    assert len(read_shadow_log(str(tmp_path))) == 6
+
+
+def test_challenger_failure_is_counted(credit_model, applicants, tmp_path):
+    class Broken:
+        def score(self, X):
+            raise RuntimeError("challenger down")
+
+    scorer = ShadowScorer(Broken(), str(tmp_path), flush_seconds=0.05).start()
+    for i, X, pred in _requests(credit_model, applicants, 3):
+        scorer.submit(X, pred, "/predict")
+    _wait_for(lambda: scorer.stats()["failed"] == 3)
+    scorer.stop()
+    assert read_shadow_log(str(tmp_path)).empty
+
+
+def test_read_missing_log_dir(tmp_path):
+    assert read_shadow_log(str(tmp_path / "absent")).empty
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "ci"))
+
+import train_and_promote as tp  # noqa: E402
+from utils import MODEL_FEATURES  # noqa: E402
+
+LATENCY = {"p50_ms": 1.0, "p95_ms": 2.0}
+
+
+@pytest.fixture
+def training_parquet(applicants, tmp_path):
+    path = tmp_path / "data" / "training.parquet"
+    path.parent.mkdir()
+    applicants.to_parquet(path, index=False)
+    return str(path)
+
+
+def test_expected_calibration_error():
+    rng = np.random.default_rng(0)
+    p = rng.random(200_000)
+    assert tp.expected_calibration_error(rng.random(len(p)) < p, p) < 0.01
+    assert tp.expected_calibration_error(np.zeros(4), np.full(4, 0.3)) == pytest.approx(0.3)
+
+
+def test_population_stability_index():
+    rng = np.random.default_rng(0)
+    base = rng.beta(2, 8, 50_000)
+    assert tp.population_stability_index(base, base) == pytest.approx(0.0, abs=1e-12)
+    assert tp.population_stability_index(base, rng.beta(2, 8, 50_000)) < 0.01
+    assert tp.population_stability_index(base, base * 1.5) > tp.GATES["max_psi"]
+
+
+def _scores(p):
+    return pd.DataFrame({"raw_probability": p, "calibrated_probability": p})
+
+
+def test_gates():
+    rng = np.random.default_rng(1)
+    y = rng.random(20_000) < 0.2
+    good = np.where(y, rng.beta(4, 4, len(y)), rng.beta(2, 8, len(y)))
+    metrics, results = tp.evaluate_gates(y, _scores(good), None, None, LATENCY, tp.GATES)
+    assert results["auc"] and results["latency"] and "psi" not in metrics and "champion_auc" not in metrics
+
+    # a candidate noticeably worse than the champion fails the relative AUC gate
+    worse = np.where(rng.random(len(y)) < 0.3, rng.random(len(y)), good)
+    metrics, results = tp.evaluate_gates(y, _scores(worse), _scores(good), None, LATENCY, tp.GATES)
+    assert metrics["holdout_auc"] < metrics["champion_auc"] - tp.GATES["max_auc_drop"] and not results["auc"]
+    assert metrics["psi"] > 0
+
+    _, results = tp.evaluate_gates(y, _scores(good), None, good * 2, {"p50_ms": 1.0, "p95_ms": 100.0}, tp.GATES)
+    assert not results["psi"] and not results["latency"]
+
+
+def test_data_key_tracks_data_and_settings(training_parquet, applicants, monkeypatch):
+    key = tp.data_key(training_parquet)
+    assert tp.data_key(training_parquet) == key and len(key) == 16
+    monkeypatch.setitem(tp.SPLIT, "seed", 7)
+    assert tp.data_key(training_parquet) != key
+    monkeypatch.undo()
+    applicants.head(10).to_parquet(training_parquet, index=False)
+    assert tp.data_key(training_parquet) != key
+
+
+def test_prepare_data_splits_once_and_reuses_the_cache(training_parquet, applicants, tmp_path, capsys):
+    data = tp.prepare_data(training_parquet, str(tmp_path / "cache"))
+    holdout = pd.read_parquet(data["holdout"])
+    n_train = tp.xgb.DMatrix(data["train"]).num_row()
+    n_valid = tp.xgb.DMatrix(data["valid"]).num_row()
+    assert n_train + n_valid + len(holdout) == len(applicants)
+    assert abs(len(holdout) / len(applicants) - tp.SPLIT["holdout"]) < 0.03
+    assert set(holdout.columns) == set(MODEL_FEATURES + [tp.LABEL_COL])
+
+    mtime = os.path.getmtime(data["train"])
+    assert tp.prepare_data(training_parquet, str(tmp_path / "cache")) == data
+    assert "Using cached data artifacts" in capsys.readouterr().out
+    assert os.path.getmtime(data["train"]) == mtime
+
+
+# -------------------------
+# End to end against a scratch MLflow file store
+# -------------------------
+def _run(training_parquet, tmp_path, *extra):
+    report = tmp_path / "report.json"
+    proc = subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "ci", "train_and_promote.py"), "--data", training_parquet,
+         "--tracking-uri", f"file:{tmp_path / 'mlruns'}", "--cache-dir", str(tmp_path / "cache"),
+         "--reference", str(tmp_path / "no-reference.parquet"), "--report", str(report),
+         "--num-boost-round", "40", "--nthread", "2", "--min-auc", "0.6", "--max-ece", "0.2",
+         "--latency-p95-ms", "1000", *extra],
+        cwd=str(tmp_path), capture_output=True, text=True, timeout=600,
+    )
+    return proc.returncode, (json.loads(report.read_text()) if report.exists() else None), proc
+
+
+def test_promote_then_gate_then_budget(training_parquet, tmp_path):
+    code, report, proc = _run(training_parquet, tmp_path)
+    assert code == 0, proc.stderr
+    assert str(report["promoted_version"]) == "1" and report["champion"] is None and all(report["gates"].values())
+
+    # the next candidate is compared with the champion it would replace
+    code, report, proc = _run(training_parquet, tmp_path, "--min-auc", "1.01")
+    assert code == 1, proc.stderr
+    assert str(report["champion"]["version"]) == "1" and report["promoted_version"] is None
+    assert not report["gates"]["auc"] and "champion_auc" in report["metrics"] and "psi" in report["metrics"]
+    assert "Using cached data artifacts" in proc.stdout
+
+    code, report, proc = _run(training_parquet, tmp_path, "--time-budget", "0")
+    assert code == 2 and "time budget" in report["error"]
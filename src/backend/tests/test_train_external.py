@@ -0,0 +1,78 @@
+import glob
+import tempfile
+
+import numpy as np
+import pytest
+import xgboost as xgb
+from sklearn.metrics import roc_auc_score
+
+from preprocess import preprocess_input
+from train_external import (LABEL_COL, ParquetBatchIter, build_dmatrix, parquet_files, prepare_chunk,
+                            train_in_memory, train_out_of_core)
+from utils import MODEL_FEATURES
+
+
+@pytest.fixture
+def parquet_parts(applicants, tmp_path):
+    for i, start in enumerate(range(0, len(applicants), 1000)):
+        applicants.iloc[start:start + 1000].to_parquet(tmp_path / f"part-{i:04d}.parquet", index=False)
+    return str(tmp_path)
+
+
+def _auc(booster, applicants):
+    X = preprocess_input(applicants[MODEL_FEATURES])
+    return roc_auc_score(applicants[LABEL_COL], booster.predict(xgb.DMatrix(X, feature_names=list(X.columns))))
+
+
+def test_parquet_files_lists_parts_in_order(parquet_parts):
+    assert [p[-17:] for p in parquet_files(parquet_parts)] == [f"part-{i:04d}.parquet" for i in range(3)]
+    assert parquet_files(parquet_files(parquet_parts)[0]) == parquet_files(parquet_parts)[:1]
+
+
+def test_iterator_streams_every_row_in_chunks(parquet_parts, applicants):
+    chunks = []
+
+    def collect(data, label):
+        chunks.append((data, label))
+
+    it = ParquetBatchIter(parquet_files(parquet_parts), batch_rows=400)
+    while it.next(collect):
+        pass
+    assert max(len(d) for d, _ in chunks) == 400
+    assert sum(len(d) for d, _ in chunks) == len(applicants)
+    assert all(d.dtypes.eq(np.float32).all() for d, _ in chunks)
+    np.testing.assert_array_equal(np.concatenate([lbl for _, lbl in chunks]), applicants[LABEL_COL])
+
+
+def test_prepare_chunk_matches_preprocess(applicants):
+    np.testing.assert_allclose(prepare_chunk(applicants), preprocess_input(applicants[MODEL_FEATURES]), rtol=1e-6)
+
+
+@pytest.mark.parametrize("external_memory", [False, True])
+def test_streamed_training_matches_in_memory_quality(parquet_parts, applicants, external_memory):
+    streamed = train_out_of_core(parquet_parts, num_boost_round=30, external_memory=external_memory,
+                                 batch_rows=500)
+    reference = train_in_memory(parquet_parts, num_boost_round=30)
+    assert _auc(streamed, applicants) == pytest.approx(_auc(reference, applicants), abs=0.02)
+
+
+def test_external_memory_cache_is_removed_after_training(parquet_parts):
+    before = set(glob.glob(f"{tempfile.gettempdir()}/xgb-extmem-*"))
+    train_out_of_core(parquet_parts, num_boost_round=2, external_memory=True, batch_rows=500)
+    assert set(glob.glob(f"{tempfile.gettempdir()}/xgb-extmem-*")) == before
+
+
+def test_external_memory_needs_a_cache_dir(parquet_parts, tmp_path):
+    with pytest.raises(ValueError, match="cache_dir"):
+        build_dmatrix(parquet_files(parquet_parts), external_memory=True)
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    dmat = build_dmatrix(parquet_files(parquet_parts), external_memory=True, cache_dir=str(cache_dir),
+                         batch_rows=500)
+    assert dmat.num_row() == 3000 and any(cache_dir.iterdir())
+
+
+def test_module_does_not_import_resource():
+    import train_external
+
+    assert "resource" not in vars(train_external)  # POSIX-only; imported by the benchmark alone
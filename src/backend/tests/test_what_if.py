@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from request_schema import FeatureParseError
+from utils import MODEL_FEATURES
+from what_if import MAX_SCENARIOS, build_scenario_grid, score_scenarios
+
+
+@pytest.fixture
+def base_row(applicants):
+    return applicants.iloc[0][MODEL_FEATURES].to_dict()
+
+
+def test_grid_is_baseline_plus_cartesian_product(base_row):
+    grid = build_scenario_grid(base_row, {"DebtRatio": [0.2, 0.3, 0.4], "MonthlyIncome": [8000, 10000]})
+    assert list(grid.columns) == MODEL_FEATURES
+    assert len(grid) == 1 + 3 * 2
+    assert grid.iloc[0].to_dict() == pytest.approx({f: float(v) for f, v in base_row.items()})
+    pairs = set(map(tuple, grid.loc[1:, ["DebtRatio", "MonthlyIncome"]].to_numpy()))
+    assert pairs == {(d, m) for d in [0.2, 0.3, 0.4] for m in [8000.0, 10000.0]}
+    untouched = [f for f in MODEL_FEATURES if f not in ("DebtRatio", "MonthlyIncome")]
+    assert (grid[untouched].nunique() == 1).all()
+
+
+def test_scalar_candidate_is_one_scenario(base_row):
+    assert len(build_scenario_grid(base_row, {"age": 40})) == 2
+
+
+def test_grid_at_the_limit_is_accepted(base_row):
+    changes = {"DebtRatio": list(np.linspace(0, 1, 50)),
+               "MonthlyIncome": list(range(1000, 1000 + MAX_SCENARIOS // 50))}
+    assert len(build_scenario_grid(base_row, changes)) == MAX_SCENARIOS + 1
+
+
+def test_grid_over_the_limit_is_rejected(base_row):
+    changes = {"DebtRatio": list(np.linspace(0, 1, 100)), "MonthlyIncome": list(range(1000, 1051))}
+    with pytest.raises(ValueError, match="limit is"):
+        build_scenario_grid(base_row, changes)
+
+
+def test_unknown_feature_is_rejected(base_row):
+    with pytest.raises(ValueError, match="Unknown what-if features"):
+        build_scenario_grid(base_row, {"CreditCards": [1]})
+
+
+def test_candidates_follow_the_feature_schema(base_row):
+    with pytest.raises(FeatureParseError) as exc:
+        build_scenario_grid(base_row, {"DebtRatio": [-1], "age": [30.5], "MonthlyIncome": [None],
+                                       "NumberOfDependents": []})
+    assert set(exc.value.errors) == {"DebtRatio[0]", "age[0]", "MonthlyIncome[0]", "NumberOfDependents"}
+
+
+def test_scenarios_are_scored_in_one_batch_best_first(credit_model, applicants, base_row):
+    changed = ["RevolvingUtilizationOfUnsecuredLines", "NumberOfTimes90DaysLate"]
+    grid = build_scenario_grid(base_row, dict(zip(changed, [[0.0, 0.5, 1.0], [0, 3]])))
+    reference = np.sort(credit_model.score(applicants[MODEL_FEATURES])["calibrated_probability"].to_numpy())
+    calls = []
+    score = credit_model.score
+    credit_model.score = lambda X: calls.append(len(X)) or score(X)
+
+    out = score_scenarios(credit_model, grid, reference, changed)
+    assert calls == [len(grid)]
+    assert out["baseline"]["score_delta"] == 0.0
+    scores = [s["score"] for s in out["scenarios"]]
+    assert len(scores) == 6 and scores == sorted(scores, reverse=True)
+
+    expected = dict(zip(map(tuple, grid[changed].to_numpy()), score(grid)["credit_score"]))
+    for s in out["scenarios"]:
+        assert s["score"] == pytest.approx(expected[tuple(s["changes"].values())], abs=0.005)
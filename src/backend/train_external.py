@@ -0,0 +1,208 @@
+"""
+Out-of-core training: stream Parquet chunks through an xgb.DataIter,
+apply preprocess_input per chunk and build a QuantileDMatrix (or an
+external-memory ExtMemQuantileDMatrix) for the hist tree method, so peak
+memory is bounded by the chunk size rather than the dataset size.
+
+    python train_external.py scale data/cs-training.parquet data/scaled --factor 20
+    python train_external.py train data/scaled --external-memory --out xgb_model.json
+    python train_external.py bench data/scaled
+"""
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from preprocess import preprocess_input
+from utils import MODEL_FEATURES
+
+
+LABEL_COL = "SeriousDlqin2yrs"
+BATCH_ROWS = 100_000
+
+DEFAULT_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "auc",
+    "tree_method": "hist",
+    "max_bin": 256,
+    "max_depth": 6,
+    "learning_rate": 0.05,
+}
+
+
+def parquet_files(path: str) -> list[str]:
+    """A single Parquet file, or every *.parquet file in a directory (sorted)."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.parquet")))
+    return [path]
+
+
+def prepare_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Engineered features for one chunk, as float32 to halve the chunk's footprint."""
+    return preprocess_input(df[MODEL_FEATURES]).astype("float32")
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """Feeds Parquet record batches (MODEL_FEATURES + label) to XGBoost one chunk at a time."""
+
+    def __init__(self, paths: list[str], label_col: str = LABEL_COL,
+                 batch_rows: int = BATCH_ROWS, cache_prefix: str | None = None):
+        self.paths = paths
+        self.label_col = label_col
+        self.batch_rows = batch_rows
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _iter_batches(self):
+        columns = MODEL_FEATURES + [self.label_col]
+        for path in self.paths:
+            yield from pq.ParquetFile(path).iter_batches(batch_size=self.batch_rows, columns=columns)
+
+    def reset(self):
+        self._batches = self._iter_batches()
+
+    def next(self, input_data) -> bool:
+        if self._batches is None:
+            self.reset()
+        try:
+            batch = next(self._batches)
+        except StopIteration:
+            return False
+        df = batch.to_pandas()
+        input_data(data=prepare_chunk(df), label=df[self.label_col].to_numpy())
+        return True
+
+
+def build_dmatrix(paths: list[str], external_memory: bool = False, cache_dir: str | None = None,
+                  batch_rows: int = BATCH_ROWS, max_bin: int = DEFAULT_PARAMS["max_bin"]):
+    """
+    QuantileDMatrix: chunks are sketched and compressed into histogram bins
+    in memory; the raw float matrix is never materialized.
+    ExtMemQuantileDMatrix: the binned pages are also spilled to cache_dir,
+    so only a page at a time is resident. The caller owns cache_dir and
+    must keep it until the matrix is no longer used.
+    """
+    if external_memory:
+        if cache_dir is None:
+            raise ValueError("external_memory requires a cache_dir")
+        it = ParquetBatchIter(paths, batch_rows=batch_rows, cache_prefix=os.path.join(cache_dir, "cache"))
+        return xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin)
+    it = ParquetBatchIter(paths, batch_rows=batch_rows)
+    return xgb.QuantileDMatrix(it, max_bin=max_bin)
+
+
+def train_out_of_core(path: str, params: dict | None = None, num_boost_round: int = 200,
+                      external_memory: bool = False, cache_dir: str | None = None,
+                      batch_rows: int = BATCH_ROWS) -> xgb.Booster:
+    """Without a cache_dir, external-memory pages go to a temporary directory removed after training."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if external_memory and cache_dir is None:
+        with tempfile.TemporaryDirectory(prefix="xgb-extmem-") as tmp:
+            return train_out_of_core(path, params, num_boost_round, external_memory, tmp, batch_rows)
+    dtrain = build_dmatrix(parquet_files(path), external_memory=external_memory,
+                           cache_dir=cache_dir, batch_rows=batch_rows, max_bin=params["max_bin"])
+    return xgb.train(params, dtrain, num_boost_round=num_boost_round)
+
+
+def train_in_memory(path: str, params: dict | None = None, num_boost_round: int = 200) -> xgb.Booster:
+    """Reference path: whole dataset in pandas, then a regular DMatrix."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    df = pd.concat([pd.read_parquet(p) for p in parquet_files(path)], ignore_index=True)
+    X = preprocess_input(df[MODEL_FEATURES])
+    dtrain = xgb.DMatrix(X, label=df[LABEL_COL])
+    return xgb.train(params, dtrain, num_boost_round=num_boost_round)
+
+
+# -------------------------
+# Synthetic scale-up + benchmark
+# -------------------------
+def scale_up_dataset(src_path: str, out_dir: str, factor: int, seed: int = 42) -> list[str]:
+    """
+    Write `factor` bootstrap resamples of the training data (with a little
+    jitter on the continuous columns) as separate Parquet parts, one part
+    in memory at a time.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    src = pd.read_parquet(src_path, columns=MODEL_FEATURES + [LABEL_COL])
+    rng = np.random.default_rng(seed)
+    continuous = ["RevolvingUtilizationOfUnsecuredLines", "DebtRatio", "MonthlyIncome"]
+
+    paths = []
+    for i in range(factor):
+        part = src.sample(frac=1.0, replace=True, random_state=rng.integers(1 << 31)).reset_index(drop=True)
+        for col in continuous:
+            noise = rng.normal(1.0, 0.02, size=len(part)).astype("float32")
+            part[col] = (part[col] * noise).astype(part[col].dtype)
+        path = os.path.join(out_dir, f"part-{i:04d}.parquet")
+        part.to_parquet(path, index=False, compression="zstd")
+        paths.append(path)
+    return paths
+
+
+def _measure(mode, path, num_boost_round, out):
+    import resource  # POSIX only; the benchmark is the sole user
+
+    t0 = time.perf_counter()
+    if mode == "in_memory":
+        train_in_memory(path, num_boost_round=num_boost_round)
+    else:
+        train_out_of_core(path, num_boost_round=num_boost_round, external_memory=(mode == "external_memory"))
+    out.put({
+        "seconds": round(time.perf_counter() - t0, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KiB on Linux
+    })
+
+
+def benchmark_training(path: str, num_boost_round: int = 50) -> pd.DataFrame:
+    """Wall-clock and peak RSS of in-memory vs streamed vs external-memory training, each in its own process."""
+    ctx = mp.get_context("spawn")
+    rows = {}
+    for mode in ["in_memory", "quantile_dmatrix", "external_memory"]:
+        out = ctx.Queue()
+        proc = ctx.Process(target=_measure, args=(mode, path, num_boost_round, out))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            rows[mode] = {"seconds": None, "peak_rss_mb": None, "error": f"exit code {proc.exitcode}"}
+            continue
+        rows[mode] = out.get(timeout=5)
+    report = pd.DataFrame(rows).T
+    report["rows"] = sum(pq.ParquetFile(p).metadata.num_rows for p in parquet_files(path))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    p_scale = sub.add_parser("scale")
+    p_scale.add_argument("src_path")
+    p_scale.add_argument("out_dir")
+    p_scale.add_argument("--factor", type=int, default=20)
+
+    p_train = sub.add_parser("train")
+    p_train.add_argument("path")
+    p_train.add_argument("--external-memory", action="store_true")
+    p_train.add_argument("--rounds", type=int, default=200)
+    p_train.add_argument("--out", default="xgb_model.json")
+
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("path")
+    p_bench.add_argument("--rounds", type=int, default=50)
+
+    args = parser.parse_args()
+    if args.action == "scale":
+        print(f"Wrote {len(scale_up_dataset(args.src_path, args.out_dir, args.factor))} parts to {args.out_dir}")
+    elif args.action == "train":
+        booster = train_out_of_core(args.path, num_boost_round=args.rounds, external_memory=args.external_memory)
+        booster.save_model(args.out)
+        print("Saved", args.out)
+    else:
+        print(benchmark_training(args.path, num_boost_round=args.rounds))
@@ -2,18 +2,41 @@ import numpy as np
 import pandas as pd
 from skopt.space import Real, Integer
 
+from data_store import TRAINING_SCHEMA, ensure_parquet, load_table
+
 
 # --- Constants ---
 COST_OF_FUNDS = 0.08
 OPEX = 0.01
 ROA = 0.02
+APR_CAP = 0.36
+LGD = 0.45  # unsecured retail loss given default
 FOIR_CAP = 0.60  # 60% affordability ceiling
 TENURE_OPTIONS = [6, 12, 18, 24]  # months
 
-
-def load_training_data(TRAIN_PATH) -> pd.DataFrame:
-    df = pd.read_csv(TRAIN_PATH)
-    return df
+# Raw model inputs, in the order the booster was trained on
+MODEL_FEATURES = [
+    'RevolvingUtilizationOfUnsecuredLines',
+    'age',
+    'NumberOfTime30_59DaysPastDueNotWorse',
+    'DebtRatio',
+    'MonthlyIncome',
+    'NumberOfOpenCreditLinesAndLoans',
+    'NumberOfTimes90DaysLate',
+    'NumberRealEstateLoansOrLines',
+    'NumberOfTime60_89DaysPastDueNotWorse',
+    'NumberOfDependents'
+]
+
+
+def load_training_data(TRAIN_PATH, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Load training data from typed Parquet. A CSV path is converted once to
+    its Parquet twin (compact dtypes) and that file is read from then on.
+    """
+    if TRAIN_PATH.endswith(".csv"):
+        TRAIN_PATH = ensure_parquet(TRAIN_PATH, schema=TRAINING_SCHEMA)
+    return load_table(TRAIN_PATH, columns=columns)
 
 def prob_to_log_odds(prob: np.ndarray, eps: float = 1e-9) -> np.ndarray:
     """Convert probability to log-odds safely."""
@@ -24,6 +47,16 @@ def log_odds_to_score(log_odds: np.ndarray, base: float = 600.0, factor: float =
     """Map log-odds to a credit-score-like scale. Tweak base/factor to taste."""
     return base + factor * log_odds
 
+def percentile_of_scores(sorted_reference: np.ndarray, scores) -> np.ndarray:
+    """
+    Vectorized scipy.stats.percentileofscore(..., kind="rank") against a
+    pre-sorted reference array.
+    """
+    scores = np.asarray(scores, dtype=float)
+    left = np.searchsorted(sorted_reference, scores, side="left")
+    right = np.searchsorted(sorted_reference, scores, side="right")
+    return (left + right + (right > left)) * 50.0 / len(sorted_reference)
+
 def to_2d_frame(X):
     """Ensure input is a 2D pandas DataFrame (for predict pipelines)."""
     if isinstance(X, pd.DataFrame):
@@ -68,7 +101,7 @@ def compute_risk_based_rate(pd_prob: float) -> float:
     """
     base = COST_OF_FUNDS + OPEX + ROA
     apr = base + float(pd_prob)
-    return float(np.clip(apr, base, 0.36))
+    return float(np.clip(apr, base, APR_CAP))
 
 
 # --- 2️⃣ Loan amount calculator (per tenure) ---
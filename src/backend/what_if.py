@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from request_schema import FEATURE_SCHEMA, FeatureParseError
+from utils import (MODEL_FEATURES, compute_risk_based_rate, calculate_loan_options,
+                   percentile_of_scores)
+
+
+MAX_SCENARIOS = 5000
+
+
+def build_scenario_grid(base_row, changes: dict) -> pd.DataFrame:
+    """
+    Cartesian product of candidate values around one customer.
+
+    base_row: the customer's raw MODEL_FEATURES (dict or Series).
+    changes:  {feature: [candidate values, ...]}, e.g.
+              {"DebtRatio": [0.2, 0.3], "MonthlyIncome": [8000, 10000]}.
+    Row 0 is always the unchanged customer (baseline).
+    Candidate values follow FEATURE_SCHEMA's rules (finite, non-negative,
+    whole counts) and may not be missing; violations raise FeatureParseError.
+    """
+    unknown = [f for f in changes if f not in MODEL_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown what-if features: {unknown}")
+
+    feats = list(changes)
+    values, errors = [], {}
+    for f in feats:
+        candidates = changes[f] if isinstance(changes[f], (list, tuple)) else [changes[f]]
+        if not candidates:
+            errors[f] = "needs at least one candidate value"
+        parsed = []
+        for j, value in enumerate(candidates):
+            try:
+                x = FEATURE_SCHEMA.coerce(f, value)
+                if math.isnan(x):
+                    raise ValueError("candidate values cannot be missing")
+                parsed.append(x)
+            except ValueError as e:
+                errors[f"{f}[{j}]"] = str(e)
+        values.append(np.asarray(parsed, dtype=float))
+    if errors:
+        raise FeatureParseError(errors)
+
+    n = int(np.prod([v.size for v in values])) if values else 0
+    if n > MAX_SCENARIOS:
+        raise ValueError(f"What-if grid has {n} scenarios; limit is {MAX_SCENARIOS}")
+
+    base = np.array([float(base_row[f]) if base_row[f] is not None else np.nan
+                     for f in MODEL_FEATURES], dtype=float)
+    grid = np.tile(base, (n + 1, 1))
+    if values:
+        mesh = np.meshgrid(*values, indexing="ij")
+        for f, m in zip(feats, mesh):
+            grid[1:, MODEL_FEATURES.index(f)] = m.ravel()
+
+    return pd.DataFrame(grid, columns=MODEL_FEATURES)
+
+
+def score_scenarios(python_model, grid: pd.DataFrame, sorted_reference: np.ndarray,
+                    changed_features: list[str]) -> dict:
+    """
+    Score a what-if grid in one batched call and attach percentile, APR and
+    loan options per scenario. Scenarios are returned best score first.
+    """
+    pred = python_model.score(grid)
+
+    pd_probs = pred["calibrated_probability"].to_numpy(dtype=float)
+    scores = pred["credit_score"].to_numpy(dtype=float)
+    percentiles = percentile_of_scores(sorted_reference, pd_probs)
+    incomes = np.nan_to_num(grid["MonthlyIncome"].to_numpy(dtype=float))
+    debt_ratios = np.nan_to_num(grid["DebtRatio"].to_numpy(dtype=float))
+    changed = grid[changed_features].to_numpy(dtype=float).tolist()
+
+    results = []
+    for i in range(len(grid)):
+        apr = compute_risk_based_rate(pd_probs[i])
+        results.append({
+            "changes": dict(zip(changed_features, changed[i])),
+            "score": round(float(scores[i]), 2),
+            "score_delta": round(float(scores[i] - scores[0]), 2),
+            "pd": round(float(pd_probs[i]), 6),
+            "percentile": round(float(percentiles[i]), 2),
+            "apr_percent": round(apr * 100, 3),
+            "loan_options": calculate_loan_options(float(incomes[i]), float(debt_ratios[i]), apr),
+        })
+
+    baseline, scenarios = results[0], results[1:]
+    scenarios.sort(key=lambda r: -r["score"])
+    return {"baseline": baseline, "scenarios": scenarios}